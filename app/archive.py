@@ -0,0 +1,184 @@
+"""Archival of old sessions into per-term partition tables.
+
+Closed sessions older than LOGBOOK_ARCHIVE_AFTER_DAYS move out of ``logs``
+into ``logs_archive_<term>`` tables (one per term of
+LOGBOOK_ARCHIVE_TERM_MONTHS months, counted from January), registered in
+``archive_partitions``. Nothing is lost: reports, exports and student
+history read across the hot table and whichever partitions their date
+range overlaps (see log_source), and the usage rollups keep counting
+archived sessions.
+
+Rows move in batches of LOGBOOK_ARCHIVE_BATCH_SIZE, each its own short
+transaction, so check-ins never wait long on the write lock:
+
+    python -m app.archive run [days]   # archive sessions older than days
+    python -m app.archive list         # show the partitions
+"""
+import sys
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import Column, Index, MetaData, Table, select, union_all
+from sqlalchemy.orm import Session, aliased
+from . import config, models
+
+# Partition tables are created on demand, so they live outside Base.metadata
+# (create_all and init_db never touch them).
+archive_metadata = MetaData()
+
+
+def term_for(moment) -> tuple:
+    """Return (name, first day, first day of the next term) for ``moment``."""
+    months = config.ARCHIVE_TERM_MONTHS
+    index = (moment.month - 1) // months
+    start = date(moment.year, index * months + 1, 1)
+    next_month = index * months + months
+    end = date(moment.year + next_month // 12, next_month % 12 + 1, 1)
+    return f"{moment.year}_t{index + 1}", start, end
+
+
+def archive_table(term: str) -> Table:
+    """The partition table for ``term``, with the same columns as logs."""
+    name = f"logs_archive_{term}"
+    if name in archive_metadata.tables:
+        return archive_metadata.tables[name]
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, autoincrement=False)
+        for column in models.LogEntry.__table__.columns
+    ]
+    return Table(
+        name,
+        archive_metadata,
+        *columns,
+        Index(f"ix_{name}_check_in_time", "check_in_time"),
+        Index(f"ix_{name}_student_id", "student_id"),
+    )
+
+
+def partitions(db: Session, start_date: date = None, end_date: date = None):
+    """Registered partitions overlapping [start_date, end_date] (None = open)."""
+    query = db.query(models.ArchivePartition)
+    if start_date:
+        query = query.filter(models.ArchivePartition.term_end > start_date)
+    if end_date:
+        query = query.filter(models.ArchivePartition.term_start <= end_date)
+    return query.order_by(models.ArchivePartition.term_start).all()
+
+
+def log_selectable(db: Session, start_date: date = None, end_date: date = None):
+    """The logs table, or the UNION ALL of logs and the partitions
+    overlapping [start_date, end_date] when there are any."""
+    logs = models.LogEntry.__table__
+    overlapping = partitions(db, start_date, end_date)
+    if not overlapping:
+        return logs
+    selects = [select(*logs.c)]
+    for partition in overlapping:
+        table = archive_table(partition.term)
+        selects.append(select(*[table.c[column.name] for column in logs.c]))
+    return union_all(*selects).subquery("all_logs")
+
+
+def log_source(db: Session, start_date: date = None, end_date: date = None):
+    """What to query logs from for a date range: models.LogEntry itself when
+    no archived term overlaps it, otherwise an alias of LogEntry over
+    log_selectable.
+
+    Either way the result has LogEntry's attributes, so callers build the
+    same filters and ORM objects on it.
+    """
+    selectable = log_selectable(db, start_date, end_date)
+    if selectable is models.LogEntry.__table__:
+        return models.LogEntry
+    return aliased(models.LogEntry, selectable, adapt_on_names=True)
+
+
+def _ensure_partition(db: Session, term: str, start: date, end: date) -> Table:
+    table = archive_table(term)
+    table.create(bind=db.connection(), checkfirst=True)
+    if db.get(models.ArchivePartition, term) is None:
+        db.add(models.ArchivePartition(term=term, table_name=table.name, term_start=start, term_end=end, row_count=0))
+        db.flush()
+    return table
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = None) -> int:
+    """Move up to ``batch_size`` closed sessions that ended before ``cutoff``
+    into their term partitions, in one transaction. Returns rows moved."""
+    from . import crud
+
+    batch_size = batch_size or config.ARCHIVE_BATCH_SIZE
+    logs = models.LogEntry.__table__
+    rows = db.execute(
+        select(logs.c.id, logs.c.check_in_time)
+        .where(
+            logs.c.check_out_time != None,
+            logs.c.check_out_time < cutoff,
+            logs.c.check_in_time != None,
+        )
+        .order_by(logs.c.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+
+    by_term = {}
+    for log_id, check_in_time in rows:
+        term = term_for(check_in_time)
+        by_term.setdefault(term, []).append(log_id)
+    try:
+        for (term, start, end), ids in by_term.items():
+            table = _ensure_partition(db, term, start, end)
+            db.execute(table.insert().from_select(list(logs.c.keys()), select(logs).where(logs.c.id.in_(ids))))
+            db.execute(logs.delete().where(logs.c.id.in_(ids)))
+            db.query(models.ArchivePartition).filter(models.ArchivePartition.term == term).update(
+                {models.ArchivePartition.row_count: models.ArchivePartition.row_count + len(ids),
+                 models.ArchivePartition.archived_at: models.get_ist_time()},
+                synchronize_session=False,
+            )
+        # Archived rows drop out of the dashboard list, so its ETag must change
+        crud.bump_version(db, crud.LOGS_COUNTER)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
+
+
+def archive_old_logs(db: Session, older_than_days: int = None, batch_size: int = None, max_batches: int = None) -> int:
+    """Archive every closed session that ended more than ``older_than_days``
+    ago, batch by batch, pausing between batches so writers get the lock."""
+    older_than_days = config.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = models.get_ist_time().replace(tzinfo=None) - timedelta(days=older_than_days)
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(db, cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+        if config.ARCHIVE_BATCH_PAUSE_MS:
+            time.sleep(config.ARCHIVE_BATCH_PAUSE_MS / 1000)
+    return moved
+
+
+def main(argv=None) -> int:
+    from . import database
+
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "list"
+    database.init_db()
+    with database.SessionLocal() as db:
+        if command == "run":
+            days = int(argv[1]) if len(argv) > 1 else None
+            print(f"Archived {archive_old_logs(db, days)} sessions")
+            return 0
+        if command == "list":
+            for partition in partitions(db):
+                print(f"{partition.table_name}: {partition.term_start} to {partition.term_end}, {partition.row_count} rows")
+            return 0
+    print(f"Unknown command {command!r}; use 'run' or 'list'")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
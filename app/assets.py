@@ -0,0 +1,277 @@
+"""Fingerprinted, precompressed static assets.
+
+``build`` copies every file under app/static into app/static/dist. Each copy
+gets a content hash in its name: css/style.css becomes css/style.<hash>.css.
+Next to each copy it writes:
+
+- .gz and .br variants for text assets (.br only when ``brotli`` is
+  installed)
+- a .webp variant for PNG/JPEG images (only when Pillow is installed)
+
+``/static/...`` references in CSS are rewritten to the hashed names. The
+manifest (dist/manifest.json) maps source paths to hashed names; templates
+look them up through ``asset_url``. A hashed name changes whenever the
+content does, so AssetFiles can serve dist/ as immutable for a year and pick
+the smallest variant the client accepts:
+
+    python -m app.assets build     # rebuild dist/ (app.serve does this too)
+
+Workers rebuild at startup when app/static has changed since the last build
+(LOGBOOK_ASSETS_BUILD). Without a build, asset_url returns the plain
+/static/ paths, which are served with ``no-cache`` (revalidated by ETag).
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import re
+import sys
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from . import config, locking
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # optional; no WebP images
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+BUILD_DIR = os.path.join(SOURCE_DIR, "dist")
+URL_PREFIX = "/static/"
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+WEBP_SOURCES = {".png", ".jpg", ".jpeg"}
+# Client-side encodings, best first: (Accept-Encoding token, file suffix)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)/static/([^'")?#\s]+)\1\s*\)""")
+
+_manifest = None  # loaded manifest, {} when there is no usable build
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2s(data, digest_size=5).hexdigest()
+
+
+def _sources(source_dir: str, build_dir: str) -> dict:
+    """Relative posix path -> bytes of every file under ``source_dir``."""
+    sources = {}
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != build_dir and not d.startswith("."))
+        for name in sorted(files):
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                sources[os.path.relpath(path, source_dir).replace(os.sep, "/")] = f.read()
+    return sources
+
+
+def _source_digest(sources: dict) -> str:
+    # Installing brotli or Pillow later also calls for a rebuild
+    h = hashlib.blake2s(f"brotli={brotli is not None} webp={Image is not None}".encode(), digest_size=8)
+    for rel in sorted(sources):
+        h.update(rel.encode() + b"\0" + _digest(sources[rel]).encode())
+    return h.hexdigest()
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _rewrite_css(data: bytes, files: dict) -> bytes:
+    def hashed(match):
+        target = files.get(match.group(2))
+        if target is None:
+            return match.group(0)
+        return f"url('{URL_PREFIX}dist/{target}')"
+    return CSS_URL.sub(hashed, data.decode("utf-8")).encode("utf-8")
+
+
+def _variants(rel: str, data: bytes) -> dict:
+    """Suffix -> bytes of the smaller encodings/formats worth keeping."""
+    ext = os.path.splitext(rel)[1].lower()
+    variants = {}
+    if ext in COMPRESSIBLE:
+        variants[".gz"] = gzip.compress(data, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data, quality=11)
+    elif ext in WEBP_SOURCES and Image is not None:
+        with Image.open(io.BytesIO(data)) as image:
+            out = io.BytesIO()
+            image.save(out, "WEBP", quality=80, method=6)
+            variants[".webp"] = out.getvalue()
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data)}
+
+
+def _read_manifest(build_dir: str) -> dict:
+    try:
+        with open(os.path.join(build_dir, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build(source_dir: str = SOURCE_DIR, build_dir: str = BUILD_DIR) -> dict:
+    """Write the hashed copies, their variants and the manifest; returns
+    the manifest. Files from the previous build are kept for pages that
+    still reference them, anything older is removed."""
+    sources = _sources(source_dir, build_dir)
+    previous = _read_manifest(build_dir)
+    files, outputs = {}, set()
+    # CSS last, so its url() references can point at the hashed names
+    for rel in sorted(sources, key=lambda rel: (rel.endswith(".css"), rel)):
+        data = sources[rel]
+        if rel.endswith(".css"):
+            data = _rewrite_css(data, files)
+        stem, ext = os.path.splitext(rel)
+        hashed = f"{stem}.{_digest(data)}{ext}"
+        files[rel] = hashed
+        written = {"": data, **_variants(rel, data)}
+        for suffix, body in written.items():
+            path = os.path.join(build_dir, hashed + suffix)
+            if not os.path.exists(path):
+                _write(path, body)
+            outputs.add(hashed + suffix)
+    manifest = {
+        "source_digest": _source_digest(sources),
+        "files": files,
+        "outputs": sorted(outputs),
+    }
+    _write(os.path.join(build_dir, "manifest.json"), json.dumps(manifest, indent=2).encode("utf-8"))
+
+    keep = outputs | set(previous.get("outputs", ())) | {"manifest.json"}
+    for root, _, names in os.walk(build_dir):
+        for name in names:
+            rel = os.path.relpath(os.path.join(root, name), build_dir).replace(os.sep, "/")
+            if rel not in keep:
+                os.remove(os.path.join(root, name))
+    logger.info(
+        "Built %d assets (brotli %s, webp %s)", len(files),
+        "on" if brotli is not None else "off", "on" if Image is not None else "off",
+    )
+    return manifest
+
+
+def is_current(manifest: dict, source_dir: str = SOURCE_DIR, build_dir: str = BUILD_DIR) -> bool:
+    return bool(manifest) and manifest.get("source_digest") == _source_digest(_sources(source_dir, build_dir))
+
+
+def ensure_built() -> dict:
+    """Load the manifest, rebuilding first if app/static has changed.
+    Workers starting together build once; the others wait and load it."""
+    global _manifest
+    manifest = _read_manifest(BUILD_DIR)
+    if config.ASSETS_BUILD and not is_current(manifest):
+        try:
+            with locking.FileLock(locking.lock_path("assets")):
+                manifest = _read_manifest(BUILD_DIR)
+                if not is_current(manifest):
+                    manifest = build()
+        except OSError:
+            logger.warning("Could not build static assets into %s; serving plain files", BUILD_DIR, exc_info=True)
+            manifest = {}
+    elif manifest and not is_current(manifest):
+        logger.warning("Static assets changed since the last build; run python -m app.assets build")
+        manifest = {}
+    _manifest = manifest
+    return manifest
+
+
+def asset_url(path: str) -> str:
+    """URL for the static file at ``path`` (relative to app/static): the
+    fingerprinted copy when one is built, else the plain file."""
+    global _manifest
+    if _manifest is None:
+        manifest = _read_manifest(BUILD_DIR)
+        _manifest = manifest if is_current(manifest) else {}
+    hashed = _manifest.get("files", {}).get(path)
+    return f"{URL_PREFIX}dist/{hashed}" if hashed else f"{URL_PREFIX}{path}"
+
+
+def _accepts(header: str, token: str) -> bool:
+    """Whether an Accept/Accept-Encoding header allows ``token`` (q > 0)."""
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        if name.strip().lower() != token:
+            continue
+        q = params.strip()
+        try:
+            return not (q.startswith("q=") and float(q[2:]) == 0)
+        except ValueError:
+            return True
+    return False
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles with cache headers: files under dist/ are immutable and
+    served as their best accepted variant; other files revalidate."""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        full_path = os.fspath(full_path)
+        if not full_path.startswith(BUILD_DIR + os.sep):
+            response = super().file_response(full_path, stat_result, scope, status_code)
+            response.headers["Cache-Control"] = REVALIDATE
+            return response
+
+        request_headers = Headers(scope=scope)
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        ext = os.path.splitext(full_path)[1].lower()
+        headers = {"Cache-Control": IMMUTABLE}
+        if ext in COMPRESSIBLE:
+            headers["Vary"] = "Accept-Encoding"
+            accept = request_headers.get("accept-encoding", "")
+            for encoding, suffix in ENCODINGS:
+                if _accepts(accept, encoding) and os.path.isfile(full_path + suffix):
+                    full_path += suffix
+                    headers["Content-Encoding"] = encoding
+                    break
+        elif ext in WEBP_SOURCES:
+            headers["Vary"] = "Accept"
+            if _accepts(request_headers.get("accept", ""), "image/webp") and os.path.isfile(full_path + ".webp"):
+                full_path += ".webp"
+                media_type = "image/webp"
+        if full_path.endswith((".br", ".gz", ".webp")):
+            stat_result = os.stat(full_path)
+
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "build"
+    if command != "build":
+        print(f"Unknown command {command!r}; use 'build'")
+        return 2
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    manifest = build()
+    for rel, hashed in manifest["files"].items():
+        print(f"{rel:<30} {hashed}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
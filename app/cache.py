@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from . import config
+
+MISSING = object()
+
+
+class LRUCache:
+    """A thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    ``invalidate``/``clear`` bump a generation counter; a loader that read
+    the database before an invalidation passes the generation it started
+    with to ``set`` so its (possibly stale) value is dropped instead of
+    cached.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._synced_version = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation: int = None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (value, self._clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def sync(self, version) -> bool:
+        """Clear the cache if ``version`` (of the database change counters
+        its entries derive from) differs from the last one seen, i.e. some
+        process changed the data. Returns whether it cleared."""
+        with self._lock:
+            changed = self._synced_version is not None and version != self._synced_version
+            self._synced_version = version
+            if changed:
+                self._generation += 1
+                self._data.clear()
+            return changed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+# register_number -> schemas.StudentOut, shared by the public lookup and check-in
+student_cache = LRUCache(config.STUDENT_CACHE_SIZE, config.STUDENT_CACHE_TTL)
+
+# (report name, parameters) -> report payload
+report_cache = LRUCache(config.REPORT_CACHE_SIZE, config.REPORT_CACHE_TTL)
@@ -0,0 +1,128 @@
+"""Group commit for check-in bursts (LOGBOOK_CHECKIN_COALESCE).
+
+Concurrent POST /api/logs/checkin requests are collected for up to
+LOGBOOK_COALESCE_WINDOW_MS (or until LOGBOOK_COALESCE_MAX_BATCH arrive) and
+written by crud.create_logs_batch in one transaction, so a burst costs
+one commit instead of one per kiosk. Every caller still gets its own
+result or error.
+
+Batch sizes and queueing delays are kept in ``stats()`` and exported as
+metrics so the window can be tuned.
+
+Only POST /api/logs/checkin is coalesced: it serves API clients and
+integrations. The kiosk page sends its check-ins through its offline queue
+to POST /api/logs/batch (crud.ingest_log_actions), where a flush of queued
+actions already shares one transaction, so it does not go through here.
+"""
+import asyncio
+import time
+from starlette.concurrency import run_in_threadpool
+from . import config, crud, database, metrics
+
+
+class CheckinCoalescer:
+    def __init__(self, window_ms: float, max_batch: int, session_factory=None):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._session_factory = session_factory or database.SessionLocal
+        self._loop = None
+        self._pending = []
+        self._task = None
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_write = 0.0
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (tests start one per request)
+            self._loop = loop
+            self._pending = []
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        return loop
+
+    async def submit(self, log):
+        """Queue a check-in; returns its LogOut dict or raises its error."""
+        loop = self._ensure_running()
+        future = loop.create_future()
+        self._pending.append((log, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+            if not self._pending:
+                self._wakeup.clear()
+            if batch:
+                await self._flush(batch)
+
+    def _write(self, logs: list) -> list:
+        with self._session_factory() as db:
+            return crud.create_logs_batch(db, logs)
+
+    async def _flush(self, batch: list):
+        started = time.perf_counter()
+        for _, _, queued in batch:
+            wait = started - queued
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            metrics.COALESCE_WAIT_SECONDS.observe(wait)
+        try:
+            results = await run_in_threadpool(self._write, [log for log, _, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        self.total_write += time.perf_counter() - started
+        self.batches += 1
+        self.requests += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        metrics.COALESCE_BATCH_SIZE.observe(len(batch))
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():  # the client went away
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+            self._task = None
+            self._loop = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": config.CHECKIN_COALESCE,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else None,
+            "largest_batch": self.largest_batch,
+            "avg_wait_ms": round(self.total_wait / self.requests * 1000, 3) if self.requests else None,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "avg_write_ms": round(self.total_write / self.batches * 1000, 3) if self.batches else None,
+        }
+
+
+checkin_coalescer = CheckinCoalescer(config.COALESCE_WINDOW_MS, config.COALESCE_MAX_BATCH)
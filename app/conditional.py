@@ -0,0 +1,61 @@
+"""Conditional GET helpers (ETag / Last-Modified) for the admin listings.
+
+Listings are versioned by the change counters in crud, so a validator is
+just the counter value plus a digest of the query string; checking it
+costs one primary-key lookup instead of running and serializing the list.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from . import models
+
+# Revalidate on every use, but let the browser keep the body for a 304
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(scope: str, version: int, query: str = "") -> str:
+    digest = hashlib.blake2s(query.encode(), digest_size=6).hexdigest()
+    return f'W/"{scope}-{version}-{digest}"'
+
+
+def http_date(value: datetime):
+    """Format a (naive IST or aware) datetime as an HTTP date, or None."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=models.IST)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime = None) -> bool:
+    """If-None-Match takes precedence over If-Modified-Since (RFC 9110)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison: W/"x" matches "x"
+        return "*" in tags or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in tags]
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=models.IST)
+        # HTTP dates have whole-second precision
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: datetime = None):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+
+
+def not_modified(etag: str, last_modified: datetime = None) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified)
+    return response
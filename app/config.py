@@ -0,0 +1,132 @@
+"""Runtime settings, read once from the environment at import time.
+
+Every setting has a default that matches running the app locally against
+./logbook.db, so nothing needs to be set for development.
+"""
+import os
+import tempfile
+
+
+def _env_str(name: str, default: str = None) -> str:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _normalize_url(url: str) -> str:
+    # Heroku-style URLs use the scheme SQLAlchemy dropped in 1.4
+    if url and url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+# Database
+DATABASE_URL = _normalize_url(
+    _env_str("LOGBOOK_DATABASE_URL", _env_str("DATABASE_URL", "sqlite:///./logbook.db"))
+)
+# Optional replica/secondary URL for admin and report reads. When unset but
+# LOGBOOK_READ_ENGINE is on, a second read-only engine on DATABASE_URL is used.
+READ_DATABASE_URL = _normalize_url(_env_str("LOGBOOK_READ_DATABASE_URL"))
+READ_ENGINE = _env_bool("LOGBOOK_READ_ENGINE", READ_DATABASE_URL is not None)
+DB_ECHO = _env_bool("LOGBOOK_DB_ECHO")
+# Serve request handlers from an asyncio engine (aiosqlite / asyncpg). The
+# sync engine is always created as well for startup, CLIs and streaming.
+ASYNC_DB = _env_bool("LOGBOOK_ASYNC_DB")
+
+# Connection pool
+DB_POOL_SIZE = _env_int("LOGBOOK_DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("LOGBOOK_DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _env_int("LOGBOOK_DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = _env_int("LOGBOOK_DB_POOL_RECYCLE", 1800)
+
+# SQLite pragmas, applied to every new connection
+SQLITE_JOURNAL_MODE = _env_str("LOGBOOK_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = _env_str("LOGBOOK_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = _env_int("LOGBOOK_SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_CACHE_SIZE_KB = _env_int("LOGBOOK_SQLITE_CACHE_SIZE_KB", 20000)
+SQLITE_MMAP_SIZE = _env_int("LOGBOOK_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+SQLITE_TEMP_STORE = _env_str("LOGBOOK_SQLITE_TEMP_STORE", "MEMORY")
+
+# Student lookup cache (register_number -> id/name/year), per process
+STUDENT_CACHE_SIZE = _env_int("LOGBOOK_STUDENT_CACHE_SIZE", 50000)
+STUDENT_CACHE_TTL = _env_int("LOGBOOK_STUDENT_CACHE_TTL", 600)
+STUDENT_CACHE_WARM = _env_bool("LOGBOOK_STUDENT_CACHE_WARM")
+
+# Aggregated usage reports, cached per parameter set
+REPORT_CACHE_SIZE = _env_int("LOGBOOK_REPORT_CACHE_SIZE", 256)
+REPORT_CACHE_TTL = _env_int("LOGBOOK_REPORT_CACHE_TTL", 300)
+
+# Dashboard event stream
+EVENT_HISTORY = _env_int("LOGBOOK_EVENT_HISTORY", 1000)
+EVENT_KEEPALIVE_SECONDS = _env_int("LOGBOOK_EVENT_KEEPALIVE_SECONDS", 15)
+# With several workers, how often each event stream checks the logs counter
+# for changes made by other workers
+EVENT_POLL_SECONDS = _env_int("LOGBOOK_EVENT_POLL_SECONDS", 5)
+
+# Archival of old sessions into per-term partition tables (app.archive)
+ARCHIVE_AFTER_DAYS = _env_int("LOGBOOK_ARCHIVE_AFTER_DAYS", 365)
+ARCHIVE_TERM_MONTHS = _env_int("LOGBOOK_ARCHIVE_TERM_MONTHS", 6)
+ARCHIVE_BATCH_SIZE = _env_int("LOGBOOK_ARCHIVE_BATCH_SIZE", 500)
+ARCHIVE_BATCH_PAUSE_MS = _env_int("LOGBOOK_ARCHIVE_BATCH_PAUSE_MS", 50)
+# Run app.archive from the maintenance scheduler (off-peak)
+ARCHIVE_SCHEDULED = _env_bool("LOGBOOK_ARCHIVE_SCHEDULED")
+
+# Background maintenance (app.maintenance)
+MAINTENANCE_ENABLED = _env_bool("LOGBOOK_MAINTENANCE", True)
+# Off-peak window (IST, HH:MM-HH:MM) for vacuum, ANALYZE and archival
+MAINTENANCE_WINDOW = _env_str("LOGBOOK_MAINTENANCE_WINDOW", "01:00-05:00")
+MAINTENANCE_HISTORY = _env_int("LOGBOOK_MAINTENANCE_HISTORY", 200)
+STALE_SESSION_HOURS = _env_int("LOGBOOK_STALE_SESSION_HOURS", 12)
+STALE_SESSION_CHECK_MINUTES = _env_int("LOGBOOK_STALE_SESSION_CHECK_MINUTES", 15)
+CHECKPOINT_MINUTES = _env_int("LOGBOOK_CHECKPOINT_MINUTES", 30)
+VACUUM_MAX_PAGES = _env_int("LOGBOOK_VACUUM_MAX_PAGES", 2000)
+VACUUM_FREE_PERCENT = _env_int("LOGBOOK_VACUUM_FREE_PERCENT", 20)
+
+# Request metrics (app.metrics, GET /metrics)
+METRICS_ENABLED = _env_bool("LOGBOOK_METRICS", True)
+# Requests running more SQL statements than this are flagged (0 disables)
+QUERY_BUDGET = _env_int("LOGBOOK_QUERY_BUDGET", 25)
+# Log requests slower than this many milliseconds (0 disables)
+SLOW_REQUEST_MS = _env_int("LOGBOOK_SLOW_REQUEST_MS", 0)
+
+# Group commit for check-in bursts on POST /api/logs/checkin (app.coalescer);
+# the kiosk page's queued check-ins use POST /api/logs/batch instead
+CHECKIN_COALESCE = _env_bool("LOGBOOK_CHECKIN_COALESCE")
+COALESCE_WINDOW_MS = _env_int("LOGBOOK_COALESCE_WINDOW_MS", 5)
+COALESCE_MAX_BATCH = _env_int("LOGBOOK_COALESCE_MAX_BATCH", 64)
+
+# Check-in on a computer someone else is using (app.occupancy):
+# "allow", "warn" (X-Computer-Conflict response header) or "reject" (409)
+COMPUTER_CONFLICT = _env_str("LOGBOOK_COMPUTER_CONFLICT", "warn").lower()
+
+# Most actions a kiosk may replay in one POST /api/logs/batch
+INGEST_MAX_BATCH = _env_int("LOGBOOK_INGEST_MAX_BATCH", 200)
+
+# Workers and startup (app.serve)
+# Worker processes serving the app. Above 1, per-process state follows the
+# change counters in the database: the occupancy map and the student and
+# report caches (checked at most every LOGBOOK_CACHE_SYNC_SECONDS), and the
+# dashboard event streams (LOGBOOK_EVENT_POLL_SECONDS).
+WORKERS = _env_int("WEB_CONCURRENCY", 1)
+CACHE_SYNC_SECONDS = _env_int("LOGBOOK_CACHE_SYNC_SECONDS", 1)
+# Create/migrate the schema in the app lifespan. app.serve migrates once
+# before starting workers and turns this off for them.
+INIT_DB = _env_bool("LOGBOOK_INIT_DB", True)
+LOCK_DIR = _env_str("LOGBOOK_LOCK_DIR", tempfile.gettempdir())
+
+# Static assets (app.assets)
+# Rebuild the fingerprinted copies in app/static/dist at startup when
+# app/static has changed. Turn off where the app directory is read-only and
+# build at deploy time instead (python -m app.assets build).
+ASSETS_BUILD = _env_bool("LOGBOOK_ASSETS_BUILD", True)
@@ -1,6 +1,112 @@
+from sqlalchemy import and_, distinct, func, literal, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from . import models, schemas
-from datetime import datetime
+from . import config, models, schemas, rollups, archive
+from .cache import student_cache, report_cache
+from .events import event_bus
+from .occupancy import occupancy, computer_key
+from datetime import datetime, date, timedelta
+import base64
+import json
+import re
+import time
+
+class ActiveSessionExists(Exception):
+    """The student already has an open session (ux_logs_active_student)."""
+
+class AlreadyCheckedOut(Exception):
+    pass
+
+class ComputerInUse(Exception):
+    """Another student has an open session on the computer
+    (LOGBOOK_COMPUTER_CONFLICT=reject)."""
+
+# Change counters: one row per tracked table, bumped inside each writing
+# transaction. Listings use them as ETags and delta-sync watermarks.
+LOGS_COUNTER = "logs"
+STUDENTS_COUNTER = "students"
+# Bumped whenever cached reports go stale before their TTL (log deletes,
+# rollup rebuilds), so other workers drop theirs too (sync_caches)
+REPORTS_COUNTER = "reports"
+# Set to the logs version of the last "delete all"; deltas from before it
+# can't be expressed with tombstones.
+LOGS_RESET_COUNTER = "logs_reset"
+
+def bump_version(db: Session, name: str, value: int = None) -> int:
+    """Increment counter ``name`` (or set it to ``value``) without committing
+    and return its new value."""
+    table = models.ChangeCounter.__table__
+    now = models.get_ist_time()
+    new_value = table.c.value + 1 if value is None else value
+    result = db.execute(table.update().where(table.c.name == name).values(value=new_value, updated_at=now))
+    if result.rowcount == 0:
+        db.execute(table.insert().values(name=name, value=1 if value is None else value, updated_at=now))
+    return db.query(models.ChangeCounter.value).filter(models.ChangeCounter.name == name).scalar()
+
+def get_version(db: Session, name: str):
+    """Return (value, updated_at) of counter ``name``; (0, None) if never bumped."""
+    row = db.query(models.ChangeCounter.value, models.ChangeCounter.updated_at).filter(
+        models.ChangeCounter.name == name
+    ).first()
+    return (row.value, row.updated_at) if row else (0, None)
+
+_caches_synced_at = None
+
+def sync_caches(db: Session):
+    """With several workers, clear this worker's student and report caches
+    when another process changed students or deleted logs. Checks the
+    counters at most every LOGBOOK_CACHE_SYNC_SECONDS, which bounds how long
+    a worker serves a renamed or deleted student."""
+    global _caches_synced_at
+    if config.WORKERS <= 1:
+        return
+    now = time.monotonic()
+    if _caches_synced_at is not None and now - _caches_synced_at < config.CACHE_SYNC_SECONDS:
+        return
+    _caches_synced_at = now
+    versions = dict(db.query(models.ChangeCounter.name, models.ChangeCounter.value).filter(
+        models.ChangeCounter.name.in_([STUDENTS_COUNTER, REPORTS_COUNTER])
+    ).all())
+    student_cache.sync(versions.get(STUDENTS_COUNTER, 0))
+    # Reports show student names too
+    report_cache.sync((versions.get(REPORTS_COUNTER, 0), versions.get(STUDENTS_COUNTER, 0)))
+
+def current_occupancy(db: Session, version: int = None):
+    """The occupancy map, rebuilt first if it lags the logs counter.
+
+    Writers pass the counter value before their own bump, so a current map
+    costs no query at all.
+    """
+    if version is None:
+        version = get_version(db, LOGS_COUNTER)[0]
+    if not occupancy.is_current(version):
+        occupancy.rebuild(db, version)
+    return occupancy
+
+def _computer_conflict(db: Session, version: int, computer_number: str, student_id: str):
+    """First open session of another student on ``computer_number``."""
+    if config.COMPUTER_CONFLICT == "allow":
+        return None
+    for holder in current_occupancy(db, version - 1).holders(computer_number):
+        if holder["student_id"] != student_id:
+            return holder
+    return None
+
+# Keyset pagination cursors: opaque URL-safe tokens wrapping the sort key
+# of the last row on the previous page.
+def encode_cursor(*values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> list:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
 
 # Student CRUD
 def get_student(db: Session, student_id: int):
@@ -9,11 +115,75 @@ def get_student(db: Session, student_id: int):
 def get_student_by_reg_no(db: Session, register_number: str):
     return db.query(models.Student).filter(models.Student.register_number == register_number).first()
 
-def get_students(db: Session, skip: int = 0, limit: int = 100, year: str = None):
-    query = db.query(models.Student)
+def _student_record(student_id, register_number, name, year):
+    return schemas.StudentOut(id=student_id, register_number=register_number, name=name, year=year)
+
+def lookup_student(db: Session, register_number: str):
+    """Cached register_number lookup for the check-in path.
+
+    Returns a schemas.StudentOut (not an ORM object) or None. Unknown
+    register numbers are not cached.
+    """
+    sync_caches(db)
+    record = student_cache.get(register_number, None)
+    if record is not None:
+        return record
+    generation = student_cache.generation
+    row = db.query(
+        models.Student.id, models.Student.register_number, models.Student.name, models.Student.year
+    ).filter(models.Student.register_number == register_number).first()
+    if row is None:
+        return None
+    record = _student_record(*row)
+    student_cache.set(register_number, record, generation=generation)
+    return record
+
+def warm_student_cache(db: Session, batch_size: int = 1000):
+    """Load the roster into the student cache (up to its size limit)."""
+    generation = student_cache.generation
+    count = 0
+    query = db.query(
+        models.Student.id, models.Student.register_number, models.Student.name, models.Student.year
+    ).order_by(models.Student.id)
+    for row in query.yield_per(batch_size):
+        if count >= student_cache.maxsize:
+            break
+        student_cache.set(row.register_number, _student_record(*row), generation=generation)
+        count += 1
+    return count
+
+# Field order of schemas.StudentOut / schemas.LogOut, so column rows
+# serialize to the same JSON as the validated models
+STUDENT_FIELDS = ("register_number", "name", "year", "id")
+LOG_FIELDS = (
+    "student_id", "computer_number", "purpose", "id", "student_name", "year",
+    "check_in_time", "check_out_time", "issues_reported",
+)
+
+def _columns(source, fields):
+    return [getattr(source, field) for field in fields]
+
+def get_students(db: Session, cursor: str = None, limit: int = 100, year: str = None, as_dicts: bool = False):
+    """Return (students, next_cursor), ordered by id.
+
+    With ``as_dicts`` only the StudentOut columns are selected and returned
+    as plain dicts, skipping ORM object construction.
+    """
+    query = db.query(*_columns(models.Student, STUDENT_FIELDS)) if as_dicts else db.query(models.Student)
     if year:
         query = query.filter(models.Student.year == year)
-    return query.offset(skip).limit(limit).all()
+    if cursor:
+        values = decode_cursor(cursor)
+        try:
+            last_id = int(values[0])
+        except (IndexError, TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        query = query.filter(models.Student.id > last_id)
+
+    rows = query.order_by(models.Student.id).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    rows = rows[:limit]
+    return ([row._asdict() for row in rows] if as_dicts else rows), next_cursor
 
 def create_student(db: Session, student: schemas.StudentCreate):
     db_student = models.Student(
@@ -22,8 +192,10 @@ def create_student(db: Session, student: schemas.StudentCreate):
         year=student.year
     )
     db.add(db_student)
+    bump_version(db, STUDENTS_COUNTER)
     db.commit()
     db.refresh(db_student)
+    student_cache.invalidate(db_student.register_number)
     return db_student
 
 def update_student(db: Session, student_id: int, student: schemas.StudentUpdate):
@@ -31,22 +203,35 @@ def update_student(db: Session, student_id: int, student: schemas.StudentUpdate)
     if db_student:
         if student.name: db_student.name = student.name
         if student.year: db_student.year = student.year
+        bump_version(db, STUDENTS_COUNTER)
         db.commit()
         db.refresh(db_student)
+        student_cache.invalidate(db_student.register_number)
     return db_student
 
 def delete_student(db: Session, student_id: int):
     # Optional but good to have
     db_student = get_student(db, student_id)
     if db_student:
+        register_number = db_student.register_number
         db.delete(db_student)
+        bump_version(db, STUDENTS_COUNTER)
         db.commit()
+        student_cache.invalidate(register_number)
     return db_student
 
 # Log CRUD
+def log_to_dict(log) -> dict:
+    """JSON-ready dict of a log (ORM object or row), shaped like schemas.LogOut."""
+    data = {}
+    for field in LOG_FIELDS:
+        value = getattr(log, field)
+        data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
 def create_log(db: Session, log: schemas.LogCreate):
     # Fetch student details
-    student = get_student_by_reg_no(db, log.student_id)
+    student = lookup_student(db, log.student_id)
     if not student:
         raise ValueError("Student not found")
         
@@ -57,17 +242,422 @@ def create_log(db: Session, log: schemas.LogCreate):
         computer_number=log.computer_number,
         purpose=log.purpose
     )
+    db_log.version = bump_version(db, LOGS_COUNTER)
+    # The counter bump holds the write lock, so the map can't change under us
+    holder = _computer_conflict(db, db_log.version, log.computer_number, log.student_id)
+    if holder and config.COMPUTER_CONFLICT == "reject":
+        db.rollback()
+        raise ComputerInUse(f"{holder['computer_number']} is in use by another student.")
     db.add(db_log)
-    db.commit()
+    # No read-then-insert: the partial unique index makes a concurrent
+    # second check-in fail atomically.
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise ActiveSessionExists("Student already checked in.")
     db.refresh(db_log)
+    occupancy.apply(db_log.version, opened=[db_log])
+    event_bus.publish("checkin", log_to_dict(db_log))
     return db_log
 
-def get_logs(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.LogEntry).offset(skip).limit(limit).all()
+def create_logs_batch(db: Session, logs: list[schemas.LogCreate]) -> list:
+    """Check in several students in one transaction (one commit, one fsync).
+
+    Returns one entry per request, in order: a LogOut-shaped dict, or the
+    exception create_log would have raised for it (ValueError for an
+    unknown student, ActiveSessionExists for an open session, including a
+    second check-in of the same student within the batch, ComputerInUse
+    for a taken computer).
+    """
+    results = [None] * len(logs)
+    pending = {}  # student_id -> index of the request that may insert
+    for index, log in enumerate(logs):
+        student = lookup_student(db, log.student_id)
+        if not student:
+            results[index] = ValueError("Student not found")
+        elif log.student_id in pending:
+            results[index] = ActiveSessionExists("Student already checked in.")
+        else:
+            pending[log.student_id] = (index, student)
+    if pending:
+        for (student_id,) in db.query(models.LogEntry.student_id).filter(
+            models.LogEntry.check_out_time == None, models.LogEntry.student_id.in_(list(pending))
+        ):
+            index, _ = pending.pop(student_id)
+            results[index] = ActiveSessionExists("Student already checked in.")
+    if not pending:
+        return results
+
+    version = bump_version(db, LOGS_COUNTER)
+    if config.COMPUTER_CONFLICT != "allow":
+        current_occupancy(db, version - 1)
+    if config.COMPUTER_CONFLICT == "reject":
+        taken = set()
+        for student_id, (index, _) in list(pending.items()):
+            computer = logs[index].computer_number
+            if computer_key(computer) in taken or _computer_conflict(db, version, computer, student_id):
+                del pending[student_id]
+                results[index] = ComputerInUse(f"{computer} is in use by another student.")
+            else:
+                taken.add(computer_key(computer))
+        if not pending:
+            db.rollback()
+            return results
+    entries = {
+        student_id: models.LogEntry(
+            student_id=student_id,
+            student_name=student.name,
+            year=student.year,
+            computer_number=logs[index].computer_number,
+            purpose=logs[index].purpose,
+            version=version,
+        )
+        for student_id, (index, student) in pending.items()
+    }
+    try:
+        with db.begin_nested():
+            db.add_all(entries.values())
+    except IntegrityError:
+        # A check-in outside this batch won a race; insert row by row so
+        # only the losers fail
+        for student_id, entry in list(entries.items()):
+            try:
+                with db.begin_nested():
+                    db.add(entry)
+            except IntegrityError:
+                index, _ = pending.pop(student_id)
+                results[index] = ActiveSessionExists("Student already checked in.")
+    ids = {student_id: entries[student_id].id for student_id in pending}
+    db.commit()
+
+    # Re-read as rows so the output matches create_log's (database-typed values)
+    inserted = {
+        row.id: row
+        for row in db.query(*_columns(models.LogEntry, LOG_FIELDS)).filter(models.LogEntry.id.in_(list(ids.values())))
+    }
+    occupancy.apply(version, opened=inserted.values())
+    for student_id, (index, _) in pending.items():
+        row = inserted[ids[student_id]]
+        event_bus.publish("checkin", log_to_dict(row))
+        results[index] = row._asdict()
+    return results
+
+# Kiosk actions replayed from the offline queue (POST /api/logs/batch)
+INGEST_ERRORS = (ValueError, ActiveSessionExists, AlreadyCheckedOut, ComputerInUse)
+
+def _naive_ist(value: datetime) -> datetime:
+    return value.astimezone(models.IST).replace(tzinfo=None) if value.tzinfo else value
+
+def _ingest_checkin(db: Session, action: schemas.QueuedLogAction, at: datetime, version: int):
+    student = lookup_student(db, action.student_id)
+    if not student:
+        raise ValueError("Student not found")
+    if not action.computer_number or not action.purpose:
+        raise ValueError("Check-in needs a computer number and a subject")
+    entry = models.LogEntry(
+        student_id=action.student_id,
+        student_name=student.name,
+        year=student.year,
+        computer_number=action.computer_number,
+        purpose=action.purpose,
+        check_in_time=at,
+        version=version,
+    )
+    db.add(entry)
+    # Inside the caller's savepoint: ux_logs_active_student rejects a
+    # second open session here
+    db.flush()
+    return entry
+
+def _ingest_checkout(db: Session, action: schemas.QueuedLogAction, at: datetime, version: int):
+    query = db.query(
+        models.LogEntry.id, models.LogEntry.student_id, models.LogEntry.computer_number,
+        models.LogEntry.purpose, models.LogEntry.check_in_time,
+    ).filter(models.LogEntry.student_id == action.student_id, models.LogEntry.check_out_time == None)
+    if action.log_id is not None:
+        query = query.filter(models.LogEntry.id == action.log_id)
+    row = query.first()
+    if row is None:
+        if action.log_id is None:
+            raise ValueError("No active session found")
+        if db.query(models.LogEntry.id).filter(
+            models.LogEntry.id == action.log_id, models.LogEntry.student_id == action.student_id
+        ).first() is None:
+            raise ValueError("Log not found")
+        raise AlreadyCheckedOut("Already checked out")
+    # Kiosk clocks disagree; never close a session before it opened
+    check_out_time = max(at, row.check_in_time) if row.check_in_time else at
+    values = {"check_out_time": check_out_time, "version": version}
+    if action.issues_reported:
+        values["issues_reported"] = action.issues_reported
+    db.query(models.LogEntry).filter(models.LogEntry.id == row.id).update(values, synchronize_session=False)
+    return row, check_out_time
+
+def ingest_log_actions(db: Session, actions: list[schemas.QueuedLogAction], sent_at: datetime = None) -> list[dict]:
+    """Apply queued kiosk check-ins and checkouts in order, in one transaction.
+
+    Each key is applied once: a key seen before, in an earlier batch or
+    earlier in this one, returns its first outcome with ``duplicate`` set.
+    Sessions keep the kiosk's timestamps, shifted by the kiosk clock's
+    offset at ``sent_at`` and never later than now. An action that fails
+    (ValueError, ActiveSessionExists, AlreadyCheckedOut, ComputerInUse) is
+    rejected on its own; the rest of the batch still applies. Returns one
+    LogActionResult-shaped dict per action.
+    """
+    now = models.get_ist_time().replace(tzinfo=None)
+    skew = now - _naive_ist(sent_at) if sent_at else timedelta(0)
+    # The bump takes the write lock first, so of two concurrent replays of
+    # the same keys the second waits and then finds the keys the first
+    # recorded
+    version = bump_version(db, LOGS_COUNTER)
+    if config.COMPUTER_CONFLICT != "allow":
+        current_occupancy(db, version - 1)
+    known = {
+        record.key: record
+        for record in db.query(models.IngestKey).filter(models.IngestKey.key.in_({action.key for action in actions}))
+    }
+    computers = {}  # computer key -> {log id: student id}, with this batch's changes
+
+    def holders(computer_number: str) -> dict:
+        key = computer_key(computer_number)
+        if key not in computers:
+            computers[key] = {
+                holder["log_id"]: holder["student_id"] for holder in occupancy.holders(computer_number)
+            } if config.COMPUTER_CONFLICT != "allow" else {}
+        return computers[key]
+
+    results, opened, closed, deltas, added = [], [], [], {}, False
+    for action in actions:
+        record = known.get(action.key)
+        if record is not None:
+            results.append({
+                "key": action.key, "status": record.status, "duplicate": True,
+                "detail": record.detail, "log_id": record.log_id,
+            })
+            continue
+        result = {"key": action.key, "status": "applied", "duplicate": False, "detail": None, "log_id": None}
+        at = min(_naive_ist(action.at) + skew, now)
+        try:
+            if action.action == schemas.LogAction.checkin:
+                others = [student for student in holders(action.computer_number or "").values() if student != action.student_id]
+                if others and config.COMPUTER_CONFLICT == "reject":
+                    raise ComputerInUse(f"{action.computer_number} is in use by another student.")
+                with db.begin_nested():
+                    entry = _ingest_checkin(db, action, at, version)
+                holders(action.computer_number)[entry.id] = action.student_id
+                opened.append(entry.id)
+                result["log_id"] = entry.id
+                if others and config.COMPUTER_CONFLICT == "warn":
+                    result["conflict"] = action.computer_number
+            else:
+                with db.begin_nested():
+                    row, check_out_time = _ingest_checkout(db, action, at, version)
+                holders(row.computer_number).pop(row.id, None)
+                closed.append(row.id)
+                result["log_id"] = row.id
+                if row.check_in_time:
+                    key = (row.student_id, rollups.subject_key(row.purpose))
+                    seconds, sessions = deltas.get(key, (0.0, 0))
+                    deltas[key] = (seconds + (check_out_time - row.check_in_time).total_seconds(), sessions + 1)
+        except IntegrityError:
+            result.update(status="rejected", detail="Student already checked in.")
+        except INGEST_ERRORS as e:
+            result.update(status="rejected", detail=str(e))
+        known[action.key] = models.IngestKey(
+            key=action.key, status=result["status"], log_id=result["log_id"], detail=result["detail"]
+        )
+        db.add(known[action.key])
+        added = True
+        results.append(result)
+    if not added:
+        db.rollback()
+    else:
+        rollups.apply_usage(db, deltas)
+        db.commit()
+
+    log_ids = {result["log_id"] for result in results if result["log_id"] is not None}
+    rows = {
+        row.id: row
+        for row in db.query(*_columns(models.LogEntry, LOG_FIELDS)).filter(models.LogEntry.id.in_(list(log_ids)))
+    } if log_ids else {}
+    if added:
+        occupancy.apply(version, opened=[rows[log_id] for log_id in opened if log_id not in closed], closed=closed)
+    for action, result in zip(actions, results):
+        row = rows.get(result.pop("log_id"))
+        result["log"] = row._asdict() if row is not None else None
+        if result["status"] == "applied" and not result["duplicate"] and row is not None:
+            event_bus.publish(action.action.value, log_to_dict(row))
+    return results
+
+def get_logs(db: Session, cursor: str = None, limit: int = 100, as_dicts: bool = False, **filters):
+    """Return (logs, next_cursor), newest check-in first.
+
+    Pages by keyset on (check_in_time, id) rather than OFFSET, so every page
+    costs the same no matter how deep it is. ``filters`` are the keyword
+    arguments of filter_logs. Archived terms are only read when a date
+    filter reaches back into them. ``as_dicts`` returns LogOut-shaped dicts
+    of the selected columns instead of ORM objects.
+    """
+    if filters.get("start_date") or filters.get("end_date"):
+        source = archive.log_source(db, filters.get("start_date"), filters.get("end_date"))
+    else:
+        source = models.LogEntry
+    query = db.query(*_columns(source, LOG_FIELDS)) if as_dicts else db.query(source)
+    query = filter_logs(query, source=source, **filters)
+    if cursor:
+        values = decode_cursor(cursor)
+        try:
+            last_time = None if values[0] is None else datetime.fromisoformat(values[0])
+            last_id = int(values[1])
+        except (IndexError, TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        # NULL check-in times are ordered after every other row, so they
+        # page by id alone at the very end
+        if last_time is None:
+            query = query.filter(source.check_in_time.is_(None), source.id < last_id)
+        else:
+            query = query.filter(or_(
+                source.check_in_time < last_time,
+                and_(source.check_in_time == last_time, source.id < last_id),
+                source.check_in_time.is_(None),
+            ))
+
+    rows = (
+        query.order_by(source.check_in_time.desc().nulls_last(), source.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.check_in_time, last.id)
+    rows = rows[:limit]
+    return ([row._asdict() for row in rows] if as_dicts else rows), next_cursor
+
+EXPORT_FIELDS = (
+    "id", "student_id", "student_name", "year", "computer_number", "purpose",
+    "check_in_time", "check_out_time", "issues_reported",
+)
+
+def export_columns(source=models.LogEntry):
+    return tuple(getattr(source, field) for field in EXPORT_FIELDS)
+
+EXPORT_COLUMNS = export_columns()
+
+def filter_logs(
+    query,
+    start_date: date = None,
+    end_date: date = None,
+    year: str = None,
+    computer_number: str = None,
+    subject: str = None,
+    student_id: str = None,
+    q: str = None,
+    active_only: bool = False,
+    source=models.LogEntry,
+):
+    """Apply the admin log filters to a query over ``source`` (models.LogEntry
+    or an archive.log_source alias of it).
+
+    Dates are inclusive and compare against the check-in date. ``subject``
+    and ``q`` (name or computer) are case-insensitive substring matches;
+    ``student_id`` is a prefix match.
+    """
+    if start_date:
+        query = query.filter(source.check_in_time >= datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        query = query.filter(source.check_in_time < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    if year:
+        query = query.filter(source.year == year)
+    if computer_number:
+        query = query.filter(source.computer_number == computer_number)
+    if subject:
+        query = query.filter(func.lower(source.purpose).contains(subject.lower(), autoescape=True))
+    if student_id:
+        query = query.filter(source.student_id.startswith(student_id, autoescape=True))
+    if q:
+        query = query.filter(or_(
+            func.lower(source.student_name).contains(q.lower(), autoescape=True),
+            func.lower(source.computer_number).contains(q.lower(), autoescape=True),
+        ))
+    if active_only:
+        query = query.filter(source.check_out_time == None)
+    return query
+
+def iter_log_rows(db: Session, batch_size: int = 1000, **filters):
+    """Yield log rows as plain tuples (see EXPORT_COLUMNS), oldest first.
+
+    Walks the table in keyset batches on the primary key, so only one batch
+    is ever held in memory regardless of how many logs are stored. Reads
+    across the archived terms the date filters overlap.
+    """
+    source = archive.log_source(db, filters.get("start_date"), filters.get("end_date"))
+    query = filter_logs(db.query(*export_columns(source)), source=source, **filters)
+
+    last_id = 0
+    while True:
+        batch = (
+            query.filter(source.id > last_id)
+            .order_by(source.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return
+        yield from batch
+        last_id = batch[-1][0]
+
+def get_log_changes(db: Session, since: int, limit: int = 1000, **filters):
+    """Logs created or checked out, and ids deleted, after watermark ``since``.
+
+    Returns a dict shaped like schemas.LogDelta, changes as plain dicts. ``reset`` is set instead
+    when the logs were cleared after ``since``, ``since`` is from a newer
+    database, or more than ``limit`` rows changed. ``active_only`` is
+    ignored: a session closing is itself a change the client must see.
+    """
+    filters.pop("active_only", None)
+    watermark, _ = get_version(db, LOGS_COUNTER)
+    reset_at, _ = get_version(db, LOGS_RESET_COUNTER)
+    delta = {"watermark": watermark, "reset": False, "changes": [], "deleted": []}
+    if since > watermark or since < reset_at:
+        delta["reset"] = True
+        return delta
+    if since == watermark:
+        return delta
+
+    query = db.query(*_columns(models.LogEntry, LOG_FIELDS)).filter(
+        models.LogEntry.version > since, models.LogEntry.version <= watermark
+    )
+    changes = filter_logs(query, **filters).order_by(models.LogEntry.version).limit(limit + 1).all()
+    if len(changes) > limit:
+        delta["reset"] = True
+        return delta
+    delta["changes"] = [row._asdict() for row in changes]
+    delta["deleted"] = [
+        log_id for (log_id,) in db.query(models.LogTombstone.log_id).filter(
+            models.LogTombstone.version > since, models.LogTombstone.version <= watermark
+        ).order_by(models.LogTombstone.version)
+    ]
+    return delta
 
 def get_log_by_id(db: Session, log_id: int):
     return db.query(models.LogEntry).filter(models.LogEntry.id == log_id).first()
 
+def get_occupancy(db: Session, detail: bool = False) -> dict:
+    """Computers in use, in natural order. ``detail`` adds who is on each."""
+    current = current_occupancy(db)
+    computers = {}
+    for entry in current.snapshot():
+        key = computer_key(entry["computer_number"])
+        computer = computers.setdefault(key, {"computer_number": entry["computer_number"], "since": None})
+        if entry["check_in_time"] and (computer["since"] is None or entry["check_in_time"] < computer["since"]):
+            computer["since"] = entry["check_in_time"]
+        if detail:
+            computer.setdefault("sessions", []).append(entry)
+    ordered = sorted(computers.values(), key=lambda computer: computer_sort_key(computer["computer_number"]))
+    return {"version": current.version, "in_use": len(ordered), "computers": ordered}
+
 def get_active_log_by_student(db: Session, student_id: str):
     return db.query(models.LogEntry).filter(
         models.LogEntry.student_id == student_id,
@@ -75,25 +665,262 @@ def get_active_log_by_student(db: Session, student_id: str):
     ).first()
 
 def get_student_logs(db: Session, student_id: str):
-    return db.query(models.LogEntry).filter(
-        models.LogEntry.student_id == student_id,
-        models.LogEntry.check_out_time != None
+    """Closed sessions of a student, archived ones included."""
+    source = archive.log_source(db)
+    return db.query(source).filter(
+        source.student_id == student_id,
+        source.check_out_time != None
     ).all()
 
+def get_student_usage(db: Session, register_number: str):
+    """Per-subject (subject, total_seconds, session_count) rows from the rollups."""
+    return db.query(
+        models.UsageRollup.subject, models.UsageRollup.total_seconds, models.UsageRollup.session_count
+    ).filter(models.UsageRollup.register_number == register_number).all()
+
 def checkout_log(db: Session, log_id: int, issues_reported: str = None):
+    """Close an open session with a single conditional UPDATE.
+
+    Returns the updated log, None if it doesn't exist, and raises
+    AlreadyCheckedOut if it was already closed (including by a concurrent
+    request).
+    """
+    check_out_time = models.get_ist_time()
+    values = {"check_out_time": check_out_time, "version": bump_version(db, LOGS_COUNTER)}
+    if issues_reported:
+        values["issues_reported"] = issues_reported
+    updated = db.query(models.LogEntry).filter(
+        models.LogEntry.id == log_id,
+        models.LogEntry.check_out_time == None
+    ).update(values, synchronize_session=False)
+    if updated:
+        # Fold the session into the usage rollups in the same transaction
+        student_id, purpose, check_in_time = db.query(
+            models.LogEntry.student_id, models.LogEntry.purpose, models.LogEntry.check_in_time
+        ).filter(models.LogEntry.id == log_id).one()
+        if check_in_time:
+            seconds = (check_out_time.replace(tzinfo=None) - check_in_time).total_seconds()
+            rollups.apply_usage(db, {(student_id, rollups.subject_key(purpose)): (seconds, 1)})
+        db.commit()
+        occupancy.apply(values["version"], closed=[log_id])
+    else:
+        # Nothing changed: don't keep the counter bump
+        db.rollback()
+
     db_log = get_log_by_id(db, log_id)
+    if db_log and not updated:
+        raise AlreadyCheckedOut("Already checked out")
     if db_log:
-        db_log.check_out_time = models.get_ist_time()
-        if issues_reported:
-            db_log.issues_reported = issues_reported
-        db.commit()
-        db.refresh(db_log)
+        event_bus.publish("checkout", log_to_dict(db_log))
     return db_log
 
+def computer_sort_key(computer_number: str) -> list:
+    """Natural ordering for computer numbers, so PC-9 < PC-10."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", computer_number or "")]
+
+def checkout_logs_bulk(
+    db: Session,
+    log_ids: list[int] = None,
+    year: str = None,
+    computer_prefix: str = None,
+    computer_from: str = None,
+    computer_to: str = None,
+    issues_reported: str = None,
+):
+    """Close every open session matching all the given filters with a single
+    UPDATE in one transaction, and return the closed logs as LogOut dicts.
+
+    ``computer_from``/``computer_to`` are an inclusive range in natural
+    order; ``computer_prefix`` selects a lab (e.g. "LAB2-"). Rollups are
+    updated in the same transaction and one checkout event is published
+    per closed log.
+    """
+    query = db.query(models.LogEntry.id, models.LogEntry.computer_number).filter(models.LogEntry.check_out_time == None)
+    if log_ids is not None:
+        query = query.filter(models.LogEntry.id.in_(log_ids))
+    if year:
+        query = query.filter(models.LogEntry.year == year)
+    if computer_prefix:
+        query = query.filter(models.LogEntry.computer_number.startswith(computer_prefix, autoescape=True))
+    low = computer_sort_key(computer_from) if computer_from else None
+    high = computer_sort_key(computer_to) if computer_to else None
+    ids = [
+        row.id for row in query
+        if (low is None or computer_sort_key(row.computer_number) >= low)
+        and (high is None or computer_sort_key(row.computer_number) <= high)
+    ]
+    if not ids:
+        return []
+
+    check_out_time = models.get_ist_time()
+    values = {"check_out_time": check_out_time, "version": bump_version(db, LOGS_COUNTER)}
+    if issues_reported:
+        values["issues_reported"] = issues_reported
+    table = models.LogEntry.__table__
+    # check_out_time IS NULL again: a session closed since the SELECT stays as it was
+    statement = table.update().where(table.c.id.in_(ids), table.c.check_out_time == None).values(**values)
+    if db.get_bind().dialect.update_returning:
+        closed = db.execute(statement.returning(*_columns(table.c, LOG_FIELDS))).all()
+    else:
+        db.execute(statement)
+        closed = db.query(*_columns(models.LogEntry, LOG_FIELDS)).filter(
+            models.LogEntry.id.in_(ids), models.LogEntry.check_out_time == check_out_time.replace(tzinfo=None)
+        ).all()
+    if not closed:
+        db.rollback()
+        return []
+
+    deltas = {}
+    naive_check_out = check_out_time.replace(tzinfo=None)
+    for row in closed:
+        if row.check_in_time is None:
+            continue
+        key = (row.student_id, rollups.subject_key(row.purpose))
+        seconds, sessions = deltas.get(key, (0.0, 0))
+        deltas[key] = (seconds + (naive_check_out - row.check_in_time).total_seconds(), sessions + 1)
+    rollups.apply_usage(db, deltas)
+    db.commit()
+    occupancy.apply(values["version"], closed=[row.id for row in closed])
+
+    for row in closed:
+        event_bus.publish("checkout", log_to_dict(row))
+    return [row._asdict() for row in closed]
+
+STALE_SESSION_NOTE = "Auto-closed: no check-out"
+
+def close_stale_sessions(db: Session, older_than: timedelta, batch_size: int = 500) -> list[int]:
+    """Close sessions still open ``older_than`` after check-in.
+
+    They get a zero duration (check-out = check-in) rather than the time
+    until someone noticed, count as sessions in the rollups, and are
+    published as checkouts. Returns the closed ids.
+    """
+    cutoff = models.get_ist_time().replace(tzinfo=None) - older_than
+    closed = []
+    while True:
+        stale = db.query(models.LogEntry.id, models.LogEntry.student_id, models.LogEntry.purpose).filter(
+            models.LogEntry.check_out_time == None,
+            models.LogEntry.check_in_time < cutoff,
+        ).order_by(models.LogEntry.id).limit(batch_size).all()
+        if not stale:
+            return closed
+        ids = [row.id for row in stale]
+        db.query(models.LogEntry).filter(
+            models.LogEntry.id.in_(ids), models.LogEntry.check_out_time == None
+        ).update({
+            models.LogEntry.check_out_time: models.LogEntry.check_in_time,
+            models.LogEntry.issues_reported: STALE_SESSION_NOTE,
+            models.LogEntry.version: bump_version(db, LOGS_COUNTER),
+        }, synchronize_session=False)
+        deltas = {}
+        for row in stale:
+            key = (row.student_id, rollups.subject_key(row.purpose))
+            deltas[key] = (0.0, deltas.get(key, (0.0, 0))[1] + 1)
+        rollups.apply_usage(db, deltas)
+        db.commit()
+        for log in db.query(models.LogEntry).filter(models.LogEntry.id.in_(ids)):
+            event_bus.publish("checkout", log_to_dict(log))
+        closed.extend(ids)
+
+def prune_ingest_keys(db: Session, older_than: timedelta) -> int:
+    """Forget idempotency keys older than ``older_than``; a kiosk replaying
+    one later is treated as new."""
+    cutoff = models.get_ist_time().replace(tzinfo=None) - older_than
+    count = db.query(models.IngestKey).filter(models.IngestKey.received_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return count
+
+def prune_tombstones(db: Session, older_than: timedelta) -> int:
+    """Drop tombstones older than ``older_than``. Clients whose watermark
+    predates the newest dropped one are told to reload instead."""
+    cutoff = models.get_ist_time().replace(tzinfo=None) - older_than
+    old = db.query(models.LogTombstone).filter(models.LogTombstone.deleted_at < cutoff)
+    newest = old.with_entities(func.max(models.LogTombstone.version)).scalar()
+    if newest is None:
+        return 0
+    count = old.delete(synchronize_session=False)
+    if newest > get_version(db, LOGS_RESET_COUNTER)[0]:
+        bump_version(db, LOGS_RESET_COUNTER, newest)
+    db.commit()
+    return count
+
+# Reports
+def _report_dimension(dimension: str, source=models.LogEntry):
+    if dimension == "year":
+        return func.coalesce(source.year, "Unknown")
+    if dimension == "subject":
+        return rollups.subject_expr(source.purpose)
+    if dimension == "computer":
+        return source.computer_number
+    raise ValueError(f"Unknown report dimension: {dimension}")
+
+def usage_report(db: Session, dimension: str, start_date: date = None, end_date: date = None, year: str = None):
+    """Closed-session usage grouped by year, subject or computer, computed in
+    SQL over the hot table and any archived terms in the date range."""
+    source = archive.log_source(db, start_date, end_date)
+    key = _report_dimension(dimension, source).label("key")
+    seconds = func.sum(rollups.duration_seconds(db, source.check_in_time, source.check_out_time)).label("seconds")
+    query = db.query(
+        key,
+        seconds,
+        func.count().label("sessions"),
+        func.count(distinct(source.student_id)).label("students"),
+    ).filter(
+        source.check_in_time != None,
+        source.check_out_time != None,
+    )
+    query = filter_logs(query, start_date=start_date, end_date=end_date, year=year, source=source)
+    return query.group_by(key).order_by(seconds.desc()).all()
+
+def top_students(db: Session, limit: int = 10, start_date: date = None, end_date: date = None, year: str = None):
+    """The ``limit`` students with the most closed-session time."""
+    source = archive.log_source(db, start_date, end_date)
+    seconds = func.sum(rollups.duration_seconds(db, source.check_in_time, source.check_out_time)).label("seconds")
+    query = db.query(
+        source.student_id,
+        func.max(source.student_name).label("student_name"),
+        func.max(source.year).label("year"),
+        seconds,
+        func.count().label("sessions"),
+    ).filter(
+        source.check_in_time != None,
+        source.check_out_time != None,
+    )
+    query = filter_logs(query, start_date=start_date, end_date=end_date, year=year, source=source)
+    return query.group_by(source.student_id).order_by(seconds.desc()).limit(limit).all()
+
+def cached_report(db: Session, name: str, params: dict, build):
+    """Return report ``name`` for ``params`` from report_cache, or compute it
+    with ``build(db)`` and cache it.
+
+    Checkouts only age cached reports by the cache TTL; deleting logs or
+    rebuilding rollups clears them.
+    """
+    sync_caches(db)
+    key = (name, tuple(sorted(params.items())))
+    report = report_cache.get(key, None)
+    if report is not None:
+        return report
+    generation = report_cache.generation
+    report = build(db)
+    report_cache.set(key, report, generation=generation)
+    return report
+
 def delete_all_logs(db: Session):
     try:
+        # Archived sessions stay, so only the hot table's usage comes out of the rollups
+        usage = rollups.usage_from_logs(db).all()
         num_deleted = db.query(models.LogEntry).delete()
+        rollups.apply_usage(db, {
+            (register_number, subject): (-(seconds or 0.0), -sessions)
+            for register_number, subject, seconds, sessions in usage
+        })
+        db.query(models.LogTombstone).delete()
+        bump_version(db, LOGS_RESET_COUNTER, bump_version(db, LOGS_COUNTER))
+        bump_version(db, REPORTS_COUNTER)
         db.commit()
+        report_cache.clear()
+        event_bus.publish("delete_all", {"count": num_deleted})
         return num_deleted
     except Exception as e:
         db.rollback()
@@ -101,8 +928,22 @@ def delete_all_logs(db: Session):
 
 def delete_logs_by_ids(db: Session, log_ids: list[int]):
     try:
+        deltas = rollups.usage_for_logs(db, log_ids)
+        version = bump_version(db, LOGS_COUNTER)
+        tombstones = models.LogTombstone.__table__
+        # Log ids are never reused, so each deleted id gets exactly one tombstone
+        db.execute(tombstones.insert().from_select(
+            ["log_id", "version", "deleted_at"],
+            db.query(models.LogEntry.id, literal(version), literal(models.get_ist_time().replace(tzinfo=None)))
+            .filter(models.LogEntry.id.in_(log_ids))
+            .statement,
+        ))
         num_deleted = db.query(models.LogEntry).filter(models.LogEntry.id.in_(log_ids)).delete(synchronize_session=False)
+        rollups.apply_usage(db, {key: (-seconds, -sessions) for key, (seconds, sessions) in deltas.items()})
+        bump_version(db, REPORTS_COUNTER)
         db.commit()
+        report_cache.clear()
+        event_bus.publish("delete", {"ids": list(log_ids)})
         return num_deleted
     except Exception as e:
         db.rollback()
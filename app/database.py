@@ -1,19 +1,216 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import make_url
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from . import config
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./logbook.db"
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _sqlite_pragmas(read_only: bool):
+    pragmas = [
+        f"PRAGMA busy_timeout = {config.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA journal_mode = {config.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous = {config.SQLITE_SYNCHRONOUS}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size = -{config.SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size = {config.SQLITE_MMAP_SIZE}",
+        f"PRAGMA temp_store = {config.SQLITE_TEMP_STORE}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+
+    def apply(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return apply
+
+
+def _postgres_read_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+    finally:
+        cursor.close()
+    dbapi_connection.commit()
+
+
+def create_db_engine(url: str, read_only: bool = False):
+    """Build an engine for ``url`` with the pool and per-connection settings
+    from app.config. SQLite connections get the tuning pragmas; other
+    backends get a pre-pinged, recycled connection pool."""
+    url = make_url(url)
+    kwargs = {"echo": config.DB_ECHO}
+
+    if is_sqlite(url):
+        kwargs["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+        # In-memory databases use a single-connection pool that takes no sizing
+        if url.database and url.database != ":memory:":
+            kwargs.update(
+                pool_size=config.DB_POOL_SIZE,
+                max_overflow=config.DB_MAX_OVERFLOW,
+                pool_timeout=config.DB_POOL_TIMEOUT,
+            )
+        engine = create_engine(url, **kwargs)
+        event.listen(engine, "connect", _sqlite_pragmas(read_only))
+    else:
+        kwargs.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+        engine = create_engine(url, **kwargs)
+        if read_only:
+            event.listen(engine, "connect", _postgres_read_only)
+    return engine
+
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def async_url(url: str):
+    """Map a sync database URL onto its asyncio driver."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if url.get_driver_name() in ("aiosqlite", "asyncpg"):
+        return url
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver configured for {backend!r} databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def create_async_db_engine(url: str, read_only: bool = False):
+    """Async counterpart of create_db_engine; same pool and pragma settings."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_url(url)
+    kwargs = {"echo": config.DB_ECHO}
+    if is_sqlite(url):
+        kwargs["connect_args"] = {"timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if url.database and url.database != ":memory:":
+            kwargs.update(
+                pool_size=config.DB_POOL_SIZE,
+                max_overflow=config.DB_MAX_OVERFLOW,
+                pool_timeout=config.DB_POOL_TIMEOUT,
+            )
+        async_engine = create_async_engine(url, **kwargs)
+        event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas(read_only))
+    else:
+        kwargs.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+        async_engine = create_async_engine(url, **kwargs)
+        if read_only:
+            event.listen(async_engine.sync_engine, "connect", _postgres_read_only)
+    return async_engine
+
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Admin listings, exports and reports can be pointed at a separate read-only
+# engine (a replica, or a query_only connection pool on the same SQLite file)
+# so they never hold write locks that check-ins wait on.
+if config.READ_ENGINE:
+    read_engine = create_db_engine(config.READ_DATABASE_URL or SQLALCHEMY_DATABASE_URL, read_only=True)
+else:
+    read_engine = engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+async_engine = None
+async_read_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+if config.ASYNC_DB:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async_engine = create_async_db_engine(SQLALCHEMY_DATABASE_URL)
+    if config.READ_ENGINE:
+        async_read_engine = create_async_db_engine(config.READ_DATABASE_URL or SQLALCHEMY_DATABASE_URL, read_only=True)
+    else:
+        async_read_engine = async_engine
+    # Objects are serialized after the handler returns, outside the greenlet
+    # that could lazy-load expired attributes, so don't expire on commit.
+    AsyncSessionLocal = sessionmaker(
+        class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False, bind=async_engine
+    )
+    AsyncReadSessionLocal = sessionmaker(
+        class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False, bind=async_read_engine
+    )
+
 Base = declarative_base()
 
+def init_db(bind=None):
+    """Create missing tables, apply pending app.migrations and create the
+    student search index (app/search.py)."""
+    from . import models, migrations, search
+
+    bind = bind or engine
+    fresh = not inspect(bind).has_table(models.LogEntry.__tablename__)
+    Base.metadata.create_all(bind=bind)
+    # create_all just built the current schema: nothing to migrate
+    migrations.upgrade(bind, stamp_only=fresh)
+    search.ensure_index(bind)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+# Request handlers depend on these: the asyncio sessions when LOGBOOK_ASYNC_DB
+# is set, otherwise the very same functions as get_db/get_read_db (so
+# dependency overrides of those keep working).
+get_session = get_async_db if config.ASYNC_DB else get_db
+get_read_session = get_async_read_db if config.ASYNC_DB else get_read_db
+
+async def run_db(db, fn, *args, **kwargs):
+    """Run a sync crud function ``fn(session, *args, **kwargs)`` without
+    blocking the event loop.
+
+    With an AsyncSession the function runs through ``run_sync`` on the
+    async connection; with a plain Session it runs in the threadpool.
+    """
+    if hasattr(db, "run_sync"):
+        return await db.run_sync(lambda session: fn(session, *args, **kwargs))
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+async def dispose_engines():
+    for async_eng in {async_engine, async_read_engine} - {None}:
+        await async_eng.dispose()
+    for sync_eng in {engine, read_engine}:
+        sync_eng.dispose()
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from . import config
+
+
+class EventBus:
+    """In-process publish/subscribe for dashboard change events.
+
+    Events carry increasing integer ids and the most recent ``history`` are
+    kept so a reconnecting client can catch up from its last seen id. Ids
+    start at the boot time in milliseconds, so they keep increasing across
+    restarts and a client that outlived the buffer is told to reload
+    rather than silently missing events.
+
+    ``publish`` is safe to call from any thread (crud runs in the
+    threadpool); subscribers are asyncio tasks woken on their own loop.
+    """
+
+    def __init__(self, history: int = 1000):
+        self._events = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._last_id = int(time.time() * 1000)
+        self._subscribers = set()
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def publish(self, event_type: str, data: dict) -> int:
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            self._events.append((event_id, event_type, data))
+            subscribers = list(self._subscribers)
+        for loop, wake in subscribers:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self._subscribers.discard((loop, wake))
+        return event_id
+
+    def since(self, last_id: int):
+        """Return (events after ``last_id``, complete).
+
+        ``complete`` is False when ``last_id`` is older than the buffered
+        history (or from the future), i.e. the caller must resync.
+        """
+        with self._lock:
+            if last_id > self._last_id:
+                return [], False
+            if last_id == self._last_id:
+                return [], True
+            if not self._events or self._events[0][0] > last_id + 1:
+                return [], False
+            return [event for event in self._events if event[0] > last_id], True
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """Yield an asyncio.Event that is set whenever something is published."""
+        entry = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._subscribers.add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                self._subscribers.discard(entry)
+
+
+# Per process: with several workers each dashboard sees the events of the
+# worker it is connected to.
+event_bus = EventBus(config.EVENT_HISTORY)
@@ -0,0 +1,45 @@
+"""JSON responses that skip per-object Pydantic validation.
+
+List endpoints select plain column rows (trusted database output already
+shaped like their schema) and return them through FastJSONResponse instead
+of letting FastAPI validate and re-encode every object through
+``response_model``. orjson is used when installed; the stdlib encoder
+produces the same JSON otherwise.
+"""
+import json
+from datetime import date, datetime
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def respond(content, response: Response = None) -> FastJSONResponse:
+    """Wrap ``content``, carrying over the headers a handler set on its
+    injected ``response`` (returning a Response directly bypasses them)."""
+    fast = FastJSONResponse(content)
+    if response is not None:
+        for name, value in response.headers.items():
+            if name != "content-length":
+                fast.headers[name] = value
+    return fast
@@ -0,0 +1,143 @@
+import csv
+import io
+import time
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+from . import crud, models
+from .cache import student_cache
+
+REQUIRED_HEADERS = {"register_number", "name", "year"}
+
+# Keeps the IN (...) lookup under SQLite's default bound-parameter limit
+DEFAULT_CHUNK_SIZE = 500
+
+
+class CSVFormatError(ValueError):
+    pass
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def import_students_csv(db: Session, stream, upsert: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Bulk import students from a binary CSV stream.
+
+    Rows are read incrementally and processed in chunks: one SELECT per chunk
+    finds the register numbers that already exist, then new rows are inserted
+    (and changed rows updated when ``upsert`` is set) with executemany. Every
+    chunk runs in the same transaction, which is committed once at the end.
+    """
+    started = time.perf_counter()
+    parse_seconds = 0.0
+    db_seconds = 0.0
+
+    students = models.Student.__table__
+    insert_stmt = students.insert()
+    update_stmt = (
+        students.update()
+        .where(students.c.register_number == bindparam("b_register_number"))
+        .values(name=bindparam("b_name"), year=bindparam("b_year"))
+    )
+
+    result = {"inserted": 0, "updated": 0, "skipped": 0, "errors": []}
+    seen = set()
+    updated_reg_nos = []
+
+    def flush(chunk):
+        nonlocal db_seconds
+        db_started = time.perf_counter()
+        reg_nos = [row["register_number"] for row in chunk]
+        existing = {
+            reg_no: (name, year)
+            for reg_no, name, year in db.execute(
+                select(students.c.register_number, students.c.name, students.c.year)
+                .where(students.c.register_number.in_(reg_nos))
+            )
+        }
+
+        to_insert = []
+        to_update = []
+        for row in chunk:
+            current = existing.get(row["register_number"])
+            if current is None:
+                to_insert.append(row)
+            elif upsert and current != (row["name"], row["year"]):
+                to_update.append({
+                    "b_register_number": row["register_number"],
+                    "b_name": row["name"],
+                    "b_year": row["year"],
+                })
+            else:
+                result["skipped"] += 1
+
+        if to_insert:
+            db.execute(insert_stmt, to_insert)
+            result["inserted"] += len(to_insert)
+        if to_update:
+            db.execute(update_stmt, to_update)
+            result["updated"] += len(to_update)
+            updated_reg_nos.extend(row["b_register_number"] for row in to_update)
+        db_seconds += time.perf_counter() - db_started
+
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        if not reader.fieldnames or not REQUIRED_HEADERS.issubset(set(reader.fieldnames)):
+            raise CSVFormatError(f"Invalid headers. Required: {REQUIRED_HEADERS}")
+
+        chunk = []
+        parse_started = time.perf_counter()
+        for row in reader:
+            line_no = reader.line_num
+            reg_no = (row.get("register_number") or "").strip()
+            name = (row.get("name") or "").strip()
+            year = (row.get("year") or "").strip()
+
+            if not reg_no or not name:
+                result["skipped"] += 1
+                result["errors"].append(f"Line {line_no}: register_number and name are required")
+                continue
+            if reg_no in seen:
+                result["skipped"] += 1
+                result["errors"].append(f"Line {line_no}: duplicate register number {reg_no} in file")
+                continue
+            seen.add(reg_no)
+
+            chunk.append({"register_number": reg_no, "name": name, "year": year})
+            if len(chunk) >= chunk_size:
+                parse_seconds += time.perf_counter() - parse_started
+                flush(chunk)
+                chunk = []
+                parse_started = time.perf_counter()
+
+        parse_seconds += time.perf_counter() - parse_started
+        if chunk:
+            flush(chunk)
+
+        if result["inserted"] or result["updated"]:
+            crud.bump_version(db, crud.STUDENTS_COUNTER)
+        commit_started = time.perf_counter()
+        db.commit()
+        db_seconds += time.perf_counter() - commit_started
+        if updated_reg_nos:
+            student_cache.invalidate(*updated_reg_nos)
+    except UnicodeDecodeError as e:
+        db.rollback()
+        raise CSVFormatError(f"File is not valid UTF-8: {e}")
+    except csv.Error as e:
+        db.rollback()
+        raise CSVFormatError(str(e))
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        # Don't let the wrapper close the upload's underlying file
+        text.detach()
+
+    result["timings"] = {
+        "parse_ms": round(parse_seconds * 1000, 2),
+        "db_ms": round(db_seconds * 1000, 2),
+        "total_ms": _elapsed_ms(started),
+    }
+    return result
@@ -0,0 +1,83 @@
+"""Inter-process locks for running several workers on one database.
+
+A FileLock is an OS lock on a file in LOGBOOK_LOCK_DIR: fcntl.flock on
+POSIX, msvcrt.locking on Windows. The OS drops it when the holding process
+exits, however it exits, so a crashed worker can never leave it stuck.
+"""
+import hashlib
+import os
+import time
+from sqlalchemy.engine import make_url
+from . import config
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def lock_path(name: str, database_url: str = None) -> str:
+    """Lock file for ``name`` scoped to one database, so apps on different
+    databases never contend."""
+    url = make_url(database_url or config.DATABASE_URL)
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+        scope = os.path.abspath(url.database)
+    else:
+        scope = url.render_as_string(hide_password=True)
+    digest = hashlib.blake2s(scope.encode(), digest_size=6).hexdigest()
+    return os.path.join(config.LOCK_DIR, f"logbook-{digest}-{name}.lock")
+
+
+class FileLock:
+    def __init__(self, path: str, poll_interval: float = 0.1):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def _try_lock(self, fd) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, blocking: bool = True, timeout: float = None) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._try_lock(fd):
+            if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                os.close(fd)
+                return False
+            time.sleep(self.poll_interval)
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
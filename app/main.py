@@ -1,38 +1,155 @@
-from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from . import models, database
-from .routers import logs, admin, students
+import time
 
-models.Base.metadata.create_all(bind=database.engine)
+IMPORT_STARTED = time.perf_counter()
 
+import asyncio
+import functools
+import logging
 import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from . import database, config, crud, rollups, maintenance, metrics, locking, assets
+from .routers import logs, admin, students, reports, occupancy
+from .coalescer import checkin_coalescer
+
+logger = logging.getLogger(__name__)
+
+# How often a worker without the maintenance lock checks whether the worker
+# holding it has gone away
+MAINTENANCE_CLAIM_SECONDS = 60
+
+def init_database():
+    """Create/migrate the schema and backfill the rollups. Serialized across
+    processes, so workers starting together don't race on DDL; the ones
+    that wait find nothing left to do."""
+    with locking.FileLock(locking.lock_path("init")):
+        database.init_db()
+        with database.SessionLocal() as db:
+            rollups.backfill_if_empty(db)
+
+def _warm_up() -> dict:
+    timings = {}
+    started = time.perf_counter()
+    assets.ensure_built()
+    timings["assets_seconds"] = round(time.perf_counter() - started, 4)
+    if config.INIT_DB:
+        started = time.perf_counter()
+        init_database()
+        timings["init_db_seconds"] = round(time.perf_counter() - started, 4)
+    if config.STUDENT_CACHE_WARM:
+        started = time.perf_counter()
+        with database.SessionLocal() as db:
+            count = crud.warm_student_cache(db)
+        timings["student_cache_seconds"] = round(time.perf_counter() - started, 4)
+        logger.info("Warmed student cache with %d students", count)
+    started = time.perf_counter()
+    with database.SessionLocal() as db:
+        in_use = crud.get_occupancy(db)["in_use"]
+    timings["occupancy_seconds"] = round(time.perf_counter() - started, 4)
+    logger.info("Occupancy map built: %d computers in use", in_use)
+    return timings
+
+async def _run_maintenance_when_free(lock: locking.FileLock):
+    """Run the scheduler in exactly one worker: whichever holds the lock."""
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(MAINTENANCE_CLAIM_SECONDS)
+    logger.info("Worker %d runs the maintenance scheduler", os.getpid())
+    maintenance.scheduler.start()
 
-# ... imports ...
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    app.state.ready = False
+    app.state.startup = {"import_seconds": IMPORT_SECONDS, **await run_in_threadpool(_warm_up)}
+    maintenance_lock = maintenance_claim = None
+    if config.MAINTENANCE_ENABLED:
+        maintenance_lock = locking.FileLock(locking.lock_path("maintenance"))
+        maintenance_claim = asyncio.get_running_loop().create_task(_run_maintenance_when_free(maintenance_lock))
+    app.state.startup["startup_seconds"] = round(time.perf_counter() - started, 4)
+    app.state.ready = True
+    logger.info("Worker %d ready: %s", os.getpid(), app.state.startup)
+    yield
+    app.state.ready = False
+    await checkin_coalescer.stop()
+    if maintenance_claim is not None:
+        maintenance_claim.cancel()
+    await maintenance.scheduler.stop()
+    if maintenance_lock is not None:
+        maintenance_lock.release()
+    await database.dispose_engines()
 
-app = FastAPI(title="Library Log Book")
+app = FastAPI(title="Library Log Book", lifespan=lifespan)
+
+if config.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.instrument_engine(database.engine, "primary")
+    if database.read_engine is not database.engine:
+        metrics.instrument_engine(database.read_engine, "read")
+    if database.async_engine is not None:
+        metrics.instrument_engine(database.async_engine.sync_engine, "async")
+    if database.async_read_engine not in (None, database.async_engine):
+        metrics.instrument_engine(database.async_read_engine.sync_engine, "async_read")
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Get absolute path to the 'app' directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Mount static files correctly
-app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
+# Fingerprinted files under /static/dist are cached for a year (app.assets)
+app.mount("/static", assets.AssetFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
 
-# Mount templates correctly
-templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+# Built on first page view rather than at import: API-only workers and
+# readiness probes never pay for Jinja
+@functools.lru_cache(maxsize=None)
+def get_templates():
+    from fastapi.templating import Jinja2Templates
+
+    templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+    templates.env.globals["asset_url"] = assets.asset_url
+    return templates
 
 app.include_router(logs.router)
 app.include_router(admin.router)
 app.include_router(students.router)
+app.include_router(reports.router)
+app.include_router(occupancy.router)
 
 @app.get("/")
 def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return get_templates().TemplateResponse(request, "index.html")
 
 @app.get("/login")
 def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return get_templates().TemplateResponse(request, "login.html")
 
 @app.get("/dashboard")
 def dashboard_page(request: Request):
-    return templates.TemplateResponse("dashboard.html", {"request": request})
+    return get_templates().TemplateResponse(request, "dashboard.html")
+
+def _ping_database():
+    with database.engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+@app.get("/health/live", include_in_schema=False)
+def liveness():
+    return {"status": "ok"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    """200 once this worker has finished starting up (schema, caches,
+    occupancy map) and can reach the database; 503 until then."""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=503)
+    try:
+        await run_in_threadpool(_ping_database)
+    except Exception:
+        logger.exception("Readiness check could not reach the database")
+        return JSONResponse({"status": "database unavailable"}, status_code=503)
+    return {"status": "ready", "pid": os.getpid(), "startup": app.state.startup}
+
+IMPORT_SECONDS = round(time.perf_counter() - IMPORT_STARTED, 4)
@@ -0,0 +1,227 @@
+"""In-process scheduler for database housekeeping.
+
+Started from the app lifespan when LOGBOOK_MAINTENANCE is on. Jobs run one
+at a time in the threadpool on their own sessions:
+
+- close_stale_sessions: close sessions open longer than
+  LOGBOOK_STALE_SESSION_HOURS (zero duration, see crud.close_stale_sessions)
+- checkpoint: passive WAL checkpoint, so the -wal file doesn't keep growing
+- prune_tombstones: drop delta-sync tombstones older than a week
+- prune_ingest_keys: forget kiosk idempotency keys older than a week
+- optimize (off-peak): truncating checkpoint and incremental vacuum
+- analyze (off-peak): refresh the planner statistics
+- archive (off-peak, LOGBOOK_ARCHIVE_SCHEDULED): app.archive.archive_old_logs
+
+Off-peak jobs only start inside LOGBOOK_MAINTENANCE_WINDOW (IST). The last
+LOGBOOK_MAINTENANCE_HISTORY runs are kept for GET /api/admin/maintenance.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from . import archive, config, crud, database, models
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONE_RETENTION = timedelta(days=7)
+INGEST_KEY_RETENTION = timedelta(days=7)
+
+# Seconds between checks for due jobs
+TICK_SECONDS = 30
+
+
+def parse_window(window: str) -> tuple:
+    """"HH:MM-HH:MM" -> ((h, m), (h, m)); the window may wrap past midnight."""
+    start, end = window.split("-")
+    parse = lambda value: tuple(int(part) for part in value.strip().split(":"))
+    return parse(start), parse(end)
+
+
+def in_window(now, window: str) -> bool:
+    start, end = parse_window(window)
+    current = (now.hour, now.minute)
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+def _is_sqlite(db: Session) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def _autocommit(db: Session):
+    # VACUUM and checkpoints can't run inside a transaction
+    return db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def close_stale_sessions(db: Session) -> dict:
+    closed = crud.close_stale_sessions(db, timedelta(hours=config.STALE_SESSION_HOURS))
+    return {"closed": len(closed)}
+
+
+def checkpoint(db: Session, mode: str = "PASSIVE") -> dict:
+    if not _is_sqlite(db):
+        return {"skipped": "not sqlite"}
+    with _autocommit(db) as conn:
+        busy, log_pages, checkpointed = conn.execute(text(f"PRAGMA wal_checkpoint({mode})")).one()
+    return {"mode": mode, "busy": bool(busy), "log_pages": log_pages, "checkpointed": checkpointed}
+
+
+def prune_tombstones(db: Session) -> dict:
+    return {"pruned": crud.prune_tombstones(db, TOMBSTONE_RETENTION)}
+
+
+def prune_ingest_keys(db: Session) -> dict:
+    return {"pruned": crud.prune_ingest_keys(db, INGEST_KEY_RETENTION)}
+
+
+def optimize(db: Session) -> dict:
+    """Truncate the WAL and return free pages to the filesystem.
+
+    Incremental vacuum needs auto_vacuum=INCREMENTAL, which only a full
+    VACUUM can switch on for an existing file; that is done once, when at
+    least LOGBOOK_VACUUM_FREE_PERCENT of the pages are free.
+    """
+    if not _is_sqlite(db):
+        return {"skipped": "not sqlite"}
+    result = checkpoint(db, "TRUNCATE")
+    with _autocommit(db) as conn:
+        auto_vacuum = conn.execute(text("PRAGMA auto_vacuum")).scalar()
+        free_pages = conn.execute(text("PRAGMA freelist_count")).scalar()
+        page_count = conn.execute(text("PRAGMA page_count")).scalar()
+        result["free_pages"] = free_pages
+        if auto_vacuum == 2:
+            conn.execute(text(f"PRAGMA incremental_vacuum({config.VACUUM_MAX_PAGES})"))
+            result["vacuum"] = "incremental"
+        elif page_count and free_pages * 100 >= page_count * config.VACUUM_FREE_PERCENT:
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+            result["vacuum"] = "full"
+        result["free_pages_after"] = conn.execute(text("PRAGMA freelist_count")).scalar()
+    return result
+
+
+def analyze(db: Session) -> dict:
+    with _autocommit(db) as conn:
+        conn.execute(text("ANALYZE"))
+    return {}
+
+
+def archive_logs(db: Session) -> dict:
+    return {"archived": archive.archive_old_logs(db)}
+
+
+class Job:
+    def __init__(self, name: str, func, interval: float, offpeak: bool = False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.offpeak = offpeak
+        self.last_started = None
+
+    def is_due(self, clock: float, now) -> bool:
+        if self.last_started is not None and clock - self.last_started < self.interval:
+            return False
+        return not self.offpeak or in_window(now, config.MAINTENANCE_WINDOW)
+
+
+class MaintenanceScheduler:
+    """Runs due jobs every TICK_SECONDS and records each run.
+
+    ``run`` is also what the admin endpoint calls for an immediate run; a
+    lock keeps a manual run and a scheduled one from overlapping.
+    """
+
+    def __init__(self, jobs, history: int = 200, session_factory=None, clock=time.monotonic):
+        self.jobs = {job.name: job for job in jobs}
+        self.history = deque(maxlen=history)
+        self._session_factory = session_factory or database.SessionLocal
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._task = None
+
+    def run(self, name: str) -> dict:
+        job = self.jobs[name]
+        with self._lock:
+            job.last_started = self._clock()
+            started_at = models.get_ist_time()
+            started = time.perf_counter()
+            record = {"job": name, "started_at": started_at.isoformat()}
+            try:
+                with self._session_factory() as db:
+                    record["result"] = job.func(db)
+                record["ok"] = True
+            except Exception as e:
+                logger.exception("Maintenance job %s failed", name)
+                record["ok"] = False
+                record["error"] = str(e)
+            record["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            self.history.append(record)
+            return record
+
+    async def run_due(self):
+        now = models.get_ist_time()
+        for job in self.jobs.values():
+            if job.is_due(self._clock(), now):
+                await run_in_threadpool(self.run, job.name)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_due()
+            except Exception:
+                logger.exception("Maintenance scheduler tick failed")
+            await asyncio.sleep(TICK_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> dict:
+        clock = self._clock()
+        return {
+            "running": self._task is not None,
+            "window": config.MAINTENANCE_WINDOW,
+            "jobs": [
+                {
+                    "name": job.name,
+                    "interval_seconds": job.interval,
+                    "offpeak": job.offpeak,
+                    "seconds_since_last_run": None if job.last_started is None else round(clock - job.last_started, 1),
+                }
+                for job in self.jobs.values()
+            ],
+            "history": list(reversed(self.history)),
+        }
+
+
+def default_jobs() -> list:
+    jobs = [
+        Job("close_stale_sessions", close_stale_sessions, config.STALE_SESSION_CHECK_MINUTES * 60),
+        Job("checkpoint", checkpoint, config.CHECKPOINT_MINUTES * 60),
+        Job("prune_tombstones", prune_tombstones, 24 * 3600),
+        Job("prune_ingest_keys", prune_ingest_keys, 24 * 3600),
+        # Once per night: the interval outlasts the window
+        Job("optimize", optimize, 12 * 3600, offpeak=True),
+        Job("analyze", analyze, 12 * 3600, offpeak=True),
+    ]
+    if config.ARCHIVE_SCHEDULED:
+        jobs.append(Job("archive", archive_logs, 12 * 3600, offpeak=True))
+    return jobs
+
+
+scheduler = MaintenanceScheduler(default_jobs(), history=config.MAINTENANCE_HISTORY)
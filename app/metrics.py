@@ -0,0 +1,235 @@
+"""Per-request instrumentation exposed in the Prometheus text format.
+
+MetricsMiddleware times every request by route template. Engine event hooks
+count the queries and DB time of each request through a context variable,
+which follows the request into the threadpool and into AsyncSession's
+run_sync. Each response gets a ``Server-Timing`` header with the DB share.
+
+Requests issuing more than LOGBOOK_QUERY_BUDGET queries (an N+1 pattern)
+are counted and logged, as are requests slower than LOGBOOK_SLOW_REQUEST_MS
+when that is set. Everything is rendered by ``render()`` for GET /metrics.
+Metrics are per process.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from . import config
+from .cache import student_cache, report_cache
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_current = ContextVar("logbook_request_stats", default=None)
+
+
+def current_stats():
+    """The RequestStats of the request being handled, or None."""
+    return _current.get()
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    pairs = ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+REQUESTS = Counter("logbook_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram(
+    "logbook_http_request_duration_seconds", "Request latency, including streamed bodies.", LATENCY_BUCKETS, ("method", "route")
+)
+REQUEST_DB_SECONDS = Histogram(
+    "logbook_http_request_db_seconds", "Time per request spent executing SQL.", LATENCY_BUCKETS, ("method", "route")
+)
+REQUEST_QUERIES = Histogram(
+    "logbook_http_request_queries", "SQL statements per request.", QUERY_COUNT_BUCKETS, ("method", "route")
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    "logbook_query_budget_exceeded_total", "Requests that ran more than LOGBOOK_QUERY_BUDGET statements.", ("method", "route")
+)
+SLOW_REQUESTS = Counter("logbook_slow_requests_total", "Requests slower than LOGBOOK_SLOW_REQUEST_MS.", ("method", "route"))
+QUERY_SECONDS = Histogram("logbook_db_query_duration_seconds", "Latency of single SQL statements.", LATENCY_BUCKETS, ("engine",))
+
+COALESCE_BATCH_SIZE = Histogram(
+    "logbook_checkin_batch_size", "Check-ins written per group commit.", (1, 2, 4, 8, 16, 32, 64, 128)
+)
+COALESCE_WAIT_SECONDS = Histogram(
+    "logbook_checkin_batch_wait_seconds", "Time a check-in waited for its group commit to start.", LATENCY_BUCKETS
+)
+
+METRICS = (
+    REQUESTS, REQUEST_SECONDS, REQUEST_DB_SECONDS, REQUEST_QUERIES, QUERY_BUDGET_EXCEEDED, SLOW_REQUESTS, QUERY_SECONDS,
+    COALESCE_BATCH_SIZE, COALESCE_WAIT_SECONDS,
+)
+
+
+def instrument_engine(engine, name: str):
+    """Time every statement on ``engine`` (a sync Engine; pass
+    ``async_engine.sync_engine`` for asyncio engines)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def finished(conn):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        QUERY_SECONDS.observe(elapsed, name)
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        finished(conn)
+
+    # A failing statement (e.g. the IntegrityError of a duplicate check-in)
+    # never reaches after_cursor_execute; pop its start time here, or the
+    # pooled connection's stack grows and later queries time from it
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        conn = context.connection
+        if conn is not None and context.execution_context is not None and conn.info.get("query_started"):
+            finished(conn)
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (unlike BaseHTTPMiddleware it shares the
+    request's context with the handler, which the query counting needs)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - started) * 1000
+                timing = f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries", app;dur={total_ms:.2f}'
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._record(scope, status, time.perf_counter() - started, stats)
+
+    def _record(self, scope, status: int, elapsed: float, stats: RequestStats):
+        method, route = scope["method"], _route_template(scope)
+        REQUESTS.inc(method, route, str(status))
+        REQUEST_SECONDS.observe(elapsed, method, route)
+        REQUEST_DB_SECONDS.observe(stats.db_seconds, method, route)
+        REQUEST_QUERIES.observe(stats.queries, method, route)
+        if config.QUERY_BUDGET and stats.queries > config.QUERY_BUDGET:
+            QUERY_BUDGET_EXCEEDED.inc(method, route)
+            logger.warning("%s %s ran %d queries (budget %d)", method, scope["path"], stats.queries, config.QUERY_BUDGET)
+        if config.SLOW_REQUEST_MS and elapsed * 1000 >= config.SLOW_REQUEST_MS:
+            SLOW_REQUESTS.inc(method, route)
+            logger.warning(
+                "Slow request %s %s -> %d in %.1f ms (%d queries, %.1f ms in the database)",
+                method, scope["path"], status, elapsed * 1000, stats.queries, stats.db_seconds * 1000,
+            )
+
+
+def _cache_lines() -> list:
+    lines = []
+    for metric, kind, help in (
+        ("hits", "counter", "Cache hits."),
+        ("misses", "counter", "Cache misses."),
+        ("size", "gauge", "Entries currently cached."),
+    ):
+        name = f"logbook_cache_{metric}" + ("_total" if kind == "counter" else "")
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for cache_name, cache in (("students", student_cache), ("reports", report_cache)):
+            lines.append(f'{name}{{cache="{cache_name}"}} {cache.stats()[metric]}')
+    return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    lines += _cache_lines()
+    return "\n".join(lines) + "\n"
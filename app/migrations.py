@@ -0,0 +1,177 @@
+"""Versioned schema migrations for databases that already exist.
+
+``create_all`` only creates missing tables. Index and column changes to
+existing tables are numbered migrations here, recorded in
+``schema_migrations`` and applied in order by init_db at startup:
+
+    python -m app.migrations            # list applied and pending migrations
+    python -m app.migrations upgrade    # apply the pending ones
+
+Each migration runs in its own transaction (DDL is transactional on SQLite
+and PostgreSQL). Its ``schema_migrations`` row is inserted first, which
+takes the write lock, so two processes starting together apply it once.
+Write the steps so they are safe to re-run (IF [NOT] EXISTS, add_column),
+and never edit a migration once it has shipped: add a new one.
+
+A fresh database gets the current schema from create_all, and every
+migration is recorded as applied without running.
+"""
+import logging
+import sys
+import time
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable
+from . import models
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []  # (version, name, function(connection)), in version order
+
+
+def migration(version: int, name: str):
+    def register(function):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append((version, name, function))
+        return function
+    return register
+
+
+# Operations
+def add_column(conn, table: str, column: str, ddl_type: str):
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def create_index(conn, name: str, table: str, expressions: str, unique: bool = False, where: str = None):
+    unique = "UNIQUE " if unique else ""
+    where = f" WHERE {where}" if where else ""
+    conn.execute(text(f"CREATE {unique}INDEX IF NOT EXISTS {name} ON {table} ({expressions}){where}"))
+
+
+def drop_index(conn, name: str):
+    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+# History
+@migration(1, "baseline")
+def baseline(conn):
+    """The schema changes init_db used to apply ad hoc on every start."""
+    add_column(conn, "logs", "version", "INTEGER")
+    create_index(conn, "ix_logs_version", "logs", "version")
+    # Older databases may hold several open sessions for one student, which
+    # the one-open-session index rejects; close all but the newest with a
+    # zero duration first.
+    conn.execute(text(
+        "UPDATE logs SET check_out_time = check_in_time "
+        "WHERE check_out_time IS NULL AND id NOT IN ("
+        "SELECT MAX(id) FROM logs WHERE check_out_time IS NULL GROUP BY student_id)"
+    ))
+    create_index(conn, "ux_logs_active_student", "logs", "student_id", unique=True, where="check_out_time IS NULL")
+    create_index(conn, "ix_log_tombstones_version", "log_tombstones", "version")
+    create_index(conn, "ix_students_name_lower", "students", "lower(name)")
+
+
+@migration(2, "composite log indexes")
+def composite_log_indexes(conn):
+    # A student's sessions (open or closed) without touching other students'
+    create_index(conn, "ix_logs_student_id_check_out_time", "logs", "student_id, check_out_time")
+    # Date-range reports and the newest-first dashboard listing (the id
+    # tie-break rides along as the rowid)
+    create_index(conn, "ix_logs_check_in_time", "logs", "check_in_time")
+    # student_name is never looked up; student_id is the prefix of the new index
+    drop_index(conn, "ix_logs_student_name")
+    drop_index(conn, "ix_logs_student_id")
+    # Copies of the primary keys, which are already the rowid
+    drop_index(conn, "ix_logs_id")
+    drop_index(conn, "ix_students_id")
+
+
+@migration(3, "never reuse log ids")
+def log_ids_autoincrement(conn):
+    """Rebuild logs with AUTOINCREMENT on SQLite, which otherwise hands out
+    max(id) + 1 and so reuses the ids of archived or deleted sessions.
+    PostgreSQL sequences never go back."""
+    if conn.dialect.name != "sqlite":
+        return
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'logs'")).scalar()
+    if "AUTOINCREMENT" not in ddl.upper():
+        table = models.LogEntry.__table__
+        columns = ", ".join(column.name for column in table.columns)
+        create = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+        conn.execute(text(create.replace("CREATE TABLE logs ", "CREATE TABLE logs_rebuilt ", 1)))
+        conn.execute(text(f"INSERT INTO logs_rebuilt ({columns}) SELECT {columns} FROM logs"))
+        conn.execute(text("DROP TABLE logs"))
+        conn.execute(text("ALTER TABLE logs_rebuilt RENAME TO logs"))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+    # Continue after the highest id ever handed out, archived and deleted
+    # (tombstoned) ones included
+    highest = [conn.execute(text("SELECT MAX(id) FROM logs")).scalar() or 0]
+    if inspect(conn).has_table("log_tombstones"):
+        highest.append(conn.execute(text("SELECT MAX(log_id) FROM log_tombstones")).scalar() or 0)
+    if inspect(conn).has_table("archive_partitions"):
+        for (table_name,) in conn.execute(text("SELECT table_name FROM archive_partitions")):
+            highest.append(conn.execute(text(f"SELECT MAX(id) FROM {table_name}")).scalar() or 0)
+    seq = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'logs'")).scalar()
+    if seq is None:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('logs', :seq)"), {"seq": max(highest)})
+    elif seq < max(highest):
+        conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'logs'"), {"seq": max(highest)})
+
+
+def applied(bind) -> dict:
+    """version -> applied_at of the recorded migrations."""
+    table = models.SchemaMigration.__table__
+    with bind.connect() as conn:
+        return {row.version: row.applied_at for row in conn.execute(table.select())}
+
+
+def upgrade(bind, stamp_only: bool = False) -> list:
+    """Apply pending migrations, or with ``stamp_only`` just record them
+    (a database create_all has just built). Returns the versions handled."""
+    table = models.SchemaMigration.__table__
+    table.create(bind=bind, checkfirst=True)
+    done = applied(bind)
+    handled = []
+    for version, name, function in MIGRATIONS:
+        if version in done:
+            continue
+        started = time.perf_counter()
+        try:
+            with bind.begin() as conn:
+                conn.execute(table.insert().values(version=version, name=name, applied_at=models.get_ist_time()))
+                if not stamp_only:
+                    function(conn)
+        except IntegrityError:
+            # Another process got there first
+            continue
+        handled.append(version)
+        if not stamp_only:
+            logger.info("Applied migration %d (%s) in %.2fs", version, name, time.perf_counter() - started)
+    return handled
+
+
+def main(argv=None) -> int:
+    from . import database
+
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "status"
+    if command == "upgrade":
+        database.init_db()
+        print("Database is up to date")
+        return 0
+    if command == "status":
+        models.SchemaMigration.__table__.create(bind=database.engine, checkfirst=True)
+        done = applied(database.engine)
+        for version, name, _ in MIGRATIONS:
+            state = f"applied {done[version]}" if version in done else "pending"
+            print(f"{version:>4}  {name:<30} {state}")
+        return 0
+    print(f"Unknown command {command!r}; use 'status' or 'upgrade'")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
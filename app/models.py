@@ -1,28 +1,117 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Index, func
 from datetime import datetime, timedelta, timezone
 from .database import Base
 
+IST = timezone(timedelta(hours=5, minutes=30))
+
 def get_ist_time():
-    return datetime.now(timezone(timedelta(hours=5, minutes=30)))
+    return datetime.now(IST)
 
 
 class Student(Base):
     __tablename__ = "students"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     register_number = Column(String, unique=True, index=True)
     name = Column(String)
     year = Column(String)
 
+    # Prefix search on names where there is no full-text index (app/search.py)
+    __table_args__ = (Index("ix_students_name_lower", func.lower(name)),)
+
 class LogEntry(Base):
     __tablename__ = "logs"
 
-    id = Column(Integer, primary_key=True, index=True)
-    student_name = Column(String, index=True)
-    student_id = Column(String, index=True) # This matches register_number
+    id = Column(Integer, primary_key=True)
+    student_name = Column(String)
+    student_id = Column(String) # This matches register_number
     computer_number = Column(String)
     purpose = Column(String) # Used for Subject
     year = Column(String) # Snapshot of year
     check_in_time = Column(DateTime, default=get_ist_time)
     check_out_time = Column(DateTime, nullable=True)
     issues_reported = Column(String, nullable=True)
+    # Value of the "logs" change counter when this row was last written
+    version = Column(Integer, nullable=True, index=True)
+
+    __table_args__ = (
+        # At most one open session per student. Partial, so it only holds the
+        # currently open rows and stays tiny however long the history grows.
+        Index(
+            "ux_logs_active_student",
+            "student_id",
+            unique=True,
+            sqlite_where=check_out_time.is_(None),
+            postgresql_where=check_out_time.is_(None),
+        ),
+        Index("ix_logs_student_id_check_out_time", "student_id", "check_out_time"),
+        Index("ix_logs_check_in_time", "check_in_time"),
+        # Ids are never reused, even after the newest rows are archived or
+        # deleted: archived sessions keep theirs, and lists and exports
+        # read across logs and the partitions by id.
+        {"sqlite_autoincrement": True},
+    )
+
+class UsageRollup(Base):
+    """Running usage totals per student and subject, maintained by checkout.
+
+    Mirrors what the stats endpoint used to compute from every closed log;
+    see app/rollups.py for rebuilding and verifying it.
+    """
+    __tablename__ = "usage_rollups"
+
+    register_number = Column(String, primary_key=True)
+    subject = Column(String, primary_key=True)
+    total_seconds = Column(Float, nullable=False, default=0)
+    session_count = Column(Integer, nullable=False, default=0)
+
+class ChangeCounter(Base):
+    """Per-table change counters used for ETags and delta sync.
+
+    Every write to a tracked table bumps its counter in the same
+    transaction, so the counter doubles as a cheap table version.
+    """
+    __tablename__ = "change_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
+
+class LogTombstone(Base):
+    """Ids of deleted logs, so delta sync can report deletions."""
+    __tablename__ = "log_tombstones"
+
+    log_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime, default=get_ist_time)
+
+class ArchivePartition(Base):
+    """A per-term table of archived sessions (see app.archive)."""
+    __tablename__ = "archive_partitions"
+
+    term = Column(String, primary_key=True)
+    table_name = Column(String, nullable=False)
+    term_start = Column(Date, nullable=False)
+    # Exclusive
+    term_end = Column(Date, nullable=False)
+    row_count = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime, default=get_ist_time)
+
+class IngestKey(Base):
+    """Idempotency keys of kiosk actions ingested through POST
+    /api/logs/batch, so a replayed action returns its first outcome."""
+    __tablename__ = "ingest_keys"
+
+    key = Column(String, primary_key=True)
+    status = Column(String, nullable=False)  # "applied" or "rejected"
+    log_id = Column(Integer, nullable=True)
+    detail = Column(String, nullable=True)
+    received_at = Column(DateTime, default=get_ist_time, index=True)
+
+class SchemaMigration(Base):
+    """Migrations applied to this database (see app.migrations)."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=get_ist_time)
@@ -0,0 +1,102 @@
+"""Which computers are in use, kept in memory.
+
+The map holds every open session by computer. It is rebuilt from the open
+``logs`` rows (the ux_logs_active_student partial index) and then kept in
+step with the "logs" change counter. create_log, the batch check-in and
+the checkouts apply their own change when it is the next counter value. Any
+other write leaves a gap: stale-session cleanup, deletes, archival, or
+another worker process. The next reader that checks the counter
+(crud.current_occupancy) then rebuilds the map.
+"""
+import threading
+from datetime import datetime
+from sqlalchemy.orm import Session
+from . import models
+
+ENTRY_FIELDS = ("id", "computer_number", "student_id", "student_name", "year", "check_in_time")
+
+
+def computer_key(computer_number: str) -> str:
+    """PC-05, pc-05 and " PC-05 " are one computer."""
+    return (computer_number or "").strip().upper()
+
+
+def _entry(log) -> dict:
+    """Occupancy entry from a LogEntry, a row or a LogOut dict."""
+    get = log.get if isinstance(log, dict) else lambda field: getattr(log, field)
+    check_in_time = get("check_in_time")
+    return {
+        "log_id": get("id"),
+        "computer_number": get("computer_number"),
+        "student_id": get("student_id"),
+        "student_name": get("student_name"),
+        "year": get("year"),
+        "check_in_time": check_in_time.isoformat() if isinstance(check_in_time, datetime) else check_in_time,
+    }
+
+
+class OccupancyMap:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None  # counter value the map reflects; None until built
+        self._sessions = {}  # log id -> entry
+        self._computers = {}  # computer key -> {log id: entry}
+        self.rebuilds = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def is_current(self, version: int) -> bool:
+        return self._version == version
+
+    def rebuild(self, db: Session, version: int):
+        rows = db.query(*(getattr(models.LogEntry, field) for field in ENTRY_FIELDS)).filter(
+            models.LogEntry.check_out_time == None
+        ).all()
+        with self._lock:
+            self._sessions.clear()
+            self._computers.clear()
+            for row in rows:
+                self._open(_entry(row))
+            self._version = version
+            self.rebuilds += 1
+
+    def apply(self, version: int, opened=(), closed=()) -> bool:
+        """Apply the change that took the counter to ``version``: ``opened``
+        logs (LogEntry objects, rows or dicts) and ``closed`` log ids.
+        Returns False, leaving the map to be rebuilt, when an earlier change
+        is missing."""
+        with self._lock:
+            if self._version is None or version != self._version + 1:
+                return False
+            for log in opened:
+                self._open(_entry(log))
+            for log_id in closed:
+                entry = self._sessions.pop(log_id, None)
+                if entry is not None:
+                    key = computer_key(entry["computer_number"])
+                    self._computers[key].pop(log_id, None)
+                    if not self._computers[key]:
+                        del self._computers[key]
+            self._version = version
+            return True
+
+    def _open(self, entry: dict):
+        self._sessions[entry["log_id"]] = entry
+        self._computers.setdefault(computer_key(entry["computer_number"]), {})[entry["log_id"]] = entry
+
+    def holders(self, computer_number: str) -> list:
+        """Open sessions on ``computer_number``, earliest check-in first."""
+        with self._lock:
+            entries = list(self._computers.get(computer_key(computer_number), {}).values())
+        return sorted(entries, key=lambda entry: entry["log_id"])
+
+    def snapshot(self) -> list:
+        """Every open session, for the occupancy endpoints."""
+        with self._lock:
+            return list(self._sessions.values())
+
+
+# Per process; each worker rebuilds from the database when its counter lags
+occupancy = OccupancyMap()
@@ -0,0 +1,172 @@
+"""Maintenance for the usage_rollups table.
+
+crud keeps the rollups current as sessions close; this module holds the
+shared update helper plus the tools to backfill and verify them:
+
+    python -m app.rollups rebuild   # recompute every rollup from the logs
+    python -m app.rollups check     # compare rollups against the logs
+"""
+import sys
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from . import archive, models
+from .cache import report_cache
+
+UNKNOWN_SUBJECT = "Unknown"
+
+# Rollups and recomputed totals may differ by float rounding between the
+# Python (checkout) and SQL (rebuild) duration arithmetic.
+TOLERANCE_SECONDS = 1.0
+
+
+def subject_key(purpose) -> str:
+    return purpose or UNKNOWN_SUBJECT
+
+
+def duration_seconds(db: Session, start=None, end=None):
+    """SQL expression for check_out_time - check_in_time in seconds."""
+    start = models.LogEntry.check_in_time if start is None else start
+    end = models.LogEntry.check_out_time if end is None else end
+    if db.get_bind().dialect.name == "sqlite":
+        return (func.julianday(end) - func.julianday(start)) * 86400.0
+    return func.extract("epoch", end - start)
+
+
+def subject_expr(column=None):
+    column = models.LogEntry.purpose if column is None else column
+    return func.coalesce(func.nullif(column, ""), UNKNOWN_SUBJECT)
+
+
+def apply_usage(db: Session, deltas):
+    """Add usage to the rollups inside the caller's transaction.
+
+    ``deltas`` maps (register_number, subject) -> (seconds, sessions); use
+    negative values to subtract. Does not commit.
+    """
+    table = models.UsageRollup.__table__
+    for (register_number, subject), (seconds, sessions) in deltas.items():
+        result = db.execute(
+            table.update()
+            .where(table.c.register_number == register_number, table.c.subject == subject)
+            .values(
+                total_seconds=table.c.total_seconds + seconds,
+                session_count=table.c.session_count + sessions,
+            )
+        )
+        if result.rowcount == 0:
+            db.execute(table.insert().values(
+                register_number=register_number,
+                subject=subject,
+                total_seconds=seconds,
+                session_count=sessions,
+            ))
+    if any(sessions < 0 for _, sessions in deltas.values()):
+        # Rows that drop to zero sessions (after deleting logs) carry no usage
+        db.execute(table.delete().where(table.c.session_count <= 0))
+
+
+def usage_from_logs(db: Session, source=None):
+    """Recompute (register_number, subject, seconds, sessions) from closed logs.
+
+    ``source`` is any selectable with the logs columns (defaults to the
+    logs table).
+    """
+    source = models.LogEntry.__table__ if source is None else source
+    subject = subject_expr(source.c.purpose)
+    return db.query(
+        source.c.student_id,
+        subject,
+        func.sum(duration_seconds(db, source.c.check_in_time, source.c.check_out_time)),
+        func.count(),
+    ).filter(
+        source.c.check_in_time != None,
+        source.c.check_out_time != None,
+    ).group_by(source.c.student_id, subject)
+
+
+def usage_for_logs(db: Session, log_ids):
+    """Usage contributed by the closed logs in ``log_ids``, as apply_usage deltas."""
+    deltas = {}
+    for start in range(0, len(log_ids), 500):
+        chunk = log_ids[start:start + 500]
+        rows = usage_from_logs(db).filter(models.LogEntry.id.in_(chunk))
+        for register_number, subject, seconds, sessions in rows:
+            total = deltas.get((register_number, subject), (0.0, 0))
+            deltas[(register_number, subject)] = (total[0] + (seconds or 0.0), total[1] + sessions)
+    return deltas
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every rollup from the logs, archived ones included, in one
+    transaction."""
+    table = models.UsageRollup.__table__
+    db.execute(table.delete())
+    rows = [
+        {"register_number": reg, "subject": subject, "total_seconds": seconds or 0.0, "session_count": sessions}
+        for reg, subject, seconds, sessions in usage_from_logs(db, archive.log_selectable(db))
+    ]
+    if rows:
+        db.execute(table.insert(), rows)
+    from . import crud
+
+    crud.bump_version(db, crud.REPORTS_COUNTER)
+    db.commit()
+    report_cache.clear()
+    return len(rows)
+
+
+def backfill_if_empty(db: Session) -> int:
+    """Rebuild when the rollups table is empty but closed sessions exist,
+    i.e. right after the table was added to an existing database."""
+    if db.query(models.UsageRollup.register_number).first() is not None:
+        return 0
+    closed = db.query(models.LogEntry.id).filter(models.LogEntry.check_out_time != None).first()
+    return rebuild(db) if closed is not None else 0
+
+
+def check(db: Session) -> list:
+    """Return the (register_number, subject, rollup, actual) rows that disagree."""
+    actual = {
+        (reg, subject): (seconds or 0.0, sessions)
+        for reg, subject, seconds, sessions in usage_from_logs(db, archive.log_selectable(db))
+    }
+    stored = {
+        (row.register_number, row.subject): (row.total_seconds, row.session_count)
+        for row in db.query(models.UsageRollup)
+    }
+    mismatches = []
+    for key in sorted(set(actual) | set(stored)):
+        expected = actual.get(key, (0.0, 0))
+        found = stored.get(key, (0.0, 0))
+        if found[1] != expected[1] or abs(found[0] - expected[0]) > TOLERANCE_SECONDS:
+            mismatches.append({
+                "register_number": key[0],
+                "subject": key[1],
+                "rollup": {"total_seconds": found[0], "session_count": found[1]},
+                "actual": {"total_seconds": expected[0], "session_count": expected[1]},
+            })
+    return mismatches
+
+
+def main(argv=None) -> int:
+    from . import database
+
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "check"
+    database.init_db()
+    with database.SessionLocal() as db:
+        if command == "rebuild":
+            print(f"Rebuilt {rebuild(db)} rollup rows")
+            return 0
+        if command == "check":
+            mismatches = check(db)
+            for row in mismatches:
+                print(row)
+            print(f"{len(mismatches)} mismatched rollup rows")
+            return 1 if mismatches else 0
+    print(f"Unknown command {command!r}; use 'rebuild' or 'check'")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
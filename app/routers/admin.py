@@ -1,10 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from sqlalchemy.orm import Session
-from .. import crud, schemas, database
+from .. import crud, schemas, database, config, conditional, archive, maintenance, fastjson
+from ..cache import student_cache, report_cache
+from ..events import event_bus
+from ..coalescer import checkin_coalescer
+import asyncio
 import csv
 import io
+import json
+import time
+import zlib
+from datetime import date
+from typing import Union
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(
     prefix="/api/admin",
@@ -13,7 +23,10 @@ router = APIRouter(
 
 security = HTTPBasic()
 
-def get_current_admin(credentials: HTTPBasicCredentials = Depends(security)):
+EXPORT_BATCH_SIZE = 1000
+MAX_PAGE_SIZE = 500
+
+async def get_current_admin(credentials: HTTPBasicCredentials = Depends(security)):
     if credentials.username != "admin" or credentials.password != "password":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -23,62 +36,272 @@ def get_current_admin(credentials: HTTPBasicCredentials = Depends(security)):
     return credentials.username
 
 @router.post("/login")
-def login(admin: str = Depends(get_current_admin)):
+async def login(admin: str = Depends(get_current_admin)):
     return {"message": "Login successful"}
 
-@router.get("/logs", response_model=list[schemas.LogOut])
-def list_logs(
-    skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(database.get_db),
+@router.get("/logs", response_model=Union[list[schemas.LogOut], schemas.LogDelta])
+async def list_logs(
+    request: Request,
+    response: Response,
+    cursor: str = None,
+    since: int = Query(None, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    start_date: date = None,
+    end_date: date = None,
+    year: str = None,
+    computer_number: str = None,
+    subject: str = None,
+    student_id: str = None,
+    q: str = None,
+    active_only: bool = False,
+    db: Session = Depends(database.get_read_session),
+    admin: str = Depends(get_current_admin)
+):
+    """List logs newest first, or with ``since`` the changes after that
+    watermark (a schemas.LogDelta). Full lists carry an ETag and the
+    current watermark in ``X-Watermark``.
+
+    Rows are selected as columns and encoded by fastjson; response_model
+    only documents the shape.
+    """
+    # Taken before the query: a stream resumed from here can't miss a change
+    event_id = event_bus.last_id
+    response.headers["X-Event-Id"] = str(event_id)
+    filters = dict(
+        start_date=start_date,
+        end_date=end_date,
+        year=year,
+        computer_number=computer_number,
+        subject=subject,
+        student_id=student_id,
+        q=q,
+        active_only=active_only,
+    )
+    if since is not None:
+        delta = await database.run_db(db, crud.get_log_changes, since, **filters)
+        return fastjson.respond(delta, response)
+
+    # Also taken before the query, so the ETag never claims newer data than the body
+    version, updated_at = await database.run_db(db, crud.get_version, crud.LOGS_COUNTER)
+    etag = conditional.make_etag("logs", version, request.url.query)
+    if conditional.is_not_modified(request, etag, updated_at):
+        return conditional.not_modified(etag, updated_at)
+    try:
+        logs, next_cursor = await database.run_db(db, crud.get_logs, cursor=cursor, limit=limit, as_dicts=True, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The body stays a plain list; the next page is advertised in a header
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Watermark"] = str(version)
+    conditional.set_validators(response, etag, updated_at)
+    return fastjson.respond(logs, response)
+
+def _logs_version() -> int:
+    with database.SessionLocal() as db:
+        return crud.get_version(db, crud.LOGS_COUNTER)[0]
+
+def _sse(event_id, event_type: str, data) -> str:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    last_event_id: int = Query(None),
+    last_event_header: str = Header(None, alias="Last-Event-ID"),
     admin: str = Depends(get_current_admin)
 ):
-    return crud.get_logs(db, skip=skip, limit=limit)
+    """Server-Sent Events feed of checkin, checkout, delete and delete_all.
+
+    Resumes after ``Last-Event-ID`` (header or query) when given; a
+    ``reset`` event means the gap can't be replayed and the client should
+    reload its list.
+    """
+    if last_event_id is None and last_event_header and last_event_header.isdigit():
+        last_event_id = int(last_event_header)
+
+    async def stream():
+        last = event_bus.last_id if last_event_id is None else last_event_id
+        # Other workers publish on their own buses; with several workers the
+        # logs counter is polled on a fixed schedule, however busy this
+        # worker's own bus is
+        poll = config.WORKERS > 1
+        logs_version = await run_in_threadpool(_logs_version) if poll else None
+        next_poll = next_keepalive = 0.0
+        yield "retry: 3000\n\n"
+        async with event_bus.subscribe() as wake:
+            while not await request.is_disconnected():
+                wake.clear()
+                events, complete = event_bus.since(last)
+                if not complete:
+                    last = event_bus.last_id
+                    yield _sse(last, "reset", {})
+                for event_id, event_type, data in events:
+                    last = event_id
+                    yield _sse(event_id, event_type, data)
+                now = time.monotonic()
+                if poll and now >= next_poll:
+                    next_poll = now + config.EVENT_POLL_SECONDS
+                    version = await run_in_threadpool(_logs_version)
+                    if version != logs_version:
+                        # Includes this worker's own changes; a delta sync
+                        # from the client's watermark is cheap either way
+                        yield _sse(event_bus.last_id, "reset", {})
+                        logs_version = version
+                if now >= next_keepalive:
+                    next_keepalive = now + config.EVENT_KEEPALIVE_SECONDS
+                    yield ": keepalive\n\n"
+                deadline = min(next_poll, next_keepalive) if poll else next_keepalive
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    pass
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/cache")
+async def cache_stats(admin: str = Depends(get_current_admin)):
+    return {"students": student_cache.stats(), "reports": report_cache.stats()}
+
+@router.get("/occupancy")
+async def occupancy_detail(db: Session = Depends(database.get_session), admin: str = Depends(get_current_admin)):
+    """GET /api/occupancy plus the open sessions on each computer."""
+    return fastjson.respond(await database.run_db(db, crud.get_occupancy, detail=True))
+
+@router.get("/coalescer")
+async def coalescer_stats(admin: str = Depends(get_current_admin)):
+    """Check-in group commit batch sizes and waits, for tuning the window."""
+    return checkin_coalescer.stats()
 
 @router.delete("/logs")
-def delete_logs(
-    db: Session = Depends(database.get_db),
+async def delete_logs(
+    db: Session = Depends(database.get_session),
     admin: str = Depends(get_current_admin)
 ):
-    count = crud.delete_all_logs(db)
+    count = await database.run_db(db, crud.delete_all_logs)
     return {"message": f"Deleted {count} logs"}
 
 @router.post("/logs/delete")
-def delete_selected_logs(
+async def delete_selected_logs(
     log_ids: list[int],
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_session),
     admin: str = Depends(get_current_admin)
 ):
-    count = crud.delete_logs_by_ids(db, log_ids)
+    count = await database.run_db(db, crud.delete_logs_by_ids, log_ids)
     return {"message": f"Deleted {count} logs"}
 
+@router.post("/logs/checkout", response_model=schemas.BulkCheckoutResult)
+async def bulk_checkout(
+    checkout: schemas.BulkCheckout,
+    db: Session = Depends(database.get_session),
+    admin: str = Depends(get_current_admin)
+):
+    """Close every open session matching the filters in one transaction
+    (end of a lab slot)."""
+    filters = dict(
+        log_ids=checkout.log_ids,
+        year=checkout.year,
+        computer_prefix=checkout.computer_prefix,
+        computer_from=checkout.computer_from,
+        computer_to=checkout.computer_to,
+    )
+    if not checkout.all_open and not any(value is not None and value != "" for value in filters.values()):
+        raise HTTPException(status_code=400, detail="Give a filter or set all_open to close every open session")
+    logs = await database.run_db(db, crud.checkout_logs_bulk, issues_reported=checkout.issues_reported, **filters)
+    return fastjson.respond({"count": len(logs), "logs": logs})
+
+EXPORT_HEADER = ["ID", "Register Number", "Name", "Year", "Computer", "Subject", "Check-in", "Check-out", "Issues"]
+
+def _stream_logs_csv(session: Session, filters: dict, compress: bool):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 -> gzip container
+
+    def drain():
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    try:
+        writer.writerow(EXPORT_HEADER)
+        pending = 0
+        for row in crud.iter_log_rows(session, batch_size=EXPORT_BATCH_SIZE, **filters):
+            writer.writerow(row)
+            pending += 1
+            if pending >= EXPORT_BATCH_SIZE:
+                chunk = drain()
+                pending = 0
+                if chunk:
+                    yield chunk
+        chunk = drain()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+    finally:
+        session.close()
+
+# Stays sync: the CSV generator streams from the threadpool on a sync
+# session regardless of LOGBOOK_ASYNC_DB.
 @router.get("/export")
 def export_logs(
-    db: Session = Depends(database.get_db),
+    start_date: date = None,
+    end_date: date = None,
+    year: str = None,
+    computer_number: str = None,
+    gzip: bool = False,
+    db: Session = Depends(database.get_read_db),
     admin: str = Depends(get_current_admin)
 ):
-    logs = crud.get_logs(db, limit=10000)
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["ID", "Register Number", "Name", "Year", "Computer", "Subject", "Check-in", "Check-out", "Issues"])
-    
-    for log in logs:
-        writer.writerow([
-            log.id, 
-            log.student_id, 
-            log.student_name, 
-            log.year,
-            log.computer_number, 
-            log.purpose, 
-            log.check_in_time, 
-            log.check_out_time, 
-            log.issues_reported
-        ])
-    
-    output.seek(0)
+    filters = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "year": year,
+        "computer_number": computer_number,
+    }
+    # The stream outlives this request's dependencies, so it gets its own session
+    session = Session(bind=db.get_bind())
+    filename = "logs.csv.gz" if gzip else "logs.csv"
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=logs.csv"}
+        _stream_logs_csv(session, filters, compress=gzip),
+        media_type="application/gzip" if gzip else "text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
+
+@router.get("/archive", response_model=list[schemas.ArchivePartitionOut])
+async def list_archive_partitions(
+    db: Session = Depends(database.get_read_session),
+    admin: str = Depends(get_current_admin)
+):
+    return await database.run_db(db, archive.partitions)
+
+# Stays sync: archiving sleeps between batches, which must happen in the
+# threadpool rather than on the event loop.
+@router.post("/archive")
+def archive_logs(
+    older_than_days: int = Query(None, ge=0),
+    max_batches: int = Query(None, ge=1),
+    db: Session = Depends(database.get_db),
+    admin: str = Depends(get_current_admin)
+):
+    """Move closed sessions older than ``older_than_days`` (default
+    LOGBOOK_ARCHIVE_AFTER_DAYS) into their term archive tables."""
+    moved = archive.archive_old_logs(db, older_than_days, max_batches=max_batches)
+    return {"archived": moved, "partitions": [p.term for p in archive.partitions(db)]}
+
+@router.get("/maintenance")
+async def maintenance_status(admin: str = Depends(get_current_admin)):
+    """Scheduled jobs and the most recent runs, newest first."""
+    return maintenance.scheduler.status()
+
+# Stays sync: jobs block (VACUUM, batched archival), so they run in the threadpool
+@router.post("/maintenance/{job}")
+def run_maintenance_job(job: str, admin: str = Depends(get_current_admin)):
+    if job not in maintenance.scheduler.jobs:
+        raise HTTPException(status_code=404, detail=f"Unknown maintenance job: {job}")
+    return maintenance.scheduler.run(job)
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from .. import crud, schemas, database
+from .. import crud, schemas, database, config
+from ..coalescer import checkin_coalescer
+from ..occupancy import occupancy
 
 router = APIRouter(
     prefix="/api/logs",
@@ -8,29 +10,53 @@ router = APIRouter(
 )
 
 @router.post("/checkin", response_model=schemas.LogOut)
-def check_in(log: schemas.LogCreate, db: Session = Depends(database.get_db)):
-    # Check if student already has an active session
-    active_log = crud.get_active_log_by_student(db, log.student_id)
-    if active_log:
-        raise HTTPException(status_code=400, detail="Student already checked in.")
+async def check_in(log: schemas.LogCreate, response: Response, db: Session = Depends(database.get_session)):
     try:
-        return crud.create_log(db, log)
+        if config.CHECKIN_COALESCE:
+            db_log = await checkin_coalescer.submit(log)
+        else:
+            db_log = await database.run_db(db, crud.create_log, log)
+    except crud.ActiveSessionExists as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except crud.ComputerInUse as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    if config.COMPUTER_CONFLICT == "warn":
+        # create_log brought the map up to date, so this is a memory lookup
+        log_id = db_log["id"] if isinstance(db_log, dict) else db_log.id
+        if any(holder["log_id"] != log_id for holder in occupancy.holders(log.computer_number)):
+            response.headers["X-Computer-Conflict"] = log.computer_number
+    return db_log
+
+@router.post("/batch", response_model=list[schemas.LogActionResult])
+async def ingest_batch(batch: schemas.LogBatch, response: Response, db: Session = Depends(database.get_session)):
+    """Check-ins and checkouts a kiosk queued while offline, replayed in
+    order in one transaction. Safe to retry: each key is applied once.
+    ``X-Max-Batch`` tells the kiosk how many actions to send at a time."""
+    cap = {"X-Max-Batch": str(config.INGEST_MAX_BATCH)}
+    response.headers.update(cap)
+    if len(batch.actions) > config.INGEST_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {config.INGEST_MAX_BATCH} actions per batch", headers=cap)
+    if any(not action.key or len(action.key) > 64 for action in batch.actions):
+        raise HTTPException(status_code=422, detail="Every action needs a key of at most 64 characters", headers=cap)
+    if not batch.actions:
+        return []
+    return await database.run_db(db, crud.ingest_log_actions, batch.actions, batch.sent_at)
 
 @router.put("/checkout/{log_id}", response_model=schemas.LogOut)
-def check_out(log_id: int, update: schemas.LogUpdate, db: Session = Depends(database.get_db)):
-    db_log = crud.get_log_by_id(db, log_id)
+async def check_out(log_id: int, update: schemas.LogUpdate, db: Session = Depends(database.get_session)):
+    try:
+        db_log = await database.run_db(db, crud.checkout_log, log_id, update.issues_reported)
+    except crud.AlreadyCheckedOut as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not db_log:
         raise HTTPException(status_code=404, detail="Log entry not found")
-    if db_log.check_out_time:
-        raise HTTPException(status_code=400, detail="Already checked out")
-    
-    return crud.checkout_log(db, log_id, update.issues_reported)
+    return db_log
 
 @router.get("/active/{student_id}", response_model=schemas.LogOut)
-def get_active_log(student_id: str, db: Session = Depends(database.get_db)):
-    log = crud.get_active_log_by_student(db, student_id)
+async def get_active_log(student_id: str, db: Session = Depends(database.get_session)):
+    log = await database.run_db(db, crud.get_active_log_by_student, student_id)
     if not log:
         raise HTTPException(status_code=404, detail="No active session found")
     return log
@@ -0,0 +1,50 @@
+import asyncio
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from .. import crud, database, config, fastjson
+from ..events import event_bus
+
+# Public, for the lab desk and kiosks: computers and since when they are in
+# use, but not who is on them (that is GET /api/admin/occupancy).
+router = APIRouter(
+    prefix="/api/occupancy",
+    tags=["occupancy"]
+)
+
+@router.get("")
+async def read_occupancy(db: Session = Depends(database.get_session)):
+    # Answered from memory; the only query is the counter check
+    return fastjson.respond(await database.run_db(db, crud.get_occupancy))
+
+def _load_occupancy() -> dict:
+    with database.SessionLocal() as db:
+        return crud.get_occupancy(db)
+
+@router.get("/events")
+async def occupancy_events(request: Request):
+    """Server-Sent Events feed: an ``occupancy`` event with the full map
+    whenever a computer is taken or freed."""
+
+    async def stream():
+        last = None
+        yield "retry: 3000\n\n"
+        async with event_bus.subscribe() as wake:
+            while not await request.is_disconnected():
+                wake.clear()
+                current = await run_in_threadpool(_load_occupancy)
+                if current["computers"] != last:
+                    last = current["computers"]
+                    yield f"event: occupancy\ndata: {fastjson.dumps(current).decode()}\n\n"
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=config.EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Also picks up changes made by other worker processes
+                    yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
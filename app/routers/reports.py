@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import date
+from .. import crud, schemas, database, models
+from .admin import get_current_admin
+
+router = APIRouter(
+    prefix="/api/admin/reports",
+    tags=["reports"]
+)
+
+def _hours(seconds) -> float:
+    return round((seconds or 0) / 3600, 2)
+
+def _check_range(start_date: date, end_date: date):
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+@router.get("/usage")
+async def usage_report(
+    group_by: schemas.ReportDimension,
+    start_date: date = None,
+    end_date: date = None,
+    year: str = None,
+    db: Session = Depends(database.get_read_session),
+    admin: str = Depends(get_current_admin)
+):
+    _check_range(start_date, end_date)
+    params = {"group_by": group_by.value, "start_date": start_date, "end_date": end_date, "year": year}
+
+    def build(session):
+        rows = crud.usage_report(session, group_by.value, start_date=start_date, end_date=end_date, year=year)
+        return {
+            **params,
+            "generated_at": models.get_ist_time().isoformat(),
+            "total_hours": _hours(sum(row.seconds or 0 for row in rows)),
+            "rows": [
+                {"key": row.key, "hours": _hours(row.seconds), "sessions": row.sessions, "students": row.students}
+                for row in rows
+            ],
+        }
+
+    return await database.run_db(db, crud.cached_report, "usage", params, build)
+
+@router.get("/top-students")
+async def top_students_report(
+    limit: int = Query(10, ge=1, le=100),
+    start_date: date = None,
+    end_date: date = None,
+    year: str = None,
+    db: Session = Depends(database.get_read_session),
+    admin: str = Depends(get_current_admin)
+):
+    _check_range(start_date, end_date)
+    params = {"limit": limit, "start_date": start_date, "end_date": end_date, "year": year}
+
+    def build(session):
+        rows = crud.top_students(session, limit=limit, start_date=start_date, end_date=end_date, year=year)
+        return {
+            **params,
+            "generated_at": models.get_ist_time().isoformat(),
+            "rows": [
+                {
+                    "register_number": row.student_id,
+                    "name": row.student_name,
+                    "year": row.year,
+                    "hours": _hours(row.seconds),
+                    "sessions": row.sessions,
+                }
+                for row in rows
+            ],
+        }
+
+    return await database.run_db(db, crud.cached_report, "top-students", params, build)
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File
 from sqlalchemy.orm import Session
-from .. import crud, schemas, database
-from .admin import get_current_admin
+from .. import crud, schemas, database, importer, conditional, fastjson, search
+from .admin import get_current_admin, MAX_PAGE_SIZE
 import csv
 import io
 
@@ -10,64 +10,31 @@ router = APIRouter(
     tags=["students"]
 )
 
+# Stays sync on a sync session: CSV parsing is CPU work, so it belongs in the
+# threadpool rather than on the event loop even when LOGBOOK_ASYNC_DB is set.
 @router.post("/import")
-async def import_students(
+def import_students(
     file: UploadFile = File(...),
+    upsert: bool = False,
     db: Session = Depends(database.get_db),
     admin: str = Depends(get_current_admin)
 ):
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV.")
-    
-    content = await file.read()
+
+    # Sync endpoint: runs in the threadpool so the import never blocks the event loop
     try:
-        decoded_content = content.decode("utf-8")
-        reader = csv.DictReader(io.StringIO(decoded_content))
-        
-        # Verify headers
-        required_headers = {'register_number', 'name', 'year'}
-        if not reader.fieldnames or not required_headers.issubset(set(reader.fieldnames)):
-            raise HTTPException(status_code=400, detail=f"Invalid headers. Required: {required_headers}")
-        
-        count = 0
-        errors = []
-        
-        for row in reader:
-            try:
-                # Basic validation
-                reg_no = row.get('register_number', '').strip()
-                name = row.get('name', '').strip()
-                year = row.get('year', '').strip()
-                
-                if not reg_no or not name:
-                    continue
-                    
-                # Schema validation (optional, allows strict checking)
-                student_data = schemas.StudentCreate(
-                    register_number=reg_no,
-                    name=name,
-                    year=year
-                )
-                
-                # Check exist
-                existing = crud.get_student_by_reg_no(db, reg_no)
-                if not existing:
-                    crud.create_student(db, student_data)
-                    count += 1
-                else:
-                    # Optional: Update existing? For now, skip.
-                    pass
-                    
-            except Exception as e:
-                errors.append(f"Row error ({row}): {str(e)}")
-                
-        return {"message": f"Successfully imported {count} students", "errors": errors}
-        
-    except Exception as e:
+        result = importer.import_students_csv(db, file.file, upsert=upsert)
+    except importer.CSVFormatError as e:
         raise HTTPException(status_code=400, detail=f"Failed to parse CSV: {str(e)}")
 
+    message = f"Successfully imported {result['inserted']} students"
+    if upsert:
+        message += f", updated {result['updated']}"
+    return {"message": message, **result}
+
 @router.get("/template")
-def get_student_template(admin: str = Depends(get_current_admin)):
+async def get_student_template(admin: str = Depends(get_current_admin)):
     # Create a simple CSV template
     output = io.StringIO()
     writer = csv.writer(output)
@@ -85,29 +52,78 @@ def get_student_template(admin: str = Depends(get_current_admin)):
     )
 
 @router.post("/", response_model=schemas.StudentOut)
-def create_student(
+async def create_student(
     student: schemas.StudentCreate, 
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_session),
     admin: str = Depends(get_current_admin)
 ):
-    db_student = crud.get_student_by_reg_no(db, register_number=student.register_number)
+    db_student = await database.run_db(db, crud.get_student_by_reg_no, register_number=student.register_number)
     if db_student:
         raise HTTPException(status_code=400, detail="Student already registered")
-    return crud.create_student(db=db, student=student)
+    return await database.run_db(db, crud.create_student, student=student)
 
 @router.get("/", response_model=list[schemas.StudentOut])
-def read_students(
-    skip: int = 0, 
-    limit: int = 100, 
+async def read_students(
+    request: Request,
+    response: Response,
+    cursor: str = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     year: str = None,
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_read_session),
+    admin: str = Depends(get_current_admin)
+):
+    version, updated_at = await database.run_db(db, crud.get_version, crud.STUDENTS_COUNTER)
+    etag = conditional.make_etag("students", version, request.url.query)
+    if conditional.is_not_modified(request, etag, updated_at):
+        return conditional.not_modified(etag, updated_at)
+    try:
+        students, next_cursor = await database.run_db(
+            db, crud.get_students, cursor=cursor, limit=limit, year=year, as_dicts=True
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    conditional.set_validators(response, etag, updated_at)
+    return fastjson.respond(students, response)
+
+# /search and /suggest are declared before /{register_number}, which would
+# otherwise match them.
+@router.get("/search", response_model=list[schemas.StudentOut])
+async def search_students(
+    response: Response,
+    q: str = Query(..., min_length=search.MIN_QUERY_LENGTH, max_length=100),
+    cursor: str = None,
+    limit: int = Query(10, ge=1, le=search.MAX_RESULTS),
+    year: str = None,
+    db: Session = Depends(database.get_read_session),
     admin: str = Depends(get_current_admin)
 ):
-    return crud.get_students(db, skip=skip, limit=limit, year=year)
+    try:
+        students, next_cursor = await database.run_db(
+            db, search.search_students, q, cursor=cursor, limit=limit, year=year
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return fastjson.respond(students, response)
+
+# Public like the register number lookup: the check-in form autocompletes
+# with it
+@router.get("/suggest", response_model=list[str])
+async def suggest_register_numbers(
+    q: str = Query(..., min_length=search.SUGGEST_MIN_LENGTH, max_length=50),
+    limit: int = Query(search.SUGGEST_MAX_RESULTS, ge=1, le=search.SUGGEST_MAX_RESULTS),
+    db: Session = Depends(database.get_read_session),
+):
+    return await database.run_db(db, search.suggest_register_numbers, q, limit)
 
 @router.get("/{register_number}", response_model=schemas.StudentOut)
-def read_student_by_reg(register_number: str, db: Session = Depends(database.get_db)):
-    db_student = crud.get_student_by_reg_no(db, register_number=register_number)
+async def read_student_by_reg(register_number: str, db: Session = Depends(database.get_session)):
+    # lookup_student answers from student_cache (counting each lookup once)
+    # and only queries on a miss
+    db_student = await database.run_db(db, crud.lookup_student, register_number=register_number)
     if db_student:
         return db_student
     # This endpoint is public for the check-in form. 
@@ -115,49 +131,40 @@ def read_student_by_reg(register_number: str, db: Session = Depends(database.get
     raise HTTPException(status_code=404, detail="Student not found")
 
 @router.put("/{student_id}", response_model=schemas.StudentOut)
-def update_student(
+async def update_student(
     student_id: int, 
     student: schemas.StudentUpdate, 
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_session),
     admin: str = Depends(get_current_admin)
 ):
-    db_student = crud.update_student(db, student_id, student)
+    db_student = await database.run_db(db, crud.update_student, student_id, student)
     if not db_student:
         raise HTTPException(status_code=404, detail="Student not found")
     return db_student
 
 @router.delete("/{student_id}")
-def delete_student(
+async def delete_student(
     student_id: int, 
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_session),
     admin: str = Depends(get_current_admin)
 ):
-    db_student = crud.delete_student(db, student_id)
+    db_student = await database.run_db(db, crud.delete_student, student_id)
     if not db_student:
         raise HTTPException(status_code=404, detail="Student not found")
     return {"message": "Student deleted successfully"}
 
 @router.get("/{register_number}/stats")
-def get_student_stats(
+async def get_student_stats(
     register_number: str, 
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_read_session),
     admin: str = Depends(get_current_admin)
 ):
-    logs = crud.get_student_logs(db, register_number)
-    
-    total_seconds = 0
-    subject_stats = {}
-    
-    for log in logs:
-        if log.check_in_time and log.check_out_time:
-            duration = (log.check_out_time - log.check_in_time).total_seconds()
-            total_seconds += duration
-            
-            subject = log.purpose or "Unknown"
-            if subject not in subject_stats:
-                subject_stats[subject] = 0
-            subject_stats[subject] += duration
-            
+    # One indexed read of the per-subject rollups maintained at checkout
+    usage = await database.run_db(db, crud.get_student_usage, register_number)
+
+    total_seconds = sum(seconds for _, seconds, _ in usage)
+    subject_stats = {subject: seconds for subject, seconds, _ in usage}
+
     # Convert seconds to hours (rounded to 2 decimal places)
     total_hours = round(total_seconds / 3600, 2)
     subject_hours = {sub: round(sec / 3600, 2) for sub, sec in subject_stats.items()}
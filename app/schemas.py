@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
+from enum import Enum
 
 # Student Schemas
 class StudentBase(BaseModel):
@@ -50,3 +51,81 @@ class LogOut(LogBase):
 
     class Config:
         orm_mode = True
+
+class BulkCheckout(BaseModel):
+    """Which open sessions to close; all given filters must match. With no
+    filter, ``all_open`` must be set to close every open session."""
+    log_ids: Optional[list[int]] = None
+    year: Optional[str] = None
+    computer_prefix: Optional[str] = None
+    computer_from: Optional[str] = None
+    computer_to: Optional[str] = None
+    issues_reported: Optional[str] = None
+    all_open: bool = False
+
+class BulkCheckoutResult(BaseModel):
+    count: int
+    logs: list[LogOut]
+
+class LogAction(str, Enum):
+    checkin = "checkin"
+    checkout = "checkout"
+
+class QueuedLogAction(BaseModel):
+    """A check-in or checkout recorded by a kiosk, possibly while offline.
+
+    ``key`` is the kiosk's idempotency key and ``at`` its clock when the
+    student acted. A checkout closes ``log_id`` if given, else the
+    student's open session.
+    """
+    key: str
+    action: LogAction
+    student_id: str
+    at: datetime
+    computer_number: Optional[str] = None
+    purpose: Optional[str] = None
+    log_id: Optional[int] = None
+    issues_reported: Optional[str] = None
+
+class LogBatch(BaseModel):
+    """``sent_at`` is the kiosk clock at sending time; the difference to
+    the server clock corrects the ``at`` of every action."""
+    actions: list[QueuedLogAction]
+    sent_at: Optional[datetime] = None
+
+class LogActionResult(BaseModel):
+    key: str
+    status: str  # "applied" or "rejected"
+    duplicate: bool = False
+    detail: Optional[str] = None
+    conflict: Optional[str] = None  # computer also in use (warn mode)
+    log: Optional[LogOut] = None
+
+class LogDelta(BaseModel):
+    """Changes since a watermark (the ``since`` mode of the admin log list).
+
+    ``reset`` means the watermark is too old to describe as a delta (logs
+    were cleared or too much changed) and the client should reload.
+    """
+    watermark: int
+    reset: bool = False
+    changes: list[LogOut] = []
+    deleted: list[int] = []
+
+# Archive Schemas
+class ArchivePartitionOut(BaseModel):
+    term: str
+    table_name: str
+    term_start: date
+    term_end: date
+    row_count: int
+    archived_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+# Report Schemas
+class ReportDimension(str, Enum):
+    year = "year"
+    subject = "subject"
+    computer = "computer"
@@ -0,0 +1,171 @@
+"""Type-ahead student search.
+
+On SQLite with FTS5, ``students_fts`` is an external-content full-text
+index over students.register_number and students.name. Triggers keep it in
+sync with every write, including the importer's bulk inserts. Each query
+token matches word prefixes ("jo do" finds "John Doe"). Results are ranked
+by bm25, with an exact register number first.
+
+On other backends, or on SQLite builds without FTS5, the search falls back
+to prefix ranges over the register number and ``lower(name)`` (both
+indexed). That only matches the start of the name.
+
+Name search is for admins. The public check-in form only gets register
+numbers completed from a prefix (suggest_register_numbers).
+"""
+import re
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import Session
+from . import crud, models
+
+FTS_TABLE = "students_fts"
+MIN_QUERY_LENGTH = 2
+MAX_RESULTS = 50
+# Public autocomplete: long prefixes and few results, so the roster can't be
+# paged through from the kiosk
+SUGGEST_MIN_LENGTH = 4
+SUGGEST_MAX_RESULTS = 5
+
+_FTS_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "register_number, name, content='students', content_rowid='id', "
+    # Prefix indexes make the 2- and 3-character queries typed first cheap
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+_FTS_TRIGGERS = {
+    "students_fts_insert": (
+        f"CREATE TRIGGER students_fts_insert AFTER INSERT ON students BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, register_number, name) VALUES (new.id, new.register_number, new.name); END"
+    ),
+    "students_fts_delete": (
+        f"CREATE TRIGGER students_fts_delete AFTER DELETE ON students BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, register_number, name) "
+        f"VALUES ('delete', old.id, old.register_number, old.name); END"
+    ),
+    "students_fts_update": (
+        f"CREATE TRIGGER students_fts_update AFTER UPDATE OF register_number, name ON students BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, register_number, name) "
+        f"VALUES ('delete', old.id, old.register_number, old.name); "
+        f"INSERT INTO {FTS_TABLE}(rowid, register_number, name) VALUES (new.id, new.register_number, new.name); END"
+    ),
+}
+
+# Database URL -> whether the FTS index is usable there
+_fts_available = {}
+
+
+def _key(bind) -> str:
+    return bind.engine.url.render_as_string(hide_password=True)
+
+
+def ensure_index(bind) -> bool:
+    """Create the FTS table and its triggers if missing and fill it from
+    ``students`` when either had to be created. Returns False when the
+    database can't have one (not SQLite, or no FTS5)."""
+    if bind.dialect.name != "sqlite":
+        _fts_available[_key(bind)] = False
+        return False
+    with bind.begin() as conn:
+        existing = {
+            name for (name,) in conn.execute(
+                text("SELECT name FROM sqlite_master WHERE name = :table OR (type = 'trigger' AND tbl_name = 'students')"),
+                {"table": FTS_TABLE},
+            )
+        }
+        try:
+            conn.execute(text(_FTS_SCHEMA))
+        except Exception:  # sqlite3.OperationalError: no such module: fts5
+            _fts_available[_key(bind)] = False
+            return False
+        for name, ddl in _FTS_TRIGGERS.items():
+            if name not in existing:
+                conn.execute(text(ddl))
+        if not existing.issuperset({FTS_TABLE, *_FTS_TRIGGERS}):
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    _fts_available[_key(bind)] = True
+    return True
+
+
+def rebuild_index(bind):
+    """Refill the FTS index from ``students`` (after restoring a backup, say)."""
+    with bind.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def _uses_fts(db: Session) -> bool:
+    bind = db.get_bind()
+    key = _key(bind)
+    if key not in _fts_available:
+        _fts_available[key] = bind.dialect.name == "sqlite" and db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :table"), {"table": FTS_TABLE}
+        ).first() is not None
+    return _fts_available[key]
+
+
+def _tokens(query: str) -> list:
+    return re.findall(r"\w+", query.lower())
+
+
+def _match_expression(tokens: list) -> str:
+    # Quoted so FTS5 operators and column filters in user input stay literal
+    return " AND ".join(f'"{token}"*' for token in tokens)
+
+
+def search_students(db: Session, query: str, cursor: str = None, limit: int = 10, year: str = None):
+    """Return (students, next_cursor) for ``query`` as StudentOut dicts,
+    best match first. Ranked results page by offset, wrapped in the same
+    opaque cursor tokens as the other listings."""
+    offset = 0
+    if cursor:
+        values = crud.decode_cursor(cursor)
+        if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+            raise ValueError("Invalid cursor")
+        offset = values[0]
+    tokens = _tokens(query)
+    if not tokens:
+        return [], None
+
+    if _uses_fts(db):
+        year_filter = "AND s.year = :year " if year else ""
+        rows = db.execute(
+            text(
+                "SELECT s.register_number, s.name, s.year, s.id "
+                f"FROM {FTS_TABLE} JOIN students s ON s.id = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH :match {year_filter}"
+                # Register number hits weigh more than name hits
+                f"ORDER BY lower(s.register_number) = :exact DESC, bm25({FTS_TABLE}, 10.0, 1.0), s.name, s.id "
+                "LIMIT :limit OFFSET :offset"
+            ),
+            {
+                "match": _match_expression(tokens), "exact": query.strip().lower(), "year": year,
+                "limit": limit + 1, "offset": offset,
+            },
+        ).all()
+    else:
+        prefix = query.strip()
+        lowered = prefix.lower()
+        q = db.query(*(getattr(models.Student, field) for field in crud.STUDENT_FIELDS)).filter(
+            or_(
+                models.Student.register_number.between(prefix, prefix + "\uffff"),
+                func.lower(models.Student.name).between(lowered, lowered + "\uffff"),
+            )
+        )
+        if year:
+            q = q.filter(models.Student.year == year)
+        q = q.order_by((models.Student.register_number == prefix).desc(), models.Student.name, models.Student.id)
+        rows = q.offset(offset).limit(limit + 1).all()
+
+    next_cursor = crud.encode_cursor(offset + limit) if len(rows) > limit else None
+    return [row._asdict() for row in rows[:limit]], next_cursor
+
+
+def suggest_register_numbers(db: Session, prefix: str, limit: int = SUGGEST_MAX_RESULTS) -> list:
+    """Register numbers starting with ``prefix``, in order, for the public
+    check-in form. Names stay out; the form looks the chosen number up."""
+    prefix = prefix.strip()
+    if len(prefix) < SUGGEST_MIN_LENGTH:
+        return []
+    rows = db.query(models.Student.register_number).filter(
+        models.Student.register_number.between(prefix, prefix + "\uffff")
+    ).order_by(models.Student.register_number).limit(min(limit, SUGGEST_MAX_RESULTS))
+    return [register_number for (register_number,) in rows]
@@ -0,0 +1,62 @@
+"""Production launcher: migrate once, then serve with several workers.
+
+    python -m app.serve [--workers N] [--host 0.0.0.0] [--port 8000]
+
+The schema is created/migrated in this process before any worker starts,
+and the workers are told to skip it (LOGBOOK_INIT_DB=0). Static assets are
+fingerprinted here too (app.assets). The workers then only import the app
+and warm their caches, so none of them runs DDL and they all come up
+quickly. Workers default to $WEB_CONCURRENCY, else one
+per CPU. GET /health/ready answers 200 once a worker is warm.
+
+Per-process state across workers:
+- Maintenance runs in one worker, the holder of a file lock (app.locking).
+- The occupancy map follows the database change counter.
+- The student and report caches are cleared when the students or reports
+  counters move (crud.sync_caches).
+- Dashboard event streams poll that counter for changes made by other
+  workers.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s:     %(message)s")
+
+    started = time.perf_counter()
+    from . import assets, database, main as app_main
+
+    app_main.init_database()
+    assets.ensure_built()
+    database.engine.dispose()
+    logging.info("Schema ready in %.2fs; starting %d workers", time.perf_counter() - started, args.workers)
+
+    # Inherited by the workers, which re-read app.config at import
+    os.environ["LOGBOOK_INIT_DB"] = "0"
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+
+    import uvicorn
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        proxy_headers=True,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
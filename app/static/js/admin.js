@@ -155,18 +155,63 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 let allLogs = [];
+let nextLogCursor = null;
+// Logs version the list was read at; ?since= returns the changes after it
+let logWatermark = null;
+let filterTimer = null;
+
+// Filters are applied server-side; the API pages with opaque cursors
+// returned in the X-Next-Cursor header.
+function buildLogParams() {
+    const params = new URLSearchParams();
+    const value = (id) => {
+        const el = document.getElementById(id);
+        return el ? el.value.trim() : '';
+    };
+
+    const dateFrom = value('filter_date');
+    const dateTo = value('filter_date_to') || dateFrom;
+    if (dateFrom) params.set('start_date', dateFrom);
+    if (dateTo) params.set('end_date', dateTo);
+    if (value('filter_year')) params.set('year', value('filter_year'));
+    if (value('filter_purpose')) params.set('subject', value('filter_purpose'));
+    if (value('filter_student_id')) params.set('student_id', value('filter_student_id'));
+    if (value('filter_general')) params.set('q', value('filter_general'));
+
+    const activeOnly = document.getElementById('filter_active');
+    if (activeOnly && activeOnly.checked) params.set('active_only', 'true');
+    return params;
+}
 
-async function loadDashboard() {
+function updateLoadMore(buttonId, cursor) {
+    const btn = document.getElementById(buttonId);
+    if (btn) btn.style.display = cursor ? 'inline-block' : 'none';
+}
+
+async function loadDashboard(append) {
     if (!isAuthenticated()) return;
 
+    // Also used as an event listener, so only an explicit true appends
+    const appending = append === true && !!nextLogCursor;
+    const params = buildLogParams();
+    if (appending) params.set('cursor', nextLogCursor);
+
     try {
-        const response = await fetch(API_BASE + '/logs', {
+        const response = await fetch(API_BASE + '/logs?' + params.toString(), {
             headers: { 'Authorization': getAuthHeader() }
         });
 
         if (response.ok) {
-            allLogs = await response.json();
+            const page = await response.json();
+            nextLogCursor = response.headers.get('X-Next-Cursor');
+            allLogs = appending ? allLogs.concat(page) : page;
+            if (!appending) logWatermark = response.headers.get('X-Watermark');
             renderLogs(allLogs);
+            updateLoadMore('btn-load-more-logs', nextLogCursor);
+
+            // Live updates resume from the moment this list was read
+            if (lastEventId === null) lastEventId = response.headers.get('X-Event-Id');
+            connectEvents();
         } else {
             if (response.status === 401) logout();
             else showAlert('Failed to load logs', 'error');
@@ -176,31 +221,74 @@ async function loadDashboard() {
     }
 }
 
+function compareLogs(a, b) {
+    // Newest check-in first, like the server's ordering
+    if (a.check_in_time !== b.check_in_time) return a.check_in_time < b.check_in_time ? 1 : -1;
+    return b.id - a.id;
+}
+
+// Fetch only what changed since logWatermark and merge it into allLogs
+async function syncLogs() {
+    if (!isAuthenticated()) return;
+    if (logWatermark === null) return loadDashboard();
+
+    const params = buildLogParams();
+    params.set('since', logWatermark);
+    try {
+        const response = await fetch(API_BASE + '/logs?' + params.toString(), {
+            headers: { 'Authorization': getAuthHeader() }
+        });
+        if (response.status === 401) return logout();
+        if (!response.ok) return;
+
+        const delta = await response.json();
+        if (delta.reset) return loadDashboard();
+
+        const deleted = new Set(delta.deleted);
+        allLogs = allLogs.filter(log => !deleted.has(log.id));
+        const last = allLogs[allLogs.length - 1];
+        delta.changes.forEach(log => {
+            const index = allLogs.findIndex(existing => existing.id === log.id);
+            if (index !== -1) allLogs.splice(index, 1);
+            if (!logMatchesFilters(log)) return;
+            // With more pages on the server, rows older than the loaded ones belong to those pages
+            if (index === -1 && nextLogCursor && last && compareLogs(log, last) > 0) return;
+            allLogs.push(log);
+        });
+        allLogs.sort(compareLogs);
+        logWatermark = String(delta.watermark);
+        renderLogs(allLogs);
+    } catch (error) {
+        console.warn('Log sync failed', error);
+    }
+}
+
+function buildLogRow(log) {
+    const row = document.createElement('tr');
+    row.dataset.logId = log.id;
+    row.innerHTML = `
+        <td style="text-align: center;"><input type="checkbox" class="log-checkbox" value="${log.id}"></td>
+        <td>${log.id}</td>
+        <td>${log.year || '-'}</td>
+        <td>${log.student_name}</td>
+        <td>${log.student_id}</td>
+        <td>${log.computer_number}</td>
+        <td>${log.purpose}</td>
+        <td>${new Date(log.check_in_time).toLocaleString()}</td>
+        <td>${log.check_out_time ? new Date(log.check_out_time).toLocaleString() : '-'}</td>
+        <td>${log.issues_reported || '-'}</td>
+    `;
+    return row;
+}
+
 function renderLogs(logs) {
     const tbody = document.querySelector('#logs-table tbody');
     if (!tbody) return;
 
     tbody.innerHTML = '';
 
-    // Sort by ID desc (newest first)
-    logs.sort((a, b) => b.id - a.id);
-
-    logs.forEach(log => {
-        const row = document.createElement('tr');
-        row.innerHTML = `
-            <td style="text-align: center;"><input type="checkbox" class="log-checkbox" value="${log.id}"></td>
-            <td>${log.id}</td>
-            <td>${log.year || '-'}</td>
-            <td>${log.student_name}</td>
-            <td>${log.student_id}</td>
-            <td>${log.computer_number}</td>
-            <td>${log.purpose}</td>
-            <td>${new Date(log.check_in_time).toLocaleString()}</td>
-            <td>${log.check_out_time ? new Date(log.check_out_time).toLocaleString() : '-'}</td>
-            <td>${log.issues_reported || '-'}</td>
-        `;
-        tbody.appendChild(row);
-    });
+    // Rows arrive newest first from the server
+    logs.forEach(log => tbody.appendChild(buildLogRow(log)));
 
     // Re-bind Select All listener
     const selectAll = document.getElementById('select-all');
@@ -213,6 +301,198 @@ function renderLogs(logs) {
     }
 }
 
+// Live updates: the server pushes checkin/checkout/delete events over SSE.
+// EventSource can't send the Authorization header, so the stream is read
+// with fetch and parsed here. Each event patches one row instead of
+// re-rendering the table.
+let lastEventId = null;
+let eventsController = null;
+let eventsRetryTimer = null;
+let eventsRetryDelay = 1000;
+
+function logMatchesFilters(log) {
+    const params = buildLogParams();
+    // Server timestamps are local wall-clock ISO strings, so the date is the prefix
+    const day = (log.check_in_time || '').slice(0, 10);
+    const lower = (value) => (value || '').toLowerCase();
+
+    if (params.has('start_date') && day < params.get('start_date')) return false;
+    if (params.has('end_date') && day > params.get('end_date')) return false;
+    if (params.has('year') && log.year !== params.get('year')) return false;
+    if (params.has('subject') && !lower(log.purpose).includes(lower(params.get('subject')))) return false;
+    if (params.has('student_id') && !(log.student_id || '').startsWith(params.get('student_id'))) return false;
+    if (params.has('q')) {
+        const q = lower(params.get('q'));
+        if (!lower(log.student_name).includes(q) && !lower(log.computer_number).includes(q)) return false;
+    }
+    if (params.has('active_only') && log.check_out_time) return false;
+    return true;
+}
+
+function findLogRow(id) {
+    return document.querySelector(`#logs-table tbody tr[data-log-id="${id}"]`);
+}
+
+function removeLogRows(ids) {
+    const removed = new Set(ids);
+    allLogs = allLogs.filter(log => !removed.has(log.id));
+    ids.forEach(id => {
+        const row = findLogRow(id);
+        if (row) row.remove();
+    });
+}
+
+function applyLogEvent(type, data) {
+    const tbody = document.querySelector('#logs-table tbody');
+    if (!tbody) return;
+
+    if (type === 'checkin') {
+        if (findLogRow(data.id) || !logMatchesFilters(data)) return;
+        allLogs.unshift(data);
+        tbody.insertBefore(buildLogRow(data), tbody.firstChild);
+    } else if (type === 'checkout') {
+        const index = allLogs.findIndex(log => log.id === data.id);
+        if (index === -1) return;
+        if (!logMatchesFilters(data)) {
+            removeLogRows([data.id]);
+            return;
+        }
+        allLogs[index] = data;
+        const row = findLogRow(data.id);
+        if (row) {
+            const checked = row.querySelector('.log-checkbox').checked;
+            const replacement = buildLogRow(data);
+            replacement.querySelector('.log-checkbox').checked = checked;
+            row.replaceWith(replacement);
+        }
+    } else if (type === 'delete') {
+        removeLogRows(data.ids || []);
+    } else if (type === 'delete_all') {
+        allLogs = [];
+        tbody.innerHTML = '';
+    } else if (type === 'reset') {
+        // Too far behind to replay; catch up from the watermark instead
+        syncLogs();
+    }
+}
+
+function handleEventMessage(raw) {
+    let id = null;
+    let type = 'message';
+    const dataLines = [];
+    raw.split('\n').forEach(line => {
+        if (line.startsWith('id:')) id = line.slice(3).trim();
+        else if (line.startsWith('event:')) type = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+    });
+    if (id !== null) lastEventId = id;
+    if (dataLines.length === 0) return;
+    try {
+        applyLogEvent(type, JSON.parse(dataLines.join('\n')));
+    } catch (error) {
+        console.error('Bad event', raw, error);
+    }
+}
+
+async function connectEvents() {
+    if (!isAuthenticated() || eventsController || eventsRetryTimer) return;
+    if (!window.location.pathname.includes('/dashboard')) return;
+
+    eventsController = new AbortController();
+    const headers = { 'Authorization': getAuthHeader() };
+    if (lastEventId !== null) headers['Last-Event-ID'] = lastEventId;
+
+    try {
+        const response = await fetch(API_BASE + '/events', { headers, signal: eventsController.signal });
+        if (response.status === 401) {
+            logout();
+            return;
+        }
+        if (!response.ok || !response.body) throw new Error('Event stream unavailable');
+        eventsRetryDelay = 1000;
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                handleEventMessage(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+            }
+        }
+    } catch (error) {
+        console.warn('Event stream disconnected', error);
+    } finally {
+        eventsController = null;
+    }
+
+    // Reconnect with backoff; Last-Event-ID makes the server replay the gap,
+    // and polling the delta keeps the list current while the stream is down
+    eventsRetryTimer = setTimeout(() => {
+        syncLogs();
+        eventsRetryTimer = null;
+        connectEvents();
+    }, eventsRetryDelay);
+    eventsRetryDelay = Math.min(eventsRetryDelay * 2, 30000);
+}
+
+// Close open sessions in bulk: the selected rows, or every open session on a
+// computer range (and the year filter, if set)
+async function endLabSession() {
+    if (!isAuthenticated()) return;
+
+    const selected = Array.from(document.querySelectorAll('.log-checkbox:checked')).map(cb => parseInt(cb.value));
+    const body = {};
+    let description;
+    if (selected.length > 0) {
+        body.log_ids = selected;
+        description = `${selected.length} selected sessions`;
+    } else {
+        const range = prompt('Computers to check out, e.g. "PC-01 to PC-30" or a lab prefix like "LAB2-".\nLeave empty for every open session.', '');
+        if (range === null) return;
+        const parts = range.split(/\s+to\s+/i).map(part => part.trim()).filter(Boolean);
+        if (parts.length === 2) {
+            body.computer_from = parts[0];
+            body.computer_to = parts[1];
+        } else if (parts.length === 1) {
+            body.computer_prefix = parts[0];
+        }
+        const year = document.getElementById('filter_year');
+        if (year && year.value) body.year = year.value;
+        if (Object.keys(body).length === 0) body.all_open = true;
+        description = body.all_open ? 'every open session' : `open sessions on ${range || body.year}`;
+    }
+    if (!confirm(`Check out ${description}?`)) return;
+
+    try {
+        const response = await fetch(API_BASE + '/logs/checkout', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': getAuthHeader()
+            },
+            body: JSON.stringify(body)
+        });
+        if (response.ok) {
+            const res = await response.json();
+            showAlert(`Checked out ${res.count} sessions`, 'success');
+            // Rows update through the checkout events; sync in case the stream is down
+            syncLogs();
+        } else if (response.status === 401) {
+            logout();
+        } else {
+            showAlert('Failed to check out sessions', 'error');
+        }
+    } catch (error) {
+        console.error(error);
+        showAlert('Network error', 'error');
+    }
+}
+
 async function deleteSelectedLogs() {
     if (!isAuthenticated()) return;
 
@@ -251,42 +531,18 @@ async function deleteSelectedLogs() {
 }
 
 function filterLogs() {
-    const dateQuery = document.getElementById('filter_date').value;
-    const purposeQuery = document.getElementById('filter_purpose').value;
-    const studentIdQuery = document.getElementById('filter_student_id').value.toLowerCase();
-    const generalQuery = document.getElementById('filter_general').value.toLowerCase();
-
-    const filtered = allLogs.filter(log => {
-        // Date Filter
-        if (dateQuery) {
-            const logDate = new Date(log.check_in_time).toISOString().split('T')[0];
-            if (logDate !== dateQuery) return false;
-        }
-
-        // Purpose Filter (Text Search)
-        if (purposeQuery && !log.purpose.toLowerCase().includes(purposeQuery.toLowerCase())) return false;
-
-        // Student ID Filter
-        if (studentIdQuery && !log.student_id.toLowerCase().includes(studentIdQuery)) return false;
-
-        // General Search (Name or Computer)
-        if (generalQuery) {
-            const matches = log.student_name.toLowerCase().includes(generalQuery) ||
-                log.computer_number.toLowerCase().includes(generalQuery);
-            if (!matches) return false;
-        }
-
-        return true;
-    });
-
-    renderLogs(filtered);
+    // Debounce keystrokes so typing doesn't fire a request per character
+    clearTimeout(filterTimer);
+    filterTimer = setTimeout(() => loadDashboard(), 300);
 }
 
 function clearFilters() {
-    document.getElementById('filter_date').value = '';
-    document.getElementById('filter_purpose').value = '';
-    document.getElementById('filter_student_id').value = '';
-    document.getElementById('filter_general').value = '';
+    ['filter_date', 'filter_date_to', 'filter_year', 'filter_purpose', 'filter_student_id', 'filter_general'].forEach(id => {
+        const el = document.getElementById(id);
+        if (el) el.value = '';
+    });
+    const activeOnly = document.getElementById('filter_active');
+    if (activeOnly) activeOnly.checked = false;
     filterLogs();
 }
 
@@ -294,7 +550,14 @@ async function downloadCSV() {
     if (!isAuthenticated()) return;
 
     try {
-        const response = await fetch(API_BASE + '/export', {
+        // Export honours the date and year filters; everything else exports in full
+        const params = new URLSearchParams();
+        const filters = buildLogParams();
+        ['start_date', 'end_date', 'year'].forEach(key => {
+            if (filters.has(key)) params.set(key, filters.get(key));
+        });
+
+        const response = await fetch(API_BASE + '/export?' + params.toString(), {
             headers: { 'Authorization': getAuthHeader() }
         });
 
@@ -317,6 +580,20 @@ async function downloadCSV() {
 
 // Student Management Logic
 let currentStudentYear = '1st Year';
+let allStudents = [];
+let nextStudentCursor = null;
+let studentSearchQuery = '';
+let studentSearchTimer = null;
+
+// Type-ahead search over the whole roster (or the selected year)
+function searchStudents(value) {
+    clearTimeout(studentSearchTimer);
+    studentSearchTimer = setTimeout(() => {
+        const query = value.trim();
+        studentSearchQuery = query.length >= 2 ? query : '';
+        loadStudents();
+    }, 150);
+}
 
 async function loadStudentYear(year) {
     currentStudentYear = year;
@@ -354,24 +631,32 @@ async function loadStudentYear(year) {
     await loadStudents(year);
 }
 
-async function loadStudents(year) {
+async function loadStudents(year, append) {
     if (!isAuthenticated()) return;
 
     // Use passed year or fallback to global current
     const targetYear = year || currentStudentYear;
+    const appending = append === true && !!nextStudentCursor;
 
     try {
-        let url = '/api/students/';
-        if (targetYear && targetYear !== 'All') {
-            url += `?year=${encodeURIComponent(targetYear)}`;
+        const params = new URLSearchParams();
+        if (targetYear && targetYear !== 'All') params.set('year', targetYear);
+        if (appending) params.set('cursor', nextStudentCursor);
+        if (studentSearchQuery) {
+            params.set('q', studentSearchQuery);
+            params.set('limit', '50');
         }
+        const url = studentSearchQuery ? '/api/students/search?' : '/api/students/?';
 
-        const response = await fetch(url, {
+        const response = await fetch(url + params.toString(), {
             headers: { 'Authorization': getAuthHeader() }
         });
         if (response.ok) {
-            const students = await response.json();
-            renderStudents(students);
+            const page = await response.json();
+            nextStudentCursor = response.headers.get('X-Next-Cursor');
+            allStudents = appending ? allStudents.concat(page) : page;
+            renderStudents(allStudents);
+            updateLoadMore('btn-load-more-students', nextStudentCursor);
         } else {
             showAlert('Failed to load students', 'error');
         }
@@ -579,8 +864,10 @@ async function importStudents() {
     const formData = new FormData();
     formData.append('file', file);
 
+    const upsert = confirm('Update name/year for students that are already registered?\n\nCancel to skip existing students.');
+
     try {
-        const response = await fetch('/api/students/import', {
+        const response = await fetch('/api/students/import?upsert=' + upsert, {
             method: 'POST',
             headers: {
                 'Authorization': getAuthHeader()
@@ -590,7 +877,12 @@ async function importStudents() {
 
         if (response.ok) {
             const result = await response.json();
-            showAlert(result.message, 'success');
+            let message = `${result.message} (${result.skipped} skipped)`;
+            if (result.errors && result.errors.length > 0) {
+                console.warn('Import row errors:', result.errors);
+                message += ` - ${result.errors.length} row errors, see console`;
+            }
+            showAlert(message, result.errors && result.errors.length > 0 ? 'error' : 'success');
             // Refresh list
             loadStudentYear(currentStudentYear);
         } else {
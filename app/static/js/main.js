@@ -34,27 +34,59 @@ document.getElementById('checkin-form').addEventListener('submit', async (e) =>
         purpose: document.getElementById('purpose').value
     };
 
-    try {
-        const response = await fetch('/api/logs/checkin', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(data)
-        });
-
-        if (response.ok) {
-            showAlert('Check-in successful!', 'success');
-            document.getElementById('checkin-form').reset();
-            document.getElementById('student-details').style.display = 'none';
-            document.getElementById('checkin-submit-btn').disabled = true;
-        } else {
-            const err = await response.json();
-            showAlert(err.detail || 'Check-in failed', 'error');
-        }
-    } catch (error) {
-        showAlert('Network error', 'error');
+    const key = enqueue({ action: 'checkin', ...data });
+    const result = (await flushQueue())[key];
+    if (result && result.status !== 'applied') {
+        showAlert(result.detail || 'Check-in failed', 'error');
+        return;
+    }
+    if (!result) {
+        showAlert('No connection: check-in saved, it will be sent automatically.', 'success');
+    } else if (result.conflict) {
+        showAlert(`Checked in, but ${result.conflict} is also in use by another student. Please check the computer number.`, 'error');
+    } else {
+        showAlert('Check-in successful!', 'success');
     }
+    document.getElementById('checkin-form').reset();
+    document.getElementById('student-details').style.display = 'none';
+    document.getElementById('checkin-submit-btn').disabled = true;
 });
 
+// Register number autocomplete for the check-in form
+// Register numbers only, from 4 digits (GET /api/students/suggest)
+const SUGGEST_MIN_LENGTH = 4;
+let suggestTimer = null;
+let suggestController = null;
+
+function suggestStudents(value) {
+    clearTimeout(suggestTimer);
+    const list = document.getElementById('student-suggestions');
+    if (value.length < SUGGEST_MIN_LENGTH) {
+        list.innerHTML = '';
+        return;
+    }
+    suggestTimer = setTimeout(async () => {
+        // Only the answer to the latest keystroke matters
+        if (suggestController) suggestController.abort();
+        suggestController = new AbortController();
+        try {
+            const response = await fetch(`/api/students/suggest?q=${encodeURIComponent(value)}`, {
+                signal: suggestController.signal
+            });
+            if (!response.ok) return;
+            const registerNumbers = await response.json();
+            list.innerHTML = '';
+            registerNumbers.forEach(registerNumber => {
+                const option = document.createElement('option');
+                option.value = registerNumber;
+                list.appendChild(option);
+            });
+        } catch (error) {
+            // Aborted by a newer keystroke, or offline: no suggestions
+        }
+    }, 120);
+}
+
 async function fetchStudentDetails() {
     const regNo = document.getElementById('student_id').value;
     if (!regNo) return;
@@ -74,33 +106,49 @@ async function fetchStudentDetails() {
             showAlert('Student not registered. Please contact Admin.', 'error');
         }
     } catch (error) {
-        console.error(error);
+        // Offline: allow the check-in; the server checks the register
+        // number when the queue syncs
+        document.getElementById('display_name_checkin').textContent = '(offline, checked on sync)';
+        document.getElementById('display_year_checkin').textContent = '-';
+        document.getElementById('student-details').style.display = 'block';
+        document.getElementById('checkin-submit-btn').disabled = false;
     }
 }
 
+function showActiveSession(name, computer, time, logId) {
+    document.getElementById('active-session-details').style.display = 'block';
+    document.getElementById('display_name').textContent = name;
+    document.getElementById('display_computer').textContent = computer;
+    document.getElementById('display_time').textContent = time;
+    document.getElementById('log_id').value = logId;
+    // Hide alert if it was showing error
+    document.getElementById('alert').style.display = 'none';
+}
+
 // Find Active Session
 document.getElementById('find-active-form').addEventListener('submit', async (e) => {
     e.preventDefault();
     const studentId = document.getElementById('checkout_student_id').value;
 
+    // A check-in still waiting in the queue is not on the server yet
+    const queued = pendingCheckin(studentId);
+    if (queued) {
+        showActiveSession(studentId + ' (not synced yet)', queued.computer_number, new Date(queued.at).toLocaleString(), '');
+        return;
+    }
     try {
         const response = await fetch(`/api/logs/active/${studentId}`);
         if (response.ok) {
             const log = await response.json();
-            document.getElementById('active-session-details').style.display = 'block';
-            document.getElementById('display_name').textContent = log.student_name;
-            document.getElementById('display_computer').textContent = log.computer_number;
-            document.getElementById('display_time').textContent = new Date(log.check_in_time).toLocaleString();
-            document.getElementById('log_id').value = log.id;
-            // Hide alert if it was showing error
-            document.getElementById('alert').style.display = 'none';
+            showActiveSession(log.student_name, log.computer_number, new Date(log.check_in_time).toLocaleString(), log.id);
         } else {
             document.getElementById('active-session-details').style.display = 'none';
             const err = await response.json();
             showAlert(err.detail || 'No active session found', 'error');
         }
     } catch (error) {
-        showAlert('Network error', 'error');
+        // Offline: the checkout is queued by register number
+        showActiveSession(studentId + ' (offline)', '-', '-', '');
     }
 });
 
@@ -108,25 +156,195 @@ document.getElementById('find-active-form').addEventListener('submit', async (e)
 document.getElementById('checkout-confirm-form').addEventListener('submit', async (e) => {
     e.preventDefault();
     const logId = document.getElementById('log_id').value;
-    const issues = document.getElementById('issues').value;
+    const action = {
+        action: 'checkout',
+        student_id: document.getElementById('checkout_student_id').value,
+        issues_reported: document.getElementById('issues').value || null
+    };
+    if (logId) action.log_id = parseInt(logId, 10);
+
+    const key = enqueue(action);
+    const result = (await flushQueue())[key];
+    if (result && result.status !== 'applied') {
+        showAlert(result.detail || 'Check-out failed', 'error');
+        return;
+    }
+    showAlert(result ? 'Check-out successful!' : 'No connection: check-out saved, it will be sent automatically.', 'success');
+    document.getElementById('active-session-details').style.display = 'none';
+    document.getElementById('find-active-form').reset();
+    document.getElementById('checkout-confirm-form').reset();
+});
 
+// Offline queue: check-ins and checkouts are kept in localStorage under an
+// idempotency key until POST /api/logs/batch has answered for them, so
+// nothing is lost while the Wi-Fi is down and a retry is never applied
+// twice. Each action carries the time the student acted.
+const QUEUE_KEY = 'logbook.queue';
+const REFUSED_KEY = 'logbook.refused';
+// Upper bound per request; the server's own cap (X-Max-Batch) lowers it
+const QUEUE_BATCH = 50;
+let maxBatch = QUEUE_BATCH;
+const QUEUE_TIMEOUT_MS = 10000;
+const RETRY_MAX_MS = 60000;
+let flushing = null;
+let retryTimer = null;
+let retryDelay = 1000;
+
+function loadQueue() {
     try {
-        const response = await fetch(`/api/logs/checkout/${logId}`, {
-            method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ issues_reported: issues })
-        });
+        return JSON.parse(localStorage.getItem(QUEUE_KEY)) || [];
+    } catch (error) {
+        return [];
+    }
+}
+
+function loadRefused() {
+    try {
+        return JSON.parse(localStorage.getItem(REFUSED_KEY)) || [];
+    } catch (error) {
+        return [];
+    }
+}
 
+function saveQueue(queue) {
+    localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+    const status = document.getElementById('queue-status');
+    if (status) {
+        const refused = loadRefused().length;
+        const parts = [];
+        if (queue.length) parts.push(`${queue.length} action(s) waiting for the connection`);
+        if (refused) parts.push(`${refused} action(s) the server could not accept are kept on this kiosk; please tell the lab admin`);
+        status.textContent = parts.join('. ');
+        status.style.display = parts.length ? 'block' : 'none';
+    }
+}
+
+// Set aside an action the server refuses as malformed, so it neither
+// blocks the queue nor disappears
+function setAside(entry, detail) {
+    localStorage.setItem(REFUSED_KEY, JSON.stringify([...loadRefused(), { ...entry, detail }]));
+    return { key: entry.key, status: 'rejected', duplicate: false, detail: `Not accepted by the server: ${detail}` };
+}
+
+function newKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+function enqueue(action) {
+    const entry = { key: newKey(), at: new Date().toISOString(), ...action };
+    saveQueue([...loadQueue(), entry]);
+    return entry.key;
+}
+
+function pendingCheckin(studentId) {
+    let pending = null;
+    loadQueue().forEach(entry => {
+        if (entry.student_id !== studentId) return;
+        pending = entry.action === 'checkin' ? entry : null;
+    });
+    return pending;
+}
+
+// Send the queue oldest first, one flush at a time. Resolves to
+// {key: result} for the actions the server answered.
+function flushQueue() {
+    if (!flushing) {
+        flushing = sendQueue().finally(() => { flushing = null; });
+    }
+    return flushing;
+}
+
+async function sendQueue() {
+    const answered = {};
+    let batchSize = maxBatch;
+    let queue = loadQueue();
+    while (queue.length) {
+        const batch = queue.slice(0, batchSize);
+        const controller = new AbortController();
+        const timeout = setTimeout(() => controller.abort(), QUEUE_TIMEOUT_MS);
+        let response;
+        try {
+            response = await fetch('/api/logs/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ sent_at: new Date().toISOString(), actions: batch }),
+                signal: controller.signal
+            });
+        } catch (error) {
+            response = null;
+        } finally {
+            clearTimeout(timeout);
+        }
+        if (!response || response.status >= 500 || response.status === 429) {
+            scheduleRetry();
+            return answered;
+        }
+        const cap = parseInt(response.headers.get('X-Max-Batch'), 10);
+        if (cap > 0) maxBatch = Math.min(QUEUE_BATCH, cap);
+        if (response.status === 413 && batch.length > 1) {
+            // Too many for the server: resend with its cap (or half)
+            batchSize = cap > 0 ? Math.min(maxBatch, batch.length - 1) : Math.ceil(batch.length / 2);
+            continue;
+        }
         if (response.ok) {
-            showAlert('Check-out successful!', 'success');
-            document.getElementById('active-session-details').style.display = 'none';
-            document.getElementById('find-active-form').reset();
-            document.getElementById('checkout-confirm-form').reset();
+            (await response.json()).forEach(result => { answered[result.key] = result; });
+        } else if (batch.length > 1) {
+            // Something in this batch is malformed: send one at a time to
+            // find it, so the rest still goes through
+            batchSize = 1;
+            continue;
         } else {
-            const err = await response.json();
-            showAlert(err.detail || 'Check-out failed', 'error');
+            let detail = `HTTP ${response.status}`;
+            try {
+                detail = (await response.json()).detail || detail;
+            } catch (error) {
+                // Not JSON
+            }
+            answered[batch[0].key] = setAside(batch[0], typeof detail === 'string' ? detail : JSON.stringify(detail));
         }
-    } catch (error) {
-        showAlert('Network error', 'error');
+        const sent = new Set(batch.map(entry => entry.key));
+        // Re-read: actions queued during the request stay
+        queue = loadQueue().filter(entry => !sent.has(entry.key));
+        saveQueue(queue);
     }
-});
+    clearTimeout(retryTimer);
+    retryDelay = 1000;
+    return answered;
+}
+
+function scheduleRetry() {
+    clearTimeout(retryTimer);
+    // Exponential backoff with jitter, so kiosks don't all retry at once
+    // when the Wi-Fi comes back
+    retryTimer = setTimeout(() => flushQueue().then(reportRejected), retryDelay * (0.5 + Math.random()));
+    retryDelay = Math.min(retryDelay * 2, RETRY_MAX_MS);
+}
+
+// Actions replayed in the background can still be refused (e.g. an
+// unknown register number typed while offline)
+function reportRejected(answered) {
+    const rejected = Object.values(answered).filter(result => result.status === 'rejected' && !result.duplicate);
+    if (rejected.length) {
+        showAlert(`${rejected.length} saved action(s) could not be recorded: ${rejected[0].detail}`, 'error');
+    }
+}
+
+window.addEventListener('online', () => flushQueue().then(reportRejected));
+saveQueue(loadQueue());
+flushQueue().then(reportRejected);
+
+// Computers in use, pushed by the server as they are taken and freed
+function watchOccupancy() {
+    const list = document.getElementById('occupied-computers');
+    if (!list || !window.EventSource) return;
+    const source = new EventSource('/api/occupancy/events');
+    source.addEventListener('occupancy', (event) => {
+        const occupancy = JSON.parse(event.data);
+        list.textContent = occupancy.in_use
+            ? occupancy.computers.map(computer => computer.computer_number).join(', ')
+            : 'None';
+    });
+}
+
+watchOccupancy();
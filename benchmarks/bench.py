@@ -0,0 +1,305 @@
+"""Load tests for the check-in/check-out hot path and the admin endpoints.
+
+Seeds a temporary SQLite database (benchmarks.seed), drives concurrent
+workloads against the real ASGI app in-process (httpx ASGITransport) or a
+running server (--url), and reports throughput and p50/p95/p99 latency
+per operation:
+
+    python -m benchmarks.bench                          # print results
+    python -m benchmarks.bench --save baseline.json     # keep a baseline
+    python -m benchmarks.bench --compare baseline.json  # exit 1 on regression
+
+With --url, start the server on the same database first, e.g.
+LOGBOOK_DATABASE_URL=sqlite:////tmp/bench.db uvicorn app.main:app, and pass
+--database /tmp/bench.db so the seed lands where the server reads.
+
+Compare runs on the same machine with the same options; the numbers are
+only meaningful relative to each other.
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import seed as seeding
+
+ADMIN_AUTH = ("admin", "password")
+
+# An operation regresses when p95 latency grows, or throughput drops, by more than this
+DEFAULT_THRESHOLD = 0.2
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": ms(percentile(values, 0.50)),
+        "p95_ms": ms(percentile(values, 0.95)),
+        "p99_ms": ms(percentile(values, 0.99)),
+        "max_ms": ms(values[-1]) if values else 0.0,
+    }
+
+
+class Recorder:
+    """Collects per-operation latencies for one workload."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def call(self, name: str, request, expected=(200,)):
+        started = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code in expected
+        except Exception:
+            response, ok = None, False
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response if ok else None
+
+
+async def run_workload(client, recorder: Recorder, operation, requests: int, concurrency: int) -> float:
+    """Run ``operation(client, recorder, n)`` for n in range(requests) on
+    ``concurrency`` workers; returns the elapsed seconds."""
+
+    async def worker(first: int):
+        for n in range(first, requests, concurrency):
+            await operation(client, recorder, n)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return time.perf_counter() - started
+
+
+# Workloads: each request n gets a student of its own, so concurrent
+# check-ins never collide on the one-open-session index.
+def checkin_checkout(students: int):
+    async def operation(client, recorder, n):
+        student = seeding.register_number(n % students)
+        response = await recorder.call("checkin", client.post(
+            "/api/logs/checkin",
+            json={"student_id": student, "computer_number": f"PC-{n % seeding.COMPUTERS + 1:02d}", "purpose": "Benchmark"},
+        ))
+        if response is not None:
+            await recorder.call("checkout", client.put(f"/api/logs/checkout/{response.json()['id']}", json={}))
+    return operation
+
+
+def active_lookup(students: int):
+    async def operation(client, recorder, n):
+        # Nobody is checked in between workloads, so 404 is the expected answer
+        await recorder.call("active_lookup", client.get(f"/api/logs/active/{seeding.register_number(n % students)}"), expected=(404,))
+    return operation
+
+
+def student_lookup(students: int):
+    async def operation(client, recorder, n):
+        await recorder.call("student_lookup", client.get(f"/api/students/{seeding.register_number(n % students)}"))
+    return operation
+
+
+def admin_list(students: int):
+    async def operation(client, recorder, n):
+        params = {"limit": 100} if n % 2 else {"limit": 100, "year": seeding.YEARS[n % len(seeding.YEARS)]}
+        await recorder.call("admin_list", client.get("/api/admin/logs", params=params, auth=ADMIN_AUTH))
+    return operation
+
+
+def student_stats(students: int):
+    async def operation(client, recorder, n):
+        reg = seeding.register_number(n % students)
+        await recorder.call("student_stats", client.get(f"/api/students/{reg}/stats", auth=ADMIN_AUTH))
+    return operation
+
+
+def usage_report(students: int):
+    async def operation(client, recorder, n):
+        # Nine parameter sets: after the first round the report cache answers, as it would in production
+        group_by = ("year", "subject", "computer")[n % 3]
+        await recorder.call("usage_report", client.get(
+            "/api/admin/reports/usage", params={"group_by": group_by, "year": seeding.YEARS[n % len(seeding.YEARS)]}, auth=ADMIN_AUTH
+        ))
+    return operation
+
+
+def export(students: int):
+    async def operation(client, recorder, n):
+        await recorder.call("export", client.get("/api/admin/export", auth=ADMIN_AUTH))
+    return operation
+
+
+def student_import(students: int):
+    async def operation(client, recorder, n):
+        buffer = io.StringIO()
+        buffer.write("register_number,name,year\n")
+        for row in seeding.roster(students):
+            buffer.write(f"{row['register_number']},{row['name']} {n},{row['year']}\n")
+        files = {"file": ("students.csv", buffer.getvalue().encode(), "text/csv")}
+        await recorder.call("import", client.post("/api/students/import", params={"upsert": "true"}, files=files, auth=ADMIN_AUTH))
+    return operation
+
+
+# name -> (factory, requests, concurrency); --scale multiplies the request counts
+WORKLOADS = {
+    "checkin_checkout": (checkin_checkout, 1000, 16),
+    "active_lookup": (active_lookup, 2000, 16),
+    "student_lookup": (student_lookup, 2000, 16),
+    "admin_list": (admin_list, 400, 8),
+    "student_stats": (student_stats, 1000, 8),
+    "usage_report": (usage_report, 60, 4),
+    "export": (export, 3, 1),
+    "import": (student_import, 3, 1),
+}
+
+
+def environment() -> dict:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Return the regressions of ``results`` against ``baseline`` as
+    (operation, metric, baseline value, current value) tuples."""
+    regressions = []
+    for name, base in baseline.get("operations", {}).items():
+        current = results["operations"].get(name)
+        if current is None:
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append((name, "p95_ms", base["p95_ms"], current["p95_ms"]))
+        if base["throughput_rps"] and current["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append((name, "throughput_rps", base["throughput_rps"], current["throughput_rps"]))
+        if current["errors"] > base["errors"]:
+            regressions.append((name, "errors", base["errors"], current["errors"]))
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"{'operation':<16} {'requests':>8} {'errors':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, row in results["operations"].items():
+        print(
+            f"{name:<16} {row['requests']:>8} {row['errors']:>6} {row['throughput_rps']:>9.1f} "
+            f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}"
+        )
+
+
+async def run(args, students: int) -> dict:
+    import httpx
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+    else:
+        from app.main import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+
+    operations = {}
+    async with client:
+        for name in args.workloads:
+            factory, requests, concurrency = WORKLOADS[name]
+            requests = max(1, int(requests * args.scale))
+            concurrency = args.concurrency or concurrency
+            recorder = Recorder()
+            elapsed = await run_workload(client, recorder, factory(students), requests, concurrency)
+            for operation, latencies in recorder.latencies.items():
+                operations[operation] = {
+                    **summarize(latencies, recorder.errors.get(operation, 0), elapsed),
+                    "concurrency": concurrency,
+                }
+            print(f"  {name}: {requests} requests in {elapsed:.2f}s", file=sys.stderr)
+    return operations
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--sessions-per-day", type=int, default=150)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every workload's request count")
+    parser.add_argument("--concurrency", type=int, help="override every workload's concurrency")
+    parser.add_argument("--workloads", nargs="+", choices=sorted(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--database", help="SQLite file to seed (default: a temporary file)")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--save", help="write the results as JSON here")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    tempdir = None
+    if args.database is None:
+        tempdir = tempfile.TemporaryDirectory(prefix="logbook-bench-")
+        args.database = os.path.join(tempdir.name, "bench.db")
+    # Before app is imported: its engine reads these at import time
+    os.environ["LOGBOOK_DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.database)}"
+    os.environ.setdefault("LOGBOOK_MAINTENANCE", "0")
+
+    from app import database
+
+    try:
+        database.init_db()
+        with database.SessionLocal() as db:
+            started = time.perf_counter()
+            counts = seeding.seed(db, args.students, args.years, args.sessions_per_day, args.seed)
+            print(f"Seeded {counts['students']} students and {counts['logs']} logs in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        results = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": environment(),
+            "options": {
+                "students": args.students, "years": args.years, "sessions_per_day": args.sessions_per_day,
+                "seed": args.seed, "scale": args.scale, "target": args.url or "asgi",
+            },
+            "dataset": counts,
+            "operations": asyncio.run(run(args, args.students)),
+        }
+        print_table(results)
+        if args.save:
+            with open(args.save, "w") as f:
+                json.dump(results, f, indent=2)
+        if args.compare:
+            with open(args.compare) as f:
+                regressions = compare(results, json.load(f), args.threshold)
+            for name, metric, before, after in regressions:
+                print(f"REGRESSION {name} {metric}: {before} -> {after}")
+            return 1 if regressions else 0
+        return 0
+    finally:
+        database.engine.dispose()
+        if tempdir is not None:
+            tempdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
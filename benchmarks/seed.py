@@ -0,0 +1,65 @@
+"""Synthetic data for the benchmarks: a student roster and years of closed
+sessions, generated from a fixed seed so every run sees the same data."""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+
+YEARS = ("1st Year", "2nd Year", "3rd Year")
+SUBJECTS = ("Research", "Assignment", "Programming", "Internet", "Project", "Exam Prep")
+COMPUTERS = 60
+BATCH_SIZE = 5000
+
+
+def register_number(n: int) -> str:
+    return f"B{n:06d}"
+
+
+def roster(size: int) -> list:
+    return [
+        {"register_number": register_number(n), "name": f"Student {n}", "year": YEARS[n % len(YEARS)]}
+        for n in range(size)
+    ]
+
+
+def seed(db: Session, students: int = 2000, years: float = 2, sessions_per_day: int = 150, seed: int = 1) -> dict:
+    """Fill an empty database; returns the row counts.
+
+    Sessions run on weekdays between 09:00 and 17:00 and all end before
+    now, so the active-session index starts empty.
+    """
+    from app import models, rollups
+
+    rng = random.Random(seed)
+    roster_rows = roster(students)
+    db.execute(models.Student.__table__.insert(), roster_rows)
+
+    logs = models.LogEntry.__table__
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    day = end - timedelta(days=int(365 * years))
+    batch = []
+    count = 0
+    while day < end:
+        if day.weekday() < 5:
+            for _ in range(sessions_per_day):
+                student = roster_rows[rng.randrange(students)]
+                check_in = day + timedelta(hours=9, seconds=rng.randrange(8 * 3600))
+                batch.append({
+                    "student_id": student["register_number"],
+                    "student_name": student["name"],
+                    "year": student["year"],
+                    "computer_number": f"PC-{rng.randrange(1, COMPUTERS + 1):02d}",
+                    "purpose": rng.choice(SUBJECTS),
+                    "check_in_time": check_in,
+                    "check_out_time": check_in + timedelta(minutes=rng.randrange(10, 180)),
+                })
+                if len(batch) >= BATCH_SIZE:
+                    db.execute(logs.insert(), batch)
+                    count += len(batch)
+                    batch = []
+        day += timedelta(days=1)
+    if batch:
+        db.execute(logs.insert(), batch)
+        count += len(batch)
+    db.commit()
+    rollups.rebuild(db)
+    return {"students": students, "logs": count}
@@ -0,0 +1,94 @@
+"""Compare the ORM + response_model path with the column-row + fastjson path
+for one large page of logs:
+
+    python -m benchmarks.serialization [--rows 10000] [--repeat 7]
+
+The ORM path mirrors what FastAPI does for ``response_model=list[LogOut]``:
+hydrate LogEntry objects, validate each one through the schema, dump it to
+JSON-compatible data and encode it with the stdlib. Prints the median time
+of each stage.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from . import seed as seeding
+
+
+def _median_ms(fn, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 2), result
+
+
+def validate_and_encode(logs) -> bytes:
+    from app import schemas
+
+    try:
+        from pydantic import TypeAdapter
+    except ImportError:  # pydantic 1
+        from fastapi.encoders import jsonable_encoder
+
+        data = jsonable_encoder([schemas.LogOut.from_orm(log) for log in logs])
+    else:
+        adapter = TypeAdapter(list[schemas.LogOut])
+        data = adapter.dump_python(adapter.validate_python(logs, from_attributes=True), mode="json")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    tempdir = tempfile.TemporaryDirectory(prefix="logbook-bench-")
+    os.environ["LOGBOOK_DATABASE_URL"] = f"sqlite:///{os.path.join(tempdir.name, 'bench.db')}"
+    os.environ.setdefault("LOGBOOK_MAINTENANCE", "0")
+
+    from app import crud, database, fastjson
+
+    try:
+        database.init_db()
+        with database.SessionLocal() as db:
+            # ~250 sessions per weekday: enough days to cover --rows
+            days = args.rows / 250 * 7 / 5 + 2
+            seeding.seed(db, students=500, years=days / 365, sessions_per_day=250)
+
+            def orm_query():
+                db.expunge_all()  # no identity-map reuse between repeats
+                return crud.get_logs(db, limit=args.rows)[0]
+
+            def row_query():
+                return crud.get_logs(db, limit=args.rows, as_dicts=True)[0]
+
+            orm_query_ms, logs = _median_ms(orm_query, args.repeat)
+            orm_encode_ms, orm_body = _median_ms(lambda: validate_and_encode(logs), args.repeat)
+            row_query_ms, rows = _median_ms(row_query, args.repeat)
+            row_encode_ms, row_body = _median_ms(lambda: fastjson.dumps(rows), args.repeat)
+
+        if json.loads(orm_body) != json.loads(row_body):
+            print("Bodies differ between the two paths", file=sys.stderr)
+            return 1
+        encoder = "orjson" if fastjson.orjson is not None else "json"
+        print(f"{len(rows)} rows, median of {args.repeat}")
+        print(f"{'path':<22} {'query ms':>9} {'encode ms':>10} {'total ms':>9}")
+        print(f"{'orm + response_model':<22} {orm_query_ms:>9} {orm_encode_ms:>10} {orm_query_ms + orm_encode_ms:>9.2f}")
+        print(f"{'rows + ' + encoder:<22} {row_query_ms:>9} {row_encode_ms:>10} {row_query_ms + row_encode_ms:>9.2f}")
+        print(f"speedup: {(orm_query_ms + orm_encode_ms) / (row_query_ms + row_encode_ms):.1f}x")
+        return 0
+    finally:
+        database.engine.dispose()
+        tempdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
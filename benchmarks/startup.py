@@ -0,0 +1,78 @@
+"""Measure cold start: importing app.main and running its lifespan startup,
+each in a fresh interpreter so nothing is cached between runs:
+
+    python -m benchmarks.startup [--repeat 5] [--students 2000]
+
+Prints the median import time, the lifespan phases the app reports on
+GET /health/ready, and the total time until a worker is ready.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from . import seed as seeding
+
+# Run in the child interpreter: time the import, start the lifespan, and
+# print what /health/ready reports
+CHILD = """
+import json, time
+started = time.perf_counter()
+from app.main import app
+from fastapi.testclient import TestClient
+with TestClient(app) as client:
+    ready = client.get("/health/ready")
+    total = time.perf_counter() - started
+print(json.dumps({"status": ready.status_code, "total_seconds": total, **ready.json()["startup"]}))
+"""
+
+
+def measure(env: dict) -> dict:
+    result = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--warm-cache", action="store_true", help="set LOGBOOK_STUDENT_CACHE_WARM")
+    args = parser.parse_args(argv)
+
+    tempdir = tempfile.TemporaryDirectory(prefix="logbook-bench-")
+    database_url = f"sqlite:///{os.path.join(tempdir.name, 'bench.db')}"
+    env = {
+        **os.environ,
+        "LOGBOOK_DATABASE_URL": database_url,
+        "LOGBOOK_MAINTENANCE": "0",
+        "LOGBOOK_STUDENT_CACHE_WARM": "1" if args.warm_cache else "0",
+        "PYTHONPATH": os.getcwd(),
+    }
+    try:
+        os.environ["LOGBOOK_DATABASE_URL"] = database_url
+        from app import database
+
+        database.init_db()
+        with database.SessionLocal() as db:
+            seeding.seed(db, students=args.students, years=0.5, sessions_per_day=100)
+        database.engine.dispose()
+
+        runs = [measure(env) for _ in range(args.repeat)]
+        failed = [run for run in runs if run["status"] != 200]
+        if failed:
+            print(f"{len(failed)} runs were not ready: {failed}", file=sys.stderr)
+            return 1
+        print(f"median of {args.repeat} cold starts, {args.students} students")
+        for key in runs[0]:
+            if key.endswith("_seconds"):
+                print(f"{key:<24} {statistics.median(run[key] for run in runs) * 1000:>9.1f} ms")
+        return 0
+    finally:
+        tempdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
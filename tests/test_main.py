@@ -1,15 +1,38 @@
+import gzip
+import os
+
+# Point the app's own engine at the test database before it is imported
+os.environ["LOGBOOK_DATABASE_URL"] = "sqlite:///./test.db"
+
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, get_db, get_read_db
+from app.models import Student
 
 # Setup test DB
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
+# Archive partitions are created on demand, outside Base.metadata
+with engine.begin() as conn:
+    for table_name in inspect(conn).get_table_names():
+        if table_name.startswith("logs_archive_"):
+            conn.execute(text(f"DROP TABLE {table_name}"))
+    conn.execute(text("DROP TABLE IF EXISTS students_fts"))
+
+# Register the students the check-in tests use
+with TestingSessionLocal() as db:
+    db.add_all([
+        Student(register_number="12345", name="John Doe", year="1st Year"),
+        Student(register_number="99999", name="Jane Doe", year="2nd Year"),
+        Student(register_number="55555", name="Alice", year="3rd Year"),
+    ])
+    db.commit()
 
 def override_get_db():
     try:
@@ -19,6 +42,7 @@ def override_get_db():
         db.close()
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 
 client = TestClient(app)
 
@@ -73,3 +97,910 @@ def test_admin_logs():
 def test_admin_logs_unauthorized():
     response = client.get("/api/admin/logs", auth=("admin", "wrongpassword"))
     assert response.status_code == 401
+
+
+def test_import_students():
+    csv_data = (
+        "register_number,name,year\n"
+        "70001,Import One,1st Year\n"
+        "70002,Import Two,1st Year\n"
+        "70002,Import Dup,1st Year\n"
+        ",No Number,1st Year\n"
+    )
+    response = client.post(
+        "/api/students/import",
+        files={"file": ("students.csv", csv_data, "text/csv")},
+        auth=("admin", "password"),
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 2
+    assert data["skipped"] == 2
+    assert len(data["errors"]) == 2
+    assert "total_ms" in data["timings"]
+
+    # Re-import with upsert: one changed row, one unchanged
+    csv_data = "register_number,name,year\n70001,Import One,2nd Year\n70002,Import Two,1st Year\n"
+    response = client.post(
+        "/api/students/import?upsert=true",
+        files={"file": ("students.csv", csv_data, "text/csv")},
+        auth=("admin", "password"),
+    )
+    data = response.json()
+    assert (data["inserted"], data["updated"], data["skipped"]) == (0, 1, 1)
+    assert client.get("/api/students/70001").json()["year"] == "2nd Year"
+
+def test_import_students_bad_headers():
+    response = client.post(
+        "/api/students/import",
+        files={"file": ("students.csv", "reg,name\n1,A\n", "text/csv")},
+        auth=("admin", "password"),
+    )
+    assert response.status_code == 400
+
+def test_export_logs():
+    response = client.get("/api/admin/export", auth=("admin", "password"))
+    assert response.status_code == 200
+    lines = response.text.strip().splitlines()
+    assert lines[0].startswith("ID,Register Number")
+    assert len(lines) > 1
+
+    response = client.get("/api/admin/export?gzip=true&year=3rd%20Year", auth=("admin", "password"))
+    assert response.status_code == 200
+    lines = gzip.decompress(response.content).decode().strip().splitlines()
+    assert len(lines) == 2
+    assert ",55555,Alice,3rd Year," in lines[1]
+
+def test_admin_logs_keyset_pagination():
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/admin/logs", params=params, auth=("admin", "password"))
+        assert response.status_code == 200
+        seen.extend(log["id"] for log in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) >= 2
+
+    response = client.get("/api/admin/logs", params={"active_only": True, "year": "1st Year"}, auth=("admin", "password"))
+    assert all(log["check_out_time"] is None and log["year"] == "1st Year" for log in response.json())
+
+    response = client.get("/api/admin/logs", params={"cursor": "not-a-cursor"}, auth=("admin", "password"))
+    assert response.status_code == 400
+
+def test_admin_logs_keyset_pagination_past_null_check_in_times():
+    from datetime import datetime
+    from app.models import LogEntry
+
+    # Imported rows may lack a check-in time; paging must neither skip them
+    # nor hand out a cursor the next request rejects
+    with TestingSessionLocal() as db:
+        for _ in range(3):
+            db.add(LogEntry(
+                student_id="80080", student_name="Null Time", computer_number="PC-80", purpose="Import",
+                check_out_time=datetime.now(),
+            ))
+        db.flush()
+        ids = sorted((row.id for row in db.query(LogEntry.id).filter(LogEntry.student_id == "80080")), reverse=True)
+        db.query(LogEntry).filter(LogEntry.id.in_(ids[1:])).update({"check_in_time": None})
+        db.commit()
+
+    try:
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 1, "student_id": "80080"}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/api/admin/logs", params=params, auth=("admin", "password"))
+            assert response.status_code == 200
+            seen.extend(log["id"] for log in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert seen == ids
+    finally:
+        # Inserted behind the rollups' back, so removed the same way
+        with TestingSessionLocal() as db:
+            db.query(LogEntry).filter(LogEntry.student_id == "80080").delete()
+            db.commit()
+
+def test_students_keyset_pagination():
+    response = client.get("/api/students/", params={"limit": 2}, auth=("admin", "password"))
+    assert len(response.json()) == 2
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get("/api/students/", params={"limit": 2, "cursor": cursor}, auth=("admin", "password"))
+    assert response.json()[0]["id"] > 2
+
+def test_sqlite_engine_pragmas():
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from app import database
+
+    with database.engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+    read_only = database.create_db_engine("sqlite:///./test.db", read_only=True)
+    with read_only.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM students")).scalar() > 0
+        try:
+            conn.execute(text("DELETE FROM students"))
+            assert False, "read-only engine accepted a write"
+        except OperationalError:
+            pass
+    read_only.dispose()
+
+def test_student_cache_invalidation():
+    from app.cache import student_cache
+
+    student_cache.clear()
+    created = client.post(
+        "/api/students/",
+        json={"register_number": "80001", "name": "Cache Test", "year": "1st Year"},
+        auth=("admin", "password"),
+    ).json()
+
+    hits, misses = student_cache.hits, student_cache.misses
+    assert client.get("/api/students/80001").json()["name"] == "Cache Test"
+    assert client.get("/api/students/80001").json()["name"] == "Cache Test"
+    # One miss then one hit, each counted once
+    assert (student_cache.hits, student_cache.misses) == (hits + 1, misses + 1)
+
+    client.put(f"/api/students/{created['id']}", json={"name": "Cache Renamed"}, auth=("admin", "password"))
+    assert client.get("/api/students/80001").json()["name"] == "Cache Renamed"
+
+    client.delete(f"/api/students/{created['id']}", auth=("admin", "password"))
+    assert client.get("/api/students/80001").status_code == 404
+
+    stats = client.get("/api/admin/cache", auth=("admin", "password")).json()["students"]
+    assert stats["hits"] >= 1 and stats["misses"] >= 1
+
+def test_lru_cache_eviction_and_ttl():
+    from app.cache import LRUCache
+
+    now = [0.0]
+    cache = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b", None) is None
+    assert cache.get("a") == 1
+    now[0] = 11
+    assert cache.get("a", None) is None
+
+    stale_generation = cache.generation
+    cache.invalidate("c")
+    cache.set("c", 99, generation=stale_generation)
+    assert cache.get("c", None) is None
+
+def test_one_open_session_enforced_by_index():
+    from app import crud, schemas
+    from app.models import LogEntry
+
+    # Bypass the API entirely: the database itself must reject a second open session
+    db = TestingSessionLocal()
+    try:
+        db.add(LogEntry(student_id="70002", student_name="Import Two", computer_number="PC-20", purpose="Race"))
+        db.commit()
+        try:
+            crud.create_log(db, schemas.LogCreate(student_id="70002", computer_number="PC-21", purpose="Race"))
+            assert False, "second open session was accepted"
+        except crud.ActiveSessionExists:
+            pass
+        active = crud.get_active_log_by_student(db, "70002")
+        assert active.computer_number == "PC-20"
+    finally:
+        db.close()
+
+    response = client.put(f"/api/logs/checkout/{active.id}", json={})
+    assert response.status_code == 200
+    response = client.put(f"/api/logs/checkout/{active.id}", json={})
+    assert response.status_code == 400
+    assert client.put("/api/logs/checkout/999999", json={}).status_code == 404
+    assert client.get("/api/logs/active/70002").status_code == 404
+
+def test_student_stats_from_rollups():
+    from app import crud, rollups
+
+    res = client.post(
+        "/api/logs/checkin",
+        json={"student_id": "70001", "computer_number": "PC-30", "purpose": "Networks"},
+    )
+    client.put(f"/api/logs/checkout/{res.json()['id']}", json={})
+
+    stats = client.get("/api/students/70001/stats", auth=("admin", "password")).json()
+    assert "Networks" in stats["subject_breakdown"]
+
+    db = TestingSessionLocal()
+    try:
+        assert rollups.check(db) == []
+        sessions = {subject: count for subject, _, count in crud.get_student_usage(db, "70001")}
+        assert sessions["Networks"] == 1
+
+        # Deleting a closed log takes its usage out of the rollups
+        client.post("/api/admin/logs/delete", json=[res.json()["id"]], auth=("admin", "password"))
+        assert "Networks" not in {subject for subject, _, _ in crud.get_student_usage(db, "70001")}
+        assert rollups.check(db) == []
+        assert rollups.rebuild(db) >= 1
+        assert rollups.check(db) == []
+    finally:
+        db.close()
+
+def test_usage_reports():
+    from app.cache import report_cache
+
+    res = client.post(
+        "/api/logs/checkin",
+        json={"student_id": "70002", "computer_number": "PC-31", "purpose": "Compilers"},
+    )
+    client.put(f"/api/logs/checkout/{res.json()['id']}", json={})
+    report_cache.clear()
+
+    response = client.get("/api/admin/reports/usage", params={"group_by": "subject"}, auth=("admin", "password"))
+    assert response.status_code == 200
+    rows = {row["key"]: row for row in response.json()["rows"]}
+    assert rows["Compilers"]["sessions"] == 1
+    assert rows["Compilers"]["students"] == 1
+
+    misses = report_cache.misses
+    client.get("/api/admin/reports/usage", params={"group_by": "subject"}, auth=("admin", "password"))
+    assert report_cache.misses == misses  # served from cache
+
+    response = client.get("/api/admin/reports/usage", params={"group_by": "computer", "year": "1st Year"}, auth=("admin", "password"))
+    assert "PC-31" in {row["key"] for row in response.json()["rows"]}
+
+    response = client.get("/api/admin/reports/top-students", params={"limit": 1}, auth=("admin", "password"))
+    assert len(response.json()["rows"]) == 1
+
+    response = client.get("/api/admin/reports/usage", params={"group_by": "bogus"}, auth=("admin", "password"))
+    assert response.status_code == 422
+
+def test_async_session_path():
+    import asyncio
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app import database
+
+    # Serve the session-backed routes from an aiosqlite AsyncSession
+    async_engine = database.create_async_db_engine("sqlite:///./test.db")
+    AsyncSessionLocal = sessionmaker(class_=AsyncSession, expire_on_commit=False, bind=async_engine)
+
+    async def override_get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_async_db
+    try:
+        res = client.post(
+            "/api/logs/checkin",
+            json={"student_id": "70001", "computer_number": "PC-40", "purpose": "Async"},
+        )
+        assert res.status_code == 200
+        log_id = res.json()["id"]
+        assert client.get("/api/logs/active/70001").json()["id"] == log_id
+        assert client.post(
+            "/api/logs/checkin",
+            json={"student_id": "70001", "computer_number": "PC-41", "purpose": "Async"},
+        ).status_code == 400
+        assert client.put(f"/api/logs/checkout/{log_id}", json={}).status_code == 200
+        assert client.get("/api/students/70001").status_code == 200
+    finally:
+        app.dependency_overrides[get_db] = override_get_db
+        asyncio.run(async_engine.dispose())
+
+def test_log_events_published():
+    from app.events import event_bus
+
+    client.post("/api/students/", json={"register_number": "80060", "name": "Events", "year": "1st Year"}, auth=("admin", "password"))
+    start = int(client.get("/api/admin/logs", auth=("admin", "password")).headers["X-Event-Id"])
+    res = client.post(
+        "/api/logs/checkin",
+        json={"student_id": "80060", "computer_number": "PC-50", "purpose": "Events"},
+    )
+    assert res.status_code == 200
+    log_id = res.json()["id"]
+    client.put(f"/api/logs/checkout/{log_id}", json={})
+    client.post("/api/admin/logs/delete", json=[log_id], auth=("admin", "password"))
+
+    events, complete = event_bus.since(start)
+    assert complete
+    mine = [(event_type, data) for _, event_type, data in events if data.get("id") == log_id or log_id in data.get("ids", [])]
+    assert [event_type for event_type, _ in mine] == ["checkin", "checkout", "delete"]
+    assert mine[1][1]["check_out_time"] is not None
+
+def test_event_bus_catch_up_window():
+    from app.events import EventBus
+
+    bus = EventBus(history=2)
+    first = bus.last_id
+    for n in range(3):
+        bus.publish("checkin", {"id": n})
+    assert bus.since(first) == ([], False)  # oldest event fell out of the buffer
+    events, complete = bus.since(bus.last_id - 1)
+    assert complete and [data["id"] for _, _, data in events] == [2]
+    assert bus.since(bus.last_id + 5) == ([], False)
+
+def test_conditional_get_and_delta_sync():
+    auth = ("admin", "password")
+    client.post("/api/students/", json={"register_number": "80061", "name": "Delta", "year": "1st Year"}, auth=auth)
+    first = client.get("/api/admin/logs", auth=auth)
+    etag, watermark = first.headers["ETag"], first.headers["X-Watermark"]
+    assert client.get("/api/admin/logs", auth=auth, headers={"If-None-Match": etag}).status_code == 304
+    # Different filters are a different representation
+    assert client.get("/api/admin/logs?year=1st+Year", auth=auth, headers={"If-None-Match": etag}).status_code == 200
+
+    students = client.get("/api/students/", auth=auth)
+    assert client.get("/api/students/", auth=auth, headers={"If-None-Match": students.headers["ETag"]}).status_code == 304
+
+    res = client.post("/api/logs/checkin", json={"student_id": "80061", "computer_number": "PC-60", "purpose": "Delta"})
+    assert res.status_code == 200
+    log_id = res.json()["id"]
+    assert client.get("/api/admin/logs", auth=auth, headers={"If-None-Match": etag}).status_code == 200
+
+    delta = client.get(f"/api/admin/logs?since={watermark}", auth=auth).json()
+    assert not delta["reset"]
+    assert log_id in [log["id"] for log in delta["changes"]]
+
+    client.post("/api/admin/logs/delete", json=[log_id], auth=auth)
+    delta = client.get(f"/api/admin/logs?since={delta['watermark']}", auth=auth).json()
+    assert delta["deleted"] == [log_id] and delta["changes"] == []
+    # A watermark the server never issued asks the client to reload
+    assert client.get(f"/api/admin/logs?since={delta['watermark'] + 100}", auth=auth).json()["reset"]
+
+def test_archive_moves_old_sessions_and_reads_across():
+    from datetime import datetime, timedelta
+    from app import archive, crud, rollups
+    from app.models import LogEntry
+
+    old = datetime(2023, 2, 1, 10, 0)
+    db = TestingSessionLocal()
+    try:
+        db.add_all([
+            LogEntry(student_id="80001", student_name="Archived", year="1st Year", computer_number="PC-90",
+                     purpose="Archive", check_in_time=old + timedelta(days=n), check_out_time=old + timedelta(days=n, hours=1))
+            for n in range(3)
+        ])
+        db.add(LogEntry(student_id="80001", student_name="Archived", year="1st Year", computer_number="PC-90",
+                        purpose="Archive", check_in_time=datetime.now(), check_out_time=datetime.now()))
+        db.commit()
+        rollups.rebuild(db)
+
+        assert archive.archive_old_logs(db, older_than_days=30, batch_size=2) == 3
+        assert [(p.term, p.row_count) for p in archive.partitions(db)] == [("2023_t1", 3)]
+        assert db.query(LogEntry).filter(LogEntry.student_id == "80001").count() == 1
+        assert len(crud.get_student_logs(db, "80001")) == 4
+        assert rollups.check(db) == []
+    finally:
+        db.close()
+
+    auth = ("admin", "password")
+    hot = client.get("/api/admin/logs?student_id=80001", auth=auth).json()
+    assert len(hot) == 1
+    ranged = client.get("/api/admin/logs?student_id=80001&start_date=2023-01-01", auth=auth).json()
+    assert len(ranged) == 4
+    report = client.get("/api/admin/reports/usage?group_by=subject&start_date=2023-01-01&end_date=2023-12-31", auth=auth).json()
+    assert {"key": "Archive", "hours": 3.0, "sessions": 3, "students": 1} in report["rows"]
+    export = client.get("/api/admin/export?start_date=2023-01-01&end_date=2023-12-31", auth=auth).text
+    assert export.count("80001") == 3
+
+def test_log_ids_are_never_reused_after_archiving_and_deleting():
+    from datetime import datetime, timedelta
+    from app import archive
+    from app.models import LogEntry
+
+    auth = ("admin", "password")
+    client.post("/api/students/", json={"register_number": "80040", "name": "Reuse", "year": "1st Year"}, auth=auth)
+    old = datetime(2022, 8, 1, 10, 0)
+    db = TestingSessionLocal()
+    try:
+        db.add_all([
+            LogEntry(student_id="80040", student_name="Reuse", year="1st Year", computer_number="PC-95",
+                     purpose="Reuse", check_in_time=old + timedelta(days=n), check_out_time=old + timedelta(days=n, hours=1))
+            for n in range(2)
+        ])
+        recent = LogEntry(student_id="80040", student_name="Reuse", year="1st Year", computer_number="PC-95",
+                          purpose="Reuse", check_in_time=datetime.now(), check_out_time=datetime.now())
+        db.add(recent)
+        db.commit()
+        recent_id = recent.id
+        assert archive.archive_old_logs(db, older_than_days=30) >= 2
+    finally:
+        db.close()
+    # Delete every hot session of the student, the newest row of logs included
+    assert client.post("/api/admin/logs/delete", json=[recent_id], auth=auth).status_code == 200
+
+    checkin = client.post("/api/logs/checkin", json={"student_id": "80040", "computer_number": "PC-95", "purpose": "Reuse"})
+    assert checkin.status_code == 200
+    ranged = client.get("/api/admin/logs?student_id=80040&start_date=2000-01-01", auth=auth).json()
+    ids = [log["id"] for log in ranged]
+    assert len(ids) == 3 and len(ids) == len(set(ids))
+    assert checkin.json()["id"] > recent_id
+
+def test_delete_all_logs_keeps_archived_usage_in_rollups(tmp_path):
+    from datetime import datetime, timedelta
+    from app import archive, crud, database, rollups
+    from app.models import LogEntry, UsageRollup
+
+    # Its own database: deleting every log would empty the shared one
+    engine = create_engine(f"sqlite:///{tmp_path / 'delete_all.db'}")
+    database.init_db(engine)
+    old = datetime(2022, 8, 1, 10, 0)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([
+            LogEntry(student_id="1", student_name="Kept", computer_number="PC-01", purpose="Networks",
+                     check_in_time=old, check_out_time=old + timedelta(hours=2)),
+            LogEntry(student_id="1", student_name="Kept", computer_number="PC-01", purpose="Networks",
+                     check_in_time=datetime.now() - timedelta(hours=1), check_out_time=datetime.now()),
+        ])
+        db.commit()
+        rollups.rebuild(db)
+        assert archive.archive_old_logs(db, older_than_days=30) == 1
+
+        assert crud.delete_all_logs(db) == 1
+        assert rollups.check(db) == []
+        assert [(round(row.total_seconds), row.session_count) for row in db.query(UsageRollup)] == [(7200, 1)]
+
+def test_maintenance_closes_stale_sessions_and_records_runs():
+    from datetime import datetime, timedelta
+    from app import crud, maintenance
+    from app.models import LogEntry
+
+    db = TestingSessionLocal()
+    try:
+        stale = LogEntry(student_id="80002", student_name="Forgetful", computer_number="PC-91", purpose="Stale",
+                         check_in_time=datetime.now() - timedelta(days=2))
+        db.add(stale)
+        db.commit()
+        stale_id = stale.id
+    finally:
+        db.close()
+
+    auth = ("admin", "password")
+    record = client.post("/api/admin/maintenance/close_stale_sessions", auth=auth).json()
+    assert record["ok"] and record["result"]["closed"] >= 1
+    db = TestingSessionLocal()
+    try:
+        closed = crud.get_log_by_id(db, stale_id)
+        assert closed.check_out_time == closed.check_in_time
+        assert closed.issues_reported == crud.STALE_SESSION_NOTE
+    finally:
+        db.close()
+
+    for job in ("checkpoint", "analyze", "optimize"):
+        assert client.post(f"/api/admin/maintenance/{job}", auth=auth).json()["ok"]
+    assert client.post("/api/admin/maintenance/nope", auth=auth).status_code == 404
+    status = client.get("/api/admin/maintenance", auth=auth).json()
+    assert [run["job"] for run in status["history"][:4]] == ["optimize", "analyze", "checkpoint", "close_stale_sessions"]
+    assert maintenance.in_window(datetime(2024, 1, 1, 23, 30), "23:00-02:00")
+    assert not maintenance.in_window(datetime(2024, 1, 1, 12, 0), "23:00-02:00")
+
+def test_benchmark_summary_and_regression_check():
+    from benchmarks import bench
+
+    summary = bench.summarize([0.001 * n for n in range(1, 101)], errors=0, elapsed=2.0)
+    assert (summary["requests"], summary["throughput_rps"]) == (100, 50.0)
+    assert (summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]) == (50.0, 95.0, 99.0)
+
+    baseline = {"operations": {"checkin": dict(summary)}}
+    assert bench.compare({"operations": {"checkin": dict(summary)}}, baseline) == []
+    slower = dict(summary, p95_ms=150.0)
+    assert bench.compare({"operations": {"checkin": slower}}, baseline) == [("checkin", "p95_ms", 95.0, 150.0)]
+
+def test_metrics_count_queries_per_route():
+    from app import metrics
+
+    # Requests here run on the test engine (see override_get_db)
+    metrics.instrument_engine(engine, "test")
+
+    def queries_sum():
+        prefix = 'logbook_http_request_queries_sum{method="GET",route="/api/admin/logs"} '
+        line = next((line for line in client.get("/metrics").text.splitlines() if line.startswith(prefix)), prefix + "0")
+        return float(line.split()[-1])
+
+    before = queries_sum()
+    response = client.get("/api/admin/logs?limit=5", auth=("admin", "password"))
+    assert 'desc="' in response.headers["Server-Timing"]
+    # At least the version lookup and the page query
+    assert queries_sum() - before >= 2
+    body = client.get("/metrics").text
+    assert 'logbook_http_requests_total{method="GET",route="/api/admin/logs",status="200"}' in body
+    assert 'logbook_cache_hits_total{cache="students"}' in body
+
+    # A failing statement must not leave its start time on the connection
+    from sqlalchemy.exc import OperationalError
+
+    with engine.connect() as conn:
+        try:
+            conn.execute(text("SELECT * FROM no_such_table"))
+        except OperationalError:
+            pass
+        assert conn.info.get("query_started") == []
+
+def test_fast_list_serialization_matches_schema():
+    from fastapi.encoders import jsonable_encoder
+    from app import crud, schemas
+
+    auth = ("admin", "password")
+    fast = client.get("/api/admin/logs?limit=50", auth=auth).json()
+    students = client.get("/api/students/?limit=50", auth=auth).json()
+    db = TestingSessionLocal()
+    try:
+        logs, _ = crud.get_logs(db, limit=50)
+        assert fast == [jsonable_encoder(schemas.LogOut(**{f: getattr(log, f) for f in crud.LOG_FIELDS})) for log in logs]
+        rows, _ = crud.get_students(db, limit=50)
+        assert students == [jsonable_encoder(schemas.StudentOut(**{f: getattr(row, f) for f in crud.STUDENT_FIELDS})) for row in rows]
+    finally:
+        db.close()
+
+def test_bulk_checkout_closes_matching_sessions():
+    from app import crud
+
+    auth = ("admin", "password")
+    client.post("/api/students/", json={"register_number": "80010", "name": "Lab A", "year": "2nd Year"}, auth=auth)
+    client.post("/api/students/", json={"register_number": "80011", "name": "Lab B", "year": "2nd Year"}, auth=auth)
+    client.post("/api/students/", json={"register_number": "80012", "name": "Lab C", "year": "2nd Year"}, auth=auth)
+    ids = {}
+    for reg, computer in (("80010", "LAB9-9"), ("80011", "LAB9-10"), ("80012", "LAB9-11")):
+        ids[reg] = client.post("/api/logs/checkin", json={"student_id": reg, "computer_number": computer, "purpose": "Bulk"}).json()["id"]
+
+    assert client.post("/api/admin/logs/checkout", json={}, auth=auth).status_code == 400
+    # Natural order: LAB9-9 and LAB9-10 are in range, LAB9-11 is not
+    res = client.post("/api/admin/logs/checkout", json={"computer_from": "LAB9-9", "computer_to": "LAB9-10"}, auth=auth).json()
+    assert res["count"] == 2 and {log["id"] for log in res["logs"]} == {ids["80010"], ids["80011"]}
+    assert all(log["check_out_time"] for log in res["logs"])
+    assert client.get("/api/logs/active/80012").status_code == 200
+
+    res = client.post("/api/admin/logs/checkout", json={"computer_prefix": "LAB9-"}, auth=auth).json()
+    assert [log["id"] for log in res["logs"]] == [ids["80012"]]
+    stats = client.get("/api/students/80011/stats", auth=auth).json()
+    assert "Bulk" in stats["subject_breakdown"]
+    assert crud.computer_sort_key("PC-9") < crud.computer_sort_key("PC-10")
+
+def test_checkin_coalescer_batches_concurrent_checkins():
+    import asyncio
+    from app import crud, schemas
+    from app.coalescer import CheckinCoalescer
+
+    auth = ("admin", "password")
+    for reg in ("80020", "80021", "80022"):
+        client.post("/api/students/", json={"register_number": reg, "name": f"Burst {reg}", "year": "1st Year"}, auth=auth)
+    client.post("/api/logs/checkin", json={"student_id": "80022", "computer_number": "PC-40", "purpose": "Open"})
+
+    coalescer = CheckinCoalescer(window_ms=20, max_batch=64, session_factory=TestingSessionLocal)
+    requests = [
+        schemas.LogCreate(student_id=reg, computer_number="PC-41", purpose="Burst")
+        for reg in ("80020", "80021", "80020", "80022", "00000")
+    ]
+
+    async def burst():
+        try:
+            return await asyncio.gather(*(coalescer.submit(log) for log in requests), return_exceptions=True)
+        finally:
+            await coalescer.stop()
+
+    results = asyncio.run(burst())
+    assert results[0]["student_id"] == "80020" and results[0]["student_name"] == "Burst 80020"
+    assert results[1]["student_id"] == "80021" and results[1]["check_out_time"] is None
+    assert isinstance(results[2], crud.ActiveSessionExists)  # same student twice in one batch
+    assert isinstance(results[3], crud.ActiveSessionExists)  # already checked in
+    assert isinstance(results[4], ValueError) and not isinstance(results[4], crud.ActiveSessionExists)
+    stats = coalescer.stats()
+    assert stats["batches"] == 1 and stats["requests"] == 5 and stats["largest_batch"] == 5
+    assert client.get("/api/logs/active/80021").json()["id"] == results[1]["id"]
+
+def test_student_search_ranks_prefix_matches():
+    from app import search
+
+    assert search.ensure_index(engine)
+    auth = ("admin", "password")
+    client.post("/api/students/", json={"register_number": "70100", "name": "Priya Raman", "year": "1st Year"}, auth=auth)
+    client.post("/api/students/", json={"register_number": "70101", "name": "Raman Kumar", "year": "2nd Year"}, auth=auth)
+    client.post("/api/students/", json={"register_number": "70102", "name": "Ramya Priyan", "year": "2nd Year"}, auth=auth)
+
+    search_get = lambda params: client.get("/api/students/search", params=params, auth=auth)
+    names = lambda res: [s["name"] for s in res.json()]
+    assert names(search_get({"q": "pri ram"})) == ["Priya Raman", "Ramya Priyan"]
+    assert names(search_get({"q": "70101"}))[0] == "Raman Kumar"
+    assert names(search_get({"q": "ram", "year": "2nd Year"})) == ["Raman Kumar", "Ramya Priyan"]
+    assert search_get({"q": "r"}).status_code == 422
+
+    # The public endpoint only completes register numbers
+    assert client.get("/api/students/search", params={"q": "ram"}).status_code == 401
+    assert client.get("/api/students/suggest", params={"q": "7010"}).json() == ["70100", "70101", "70102"]
+    assert client.get("/api/students/suggest", params={"q": "701"}).status_code == 422
+    assert client.get("/api/students/suggest", params={"q": "Rama"}).json() == []
+    assert client.get("/api/students/suggest", params={"q": "7010", "limit": 50}).status_code == 422
+
+    # Triggers keep the index in sync with renames and deletes
+    student_id = client.get("/api/students/70102").json()["id"]
+    client.put(f"/api/students/{student_id}", json={"name": "Meena Iyer", "year": "2nd Year"}, auth=auth)
+    assert names(search_get({"q": "meen"})) == ["Meena Iyer"]
+    assert search_get({"q": "ramya"}).json() == []
+
+    page = search_get({"q": "701", "limit": 2})
+    rest = search_get({"q": "701", "cursor": page.headers["X-Next-Cursor"]})
+    assert len(page.json()) == 2 and len(rest.json()) == 1 and "X-Next-Cursor" not in rest.headers
+
+    # Backends without FTS5 fall back to prefix ranges
+    key = search._key(engine)
+    search._fts_available[key] = False
+    try:
+        assert names(search_get({"q": "Raman"})) == ["Raman Kumar"]
+    finally:
+        search._fts_available[key] = True
+
+def test_occupancy_tracks_open_sessions_and_conflicts():
+    from app import config, crud
+    from app.occupancy import occupancy
+
+    auth = ("admin", "password")
+    for reg in ("80030", "80031", "80032"):
+        client.post("/api/students/", json={"register_number": reg, "name": f"Seat {reg}", "year": "3rd Year"}, auth=auth)
+    in_use = lambda: {c["computer_number"].upper(): c for c in client.get("/api/occupancy").json()["computers"]}
+
+    first = client.post("/api/logs/checkin", json={"student_id": "80030", "computer_number": "OCC-2", "purpose": "Map"})
+    assert "X-Computer-Conflict" not in first.headers
+    assert "OCC-2" in in_use() and "student_id" not in str(in_use()["OCC-2"])
+
+    # Default "warn": the check-in goes through with a header
+    second = client.post("/api/logs/checkin", json={"student_id": "80031", "computer_number": "occ-2", "purpose": "Map"})
+    assert second.status_code == 200 and second.headers["X-Computer-Conflict"] == "occ-2"
+    detail = client.get("/api/admin/occupancy", auth=auth).json()
+    seat = next(c for c in detail["computers"] if c["computer_number"].upper() == "OCC-2")
+    assert [s["student_id"] for s in seat["sessions"]] == ["80030", "80031"]
+
+    original = config.COMPUTER_CONFLICT
+    config.COMPUTER_CONFLICT = "reject"
+    try:
+        res = client.post("/api/logs/checkin", json={"student_id": "80032", "computer_number": "OCC-2", "purpose": "Map"})
+        assert res.status_code == 409
+        assert client.get("/api/logs/active/80032").status_code == 404
+    finally:
+        config.COMPUTER_CONFLICT = original
+
+    # Checkouts update the map in place; a write it didn't see (delete) forces a rebuild
+    rebuilds = occupancy.rebuilds
+    client.put(f"/api/logs/checkout/{first.json()['id']}", json={})
+    assert "OCC-2" in in_use() and occupancy.rebuilds == rebuilds
+    client.post("/api/admin/logs/delete", json=[second.json()["id"]], auth=auth)
+    assert "OCC-2" not in in_use() and occupancy.rebuilds == rebuilds + 1
+    assert crud.computer_sort_key("OCC-2") < crud.computer_sort_key("OCC-10")
+
+# Tables every request touches: a plan step reading one of them end to end
+# ("SCAN logs", as opposed to "SCAN logs USING INDEX ...") is a regression.
+HOT_TABLES = ("logs", "students", "usage_rollups", "log_tombstones", "change_counters")
+
+def full_table_scans(bind, fn):
+    """Run ``fn`` and EXPLAIN QUERY PLAN every statement it executed on
+    ``bind``; return the (statement, plan step) pairs that scan a hot table."""
+    from sqlalchemy import event
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(bind, "before_cursor_execute", capture)
+    try:
+        fn()
+    finally:
+        event.remove(bind, "before_cursor_execute", capture)
+    scans = []
+    with bind.connect() as conn:
+        for statement, parameters in statements:
+            for step in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+                words = step[3].split()
+                if words[:1] == ["SCAN"] and words[1] in HOT_TABLES and "USING" not in words:
+                    scans.append((statement, step[3]))
+    return scans
+
+def test_hot_queries_use_indexes():
+    from datetime import date, datetime, timedelta
+    from app import crud, search
+    from app.occupancy import occupancy
+
+    today = date.today()
+    month = {"start_date": today - timedelta(days=30), "end_date": today}
+    with TestingSessionLocal() as db:
+        hot_paths = {
+            "student lookup": lambda: crud.lookup_student(db, "12345"),
+            "active session": lambda: crud.get_active_log_by_student(db, "12345"),
+            "student history": lambda: crud.get_student_logs(db, "12345"),
+            "student stats": lambda: crud.get_student_usage(db, "12345"),
+            "dashboard list": lambda: crud.get_logs(db, limit=5),
+            "next page": lambda: crud.get_logs(db, cursor=crud.encode_cursor(datetime.now(), 10**9), limit=5),
+            "date range": lambda: crud.get_logs(db, limit=5, **month),
+            "delta sync": lambda: crud.get_log_changes(db, since=max(0, crud.get_version(db, crud.LOGS_COUNTER)[0] - 5)),
+            "usage report": lambda: crud.usage_report(db, "subject", **month),
+            "top students": lambda: crud.top_students(db, **month),
+            "occupancy rebuild": lambda: occupancy.rebuild(db, None),
+            "search": lambda: search.search_students(db, "jo"),
+            "suggest": lambda: search.suggest_register_numbers(db, "1234"),
+        }
+        for name, call in hot_paths.items():
+            assert full_table_scans(engine, call) == [], name
+
+def test_migrations_upgrade_a_legacy_database(tmp_path):
+    from app import database, migrations
+
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as conn:
+        # logs as the first release created it: no version column, per-column indexes
+        conn.execute(text(
+            "CREATE TABLE logs (id INTEGER PRIMARY KEY, student_name VARCHAR, student_id VARCHAR, "
+            "computer_number VARCHAR, purpose VARCHAR, year VARCHAR, check_in_time DATETIME, "
+            "check_out_time DATETIME, issues_reported VARCHAR)"
+        ))
+        conn.execute(text("CREATE INDEX ix_logs_student_name ON logs (student_name)"))
+        conn.execute(text("CREATE INDEX ix_logs_student_id ON logs (student_id)"))
+        conn.execute(text(
+            "INSERT INTO logs (student_id, computer_number, check_in_time) VALUES "
+            "('1', 'PC-01', '2024-01-01 10:00:00'), ('1', 'PC-02', '2024-01-01 11:00:00')"
+        ))
+
+    database.init_db(legacy)
+    database.init_db(legacy)  # idempotent
+    inspector = inspect(legacy)
+    indexes = {index["name"] for index in inspector.get_indexes("logs")}
+    assert {"ix_logs_student_id_check_out_time", "ix_logs_check_in_time", "ux_logs_active_student"} <= indexes
+    assert not {"ix_logs_student_name", "ix_logs_student_id"} & indexes
+    assert "version" in {column["name"] for column in inspector.get_columns("logs")}
+    with legacy.connect() as conn:
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'logs'")).scalar()
+        assert "AUTOINCREMENT" in ddl and conn.execute(text("SELECT COUNT(*) FROM logs")).scalar() == 2
+    assert set(migrations.applied(legacy)) == {version for version, _, _ in migrations.MIGRATIONS}
+    with legacy.connect() as conn:
+        # The older of the two open sessions was closed before the unique index went on
+        assert conn.execute(text("SELECT COUNT(*) FROM logs WHERE check_out_time IS NULL")).scalar() == 1
+    legacy.dispose()
+
+def test_readiness_waits_for_startup_and_locks_are_exclusive(tmp_path):
+    from app import config, locking
+
+    assert client.get("/health/live").status_code == 200
+    assert client.get("/").status_code == 200  # templates load on first use
+    assert client.get("/health/ready").status_code == 503  # lifespan not run yet
+
+    original = config.MAINTENANCE_ENABLED
+    config.MAINTENANCE_ENABLED = False
+    try:
+        with TestClient(app) as started:
+            ready = started.get("/health/ready")
+            assert ready.status_code == 200
+            assert {"import_seconds", "init_db_seconds", "startup_seconds"} <= set(ready.json()["startup"])
+    finally:
+        config.MAINTENANCE_ENABLED = original
+
+    path = str(tmp_path / "maintenance.lock")
+    first, second = locking.FileLock(path), locking.FileLock(path)
+    assert first.acquire(blocking=False)
+    assert not second.acquire(blocking=False)
+    assert not second.acquire(timeout=0.2)
+    first.release()
+    assert second.acquire(blocking=False)
+    second.release()
+    assert locking.lock_path("init", "sqlite:///./a.db") != locking.lock_path("init", "sqlite:///./b.db")
+
+
+def test_static_assets_are_fingerprinted_and_precompressed():
+    from app import assets
+
+    manifest = assets.ensure_built()
+    css = manifest["files"]["css/style.css"]
+    image = manifest["files"]["images/bg_college.png"]
+    assert css != "css/style.css" and css.startswith("css/style.")
+
+    page = client.get("/").text
+    assert f"/static/dist/{css}" in page and f"/static/dist/{manifest['files']['js/main.js']}" in page
+
+    response = client.get(f"/static/dist/{css}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["cache-control"] == assets.IMMUTABLE
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert f"/static/dist/{image}" in response.text  # url() rewritten, body decoded by httpx
+    plain = client.get(f"/static/dist/{css}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.text == response.text
+
+    webp = client.get(f"/static/dist/{image}", headers={"Accept": "image/webp,*/*"})
+    assert webp.headers["cache-control"] == assets.IMMUTABLE
+    expected = "image/webp" if assets.Image is not None else "image/png"
+    assert webp.headers["content-type"] == expected
+    assert client.get(f"/static/dist/{image}", headers={"Accept": "image/png"}).headers["content-type"] == "image/png"
+
+    # Unhashed paths still work but must be revalidated
+    assert client.get("/static/css/style.css").headers["cache-control"] == assets.REVALIDATE
+
+def test_batch_ingest_is_idempotent_and_keeps_kiosk_times():
+    from datetime import datetime, timedelta, timezone
+    from app import config
+
+    auth = ("admin", "password")
+    for reg in ("80070", "80071"):
+        client.post("/api/students/", json={"register_number": reg, "name": f"Offline {reg}", "year": "1st Year"}, auth=auth)
+    # The kiosk clock runs 10 minutes slow; sent_at lets the server correct it
+    kiosk_now = datetime.now(timezone.utc) - timedelta(minutes=10)
+    checked_in = kiosk_now - timedelta(hours=1)
+    batch = {
+        "sent_at": kiosk_now.isoformat(),
+        "actions": [
+            {"key": "k-1", "action": "checkin", "student_id": "80070", "computer_number": "PC-60",
+             "purpose": "Offline", "at": checked_in.isoformat()},
+            {"key": "k-2", "action": "checkin", "student_id": "80071", "computer_number": "PC-61",
+             "purpose": "Offline", "at": checked_in.isoformat()},
+            {"key": "k-3", "action": "checkout", "student_id": "80070",
+             "at": (checked_in + timedelta(minutes=45)).isoformat(), "issues_reported": "Slow"},
+            {"key": "k-4", "action": "checkin", "student_id": "00000", "computer_number": "PC-62",
+             "purpose": "Offline", "at": checked_in.isoformat()},
+            {"key": "k-1", "action": "checkin", "student_id": "80070", "computer_number": "PC-60",
+             "purpose": "Offline", "at": checked_in.isoformat()},
+        ],
+    }
+    response = client.post("/api/logs/batch", json=batch)
+    assert response.status_code == 200
+    first, second, checkout, unknown, repeat = response.json()
+    assert [first["status"], second["status"], checkout["status"]] == ["applied"] * 3
+    assert unknown["status"] == "rejected" and unknown["detail"] == "Student not found"
+    assert repeat["duplicate"] and repeat["log"]["id"] == first["log"]["id"]
+
+    # Times are the kiosk's, shifted by its clock offset (IST, naive)
+    ist = timezone(timedelta(hours=5, minutes=30))
+    expected = (checked_in + timedelta(minutes=10)).astimezone(ist).replace(tzinfo=None)
+    check_in_time = datetime.fromisoformat(second["log"]["check_in_time"])
+    assert abs((check_in_time - expected).total_seconds()) < 5
+    closed = checkout["log"]
+    assert closed["id"] == first["log"]["id"] and closed["issues_reported"] == "Slow"
+    duration = datetime.fromisoformat(closed["check_out_time"]) - datetime.fromisoformat(closed["check_in_time"])
+    assert duration == timedelta(minutes=45)
+
+    # Replaying the whole batch (lost response) changes nothing
+    replay = client.post("/api/logs/batch", json=batch).json()
+    assert all(result["duplicate"] for result in replay)
+    assert [result["status"] for result in replay] == [result["status"] for result in response.json()]
+    assert client.get("/api/logs/active/80071").json()["id"] == second["log"]["id"]
+    assert client.get("/api/logs/active/80070").status_code == 404
+    occupied = {entry["computer_number"].upper() for entry in client.get("/api/admin/occupancy", auth=auth).json()["computers"]}
+    assert "PC-61" in occupied and "PC-60" not in occupied
+
+    # Checkouts of a log that doesn't exist, or is already closed
+    gone = client.post("/api/logs/batch", json={"actions": [
+        {"key": "k-5", "action": "checkout", "student_id": "80071", "log_id": 10**9, "at": kiosk_now.isoformat()},
+        {"key": "k-6", "action": "checkout", "student_id": "80070", "log_id": first["log"]["id"], "at": kiosk_now.isoformat()},
+    ]}).json()
+    assert [(r["status"], r["detail"]) for r in gone] == [("rejected", "Log not found"), ("rejected", "Already checked out")]
+
+    # Kiosks size their batches from the server's cap, also when over it
+    assert response.headers["X-Max-Batch"] == str(config.INGEST_MAX_BATCH)
+    cap = config.INGEST_MAX_BATCH
+    config.INGEST_MAX_BATCH = 2
+    try:
+        too_big = client.post("/api/logs/batch", json=batch)
+        assert too_big.status_code == 413 and too_big.headers["X-Max-Batch"] == "2"
+    finally:
+        config.INGEST_MAX_BATCH = cap
+
+def test_worker_caches_follow_other_workers_student_changes():
+    from app import config, crud
+    from app.models import Student
+
+    auth = ("admin", "password")
+    client.post("/api/students/", json={"register_number": "80050", "name": "Before Rename", "year": "1st Year"}, auth=auth)
+    workers, interval = config.WORKERS, config.CACHE_SYNC_SECONDS
+    config.WORKERS, config.CACHE_SYNC_SECONDS = 2, 0
+    try:
+        with TestingSessionLocal() as db:
+            assert crud.lookup_student(db, "80050").name == "Before Rename"
+            # Another worker renames the student: its cache invalidation
+            # never reaches this process, only the counter bump does
+            with TestingSessionLocal() as other:
+                other.query(Student).filter(Student.register_number == "80050").update({"name": "After Rename"})
+                crud.bump_version(other, crud.STUDENTS_COUNTER)
+                other.commit()
+            assert crud.lookup_student(db, "80050").name == "After Rename"
+    finally:
+        config.WORKERS, config.CACHE_SYNC_SECONDS = workers, interval